@@ -0,0 +1,307 @@
+"""Measures the build time, the memory and the search latency of the engines
+on synthetic corpora, and prints the results as JSON.
+
+    python bench.py --docs 10000 100000 --engines smooth simple
+    python bench.py --docs 1000000 --output results.json
+
+The words of the documents and the queries follow the Zipf distribution,
+like the words of natural languages. The corpora are generated from
+the `--seed`, so the runs with the same arguments search the same data.
+Each engine is measured in a separate process, so the memory of one does
+not affect the others.
+"""
+
+import argparse
+import bisect
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple, NamedTuple
+
+from gifts import SmoothFts, SimpleFts, ShardedFts, SegmentedFts
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore  # not on Windows
+
+
+class Config(NamedTuple):
+    docs: int
+    vocabulary: int = 50000
+    zipf_exponent: float = 1.07
+    doc_length: int = 100
+    query_length: int = 3
+    queries: int = 200
+    limits: Tuple[Optional[int], ...] = (10, None)
+    seed: int = 0
+
+
+def _zipf_words(rnd: random.Random, config: Config) \
+        -> Callable[[int], List[int]]:
+    """Returns a function that picks random words. The word `n` is picked
+    with the probability proportional to `1 / n ** zipf_exponent`."""
+    cumulative = list(itertools.accumulate(
+        1 / n ** config.zipf_exponent
+        for n in range(1, config.vocabulary + 1)))
+    total = cumulative[-1]
+
+    def words(count: int) -> List[int]:
+        return [bisect.bisect(cumulative, rnd.random() * total) + 1
+                for _ in range(count)]
+
+    return words
+
+
+def corpus(config: Config) -> List[Tuple[str, List[int]]]:
+    """Returns the `(doc_id, words)` pairs. The length of the documents
+    varies from half to one and a half of `doc_length`."""
+    rnd = random.Random(config.seed)
+    words = _zipf_words(rnd, config)
+    low = max(1, config.doc_length // 2)
+    high = max(low, config.doc_length * 3 // 2)
+    return [(str(i), words(rnd.randint(low, high)))
+            for i in range(config.docs)]
+
+
+def queries(config: Config) -> List[List[int]]:
+    rnd = random.Random(config.seed + 1)
+    words = _zipf_words(rnd, config)
+    return [words(config.query_length) for _ in range(config.queries)]
+
+
+def _build_frozen(fts_type: type) -> Callable[[Any], Any]:
+    def build(docs):
+        fts = fts_type()
+        fts.add_many(docs)
+        return fts.freeze()
+
+    return build
+
+
+def _build(create: Callable[[], Any], after: str = '') \
+        -> Callable[[Any], Any]:
+    def build(docs):
+        fts = create()
+        fts.add_many(docs)
+        if after:
+            getattr(fts, after)()
+        return fts
+
+    return build
+
+
+def _build_by_add(create: Callable[[], Any]) -> Callable[[Any], Any]:
+    """Adds the documents one by one, to compare with `add_many`."""
+    def build(docs):
+        fts = create()
+        for doc_id, words in docs:
+            fts.add(words, doc_id=doc_id)
+        return fts
+
+    return build
+
+
+ENGINES: Dict[str, Callable[[Any], Any]] = {
+    'smooth': _build(lambda: SmoothFts(use_numpy=False)),
+    'smooth-add': _build_by_add(lambda: SmoothFts(use_numpy=False)),
+    'smooth-numpy': _build(lambda: SmoothFts(use_numpy=True)),
+    'simple': _build(SimpleFts),
+    'simple-add': _build_by_add(SimpleFts),
+    'frozen-smooth': _build_frozen(SmoothFts),
+    'frozen-simple': _build_frozen(SimpleFts),
+    'sharded-smooth': _build(lambda: ShardedFts(SmoothFts, use_numpy=False)),
+    'segmented-smooth': _build(lambda: SegmentedFts(SmoothFts), 'merge'),
+}
+"""Functions that create an engine from the `(doc_id, words)` pairs."""
+
+
+def _peak_rss_mb(who: str = 'RUSAGE_SELF') -> Optional[float]:
+    """The peak resident memory of this process, or with `RUSAGE_CHILDREN`
+    of its largest finished child."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(getattr(resource, who)).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _private_mb(pid: int) -> Optional[float]:
+    """The memory of a running process, that is not shared with other
+    processes. Only on Linux."""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as file:
+            kilobytes = sum(int(line.split()[1]) for line in file
+                            if line.startswith(('Private_Clean:',
+                                                'Private_Dirty:')))
+    except OSError:
+        return None
+    return kilobytes / 1024
+
+
+def _shards_mb(fts: Any) -> Optional[float]:
+    """The memory of the shard processes of `ShardedFts`. The processes
+    are forked, so their memory shared with this process is not counted
+    again."""
+    total = 0.0
+    for process in getattr(fts, '_processes', ()):
+        size = _private_mb(process.pid)
+        if size is None:
+            return None
+        total += size
+    return total
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = round(percent / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+def measure(engine: str, config: Config) -> Dict[str, Any]:
+    """Builds the engine from the corpus and searches it. Runs in the current
+    process, so the memory is only meaningful in a fresh one."""
+    docs = corpus(config)
+    query_list = queries(config)
+    gc.collect()
+    rss_before = _peak_rss_mb()
+
+    started = time.perf_counter()
+    fts = ENGINES[engine](docs)
+    build_seconds = time.perf_counter() - started
+
+    results = []
+    try:
+        for limit in config.limits:
+            # the first searches warm up the caches, like the matrix of
+            # `smooth-numpy`
+            for query in query_list[:10]:
+                fts.search(query, limit=limit)
+            latencies = []
+            for query in query_list:
+                query_started = time.perf_counter()
+                fts.search(query, limit=limit)
+                latencies.append(time.perf_counter() - query_started)
+            latencies.sort()
+            results.append({
+                'limit': limit,
+                'p50_ms': _percentile(latencies, 50) * 1000,
+                'p99_ms': _percentile(latencies, 99) * 1000,
+                'qps': len(latencies) / sum(latencies),
+            })
+        # after the warm-up, that may build more structures
+        rss_after = _peak_rss_mb()
+        shards = len(getattr(fts, '_processes', ()))
+        shards_mb = _shards_mb(fts)
+    finally:
+        if hasattr(fts, 'close'):
+            fts.close()
+    if shards_mb is None:
+        # estimated by the largest of the finished shards
+        largest_mb = _peak_rss_mb('RUSAGE_CHILDREN')
+        shards_mb = None if largest_mb is None else largest_mb * shards
+
+    return {
+        'engine': engine,
+        'docs': config.docs,
+        'build_seconds': build_seconds,
+        'docs_per_second': config.docs / build_seconds,
+        'peak_memory_mb': None
+        if rss_before is None or rss_after is None or shards_mb is None
+        else rss_after - rss_before + shards_mb,
+        'searches': results,
+    }
+
+
+def _measure_in_child(connection, engine: str, config: Config) -> None:
+    try:
+        connection.send((True, measure(engine, config)))
+    except Exception as e:  # pylint: disable=broad-except
+        connection.send((False, repr(e)))
+    connection.close()
+
+
+def measure_in_process(engine: str, config: Config) -> Dict[str, Any]:
+    """Runs `measure` in a new process."""
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_measure_in_child, args=(child_connection, engine, config))
+    process.start()
+    child_connection.close()
+    succeeded, result = connection.recv()
+    process.join()
+    if not succeeded:
+        return {'engine': engine, 'docs': config.docs, 'error': result}
+    return result
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': None if numpy is None else numpy.__version__,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--docs', type=int, nargs='+', default=[10000])
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES),
+                        default=['smooth', 'simple', 'frozen-smooth'])
+    parser.add_argument('--vocabulary', type=int,
+                        default=Config._field_defaults['vocabulary'])
+    parser.add_argument('--zipf-exponent', type=float,
+                        default=Config._field_defaults['zipf_exponent'])
+    parser.add_argument('--doc-length', type=int,
+                        default=Config._field_defaults['doc_length'])
+    parser.add_argument('--query-length', type=int,
+                        default=Config._field_defaults['query_length'])
+    parser.add_argument('--queries', type=int,
+                        default=Config._field_defaults['queries'])
+    parser.add_argument('--limits', nargs='+', default=['10', 'none'],
+                        help="limits of the searches, 'none' for unlimited")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON file, stdout by default")
+    args = parser.parse_args(argv)
+
+    if numpy is None and 'smooth-numpy' in args.engines:
+        parser.error("smooth-numpy requires NumPy")
+    limits = tuple(None if limit.lower() == 'none' else int(limit)
+                   for limit in args.limits)
+
+    report: Dict[str, Any] = {'environment': environment(),
+                              'config': None, 'results': []}
+    for docs in args.docs:
+        config = Config(docs=docs, vocabulary=args.vocabulary,
+                        zipf_exponent=args.zipf_exponent,
+                        doc_length=args.doc_length,
+                        query_length=args.query_length,
+                        queries=args.queries, limits=limits, seed=args.seed)
+        report['config'] = dict(config._asdict(), docs=args.docs)
+        for engine in args.engines:
+            print(f"Measuring {engine} with {docs} documents...",
+                  file=sys.stderr)
+            report['results'].append(measure_in_process(engine, config))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
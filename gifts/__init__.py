@@ -3,3 +3,15 @@
 
 from ._fts_smooth import SmoothFts
 from ._fts_simple import SimpleFts
+from ._fts_frozen import FrozenFts
+from ._bulk import BulkAddReport
+from ._sharded import ShardedFts
+from ._scored_match import ScoredMatch
+from ._similar import SimilarPair
+from ._cursor import SearchPage
+from ._cache import CacheStats
+from ._profile import SearchStats
+from ._async import AsyncFts
+from ._stop import SearchStopped
+from ._segmented import SegmentedFts, Snapshot
+from ._attributes import Range
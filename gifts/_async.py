@@ -0,0 +1,183 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Generic, Iterable, Iterator, List, Optional, \
+    Tuple, TypeVar
+
+from gifts._bulk import BulkAddReport
+from gifts._cursor import SearchPage
+from gifts._scored_match import ScoredMatch
+from gifts._sharded import ShardedFts
+from gifts._stop import _stoppable, SearchStopped
+
+TWord = TypeVar('TWord')
+
+
+class _ReadWriteLock:
+    """Lets many threads read at once, or one thread write. The waiting
+    writers go before the new readers, so a stream of searches does not
+    delay the changes forever."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class AsyncFts(Generic[TWord]):
+    """Runs the methods of a database in the threads of an executor, so
+    they do not block the event loop.
+
+    The searches run concurrently with each other, and the changes run
+    alone. When the awaiting task is cancelled, or the `timeout` expires,
+    the search stops at the next word of the query, and the thread is
+    freed for other calls. The changes that have started are completed.
+
+    With `ShardedFts`, all the calls run one at a time. Its shards search
+    in parallel by themselves.
+    """
+
+    def __init__(self, fts: Any,
+                 executor: Optional[Executor] = None,
+                 max_concurrency: int = 4,
+                 timeout: Optional[float] = None):
+        """`fts` is `SmoothFts`, `SimpleFts`, `FrozenFts` or `ShardedFts`.
+
+        The calls run in the `executor`. By default, it is a thread pool
+        with `max_concurrency` threads, that is shut down by `close`.
+        `timeout` is the default number of seconds for a search.
+        """
+        if max_concurrency < 1:
+            raise ValueError(
+                f"Concurrency must be positive: {max_concurrency}")
+        self._fts = fts
+        self._own_executor = executor is None
+        self._executor = executor if executor is not None \
+            else ThreadPoolExecutor(max_workers=max_concurrency)
+        self._timeout = timeout
+        self._lock = _ReadWriteLock()
+        # the shards are called through pipes, that serve one call at a time
+        self._exclusive = isinstance(fts, ShardedFts)
+
+    async def __aenter__(self) -> 'AsyncFts[TWord]':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shuts down the executor, unless it was given to the
+        constructor. The database is not closed."""
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    async def _call(self, writes: bool, timeout: Optional[float],
+                    method: str, *args, **kwargs) -> Any:
+        stop = threading.Event()
+
+        def call() -> Any:
+            with self._lock.writing() if writes or self._exclusive \
+                    else self._lock.reading():
+                if stop.is_set():
+                    # cancelled while waiting for the lock
+                    raise SearchStopped
+                with _stoppable(stop):
+                    return getattr(self._fts, method)(*args, **kwargs)
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor,
+                                                            call)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            stop.set()
+            raise
+
+    async def _read(self, timeout: Optional[float], method: str,
+                    *args, **kwargs) -> Any:
+        return await self._call(
+            False, timeout if timeout is not None else self._timeout,
+            method, *args, **kwargs)
+
+    async def _write(self, method: str, *args, **kwargs) -> Any:
+        return await self._call(True, None, method, *args, **kwargs)
+
+    async def search(self, query: List[TWord],
+                     timeout: Optional[float] = None,
+                     **search_options) -> List[str]:
+        """Calls `search` of the database. Raises `asyncio.TimeoutError`
+        when the search takes longer than `timeout` seconds."""
+        return await self._read(timeout, 'search', query, **search_options)
+
+    async def search_scored(self, query: List[TWord],
+                            timeout: Optional[float] = None,
+                            **search_options) -> List[ScoredMatch]:
+        return await self._read(timeout, 'search_scored', query,
+                                **search_options)
+
+    async def search_page(self, query: List[TWord], page_size: int,
+                          cursor: Optional[str] = None,
+                          timeout: Optional[float] = None,
+                          **search_options) -> SearchPage:
+        return await self._read(timeout, 'search_page', query, page_size,
+                                cursor, **search_options)
+
+    async def search_many(self, queries: Iterable[List[TWord]],
+                          timeout: Optional[float] = None,
+                          **search_options) -> List[List[str]]:
+        return await self._read(timeout, 'search_many', list(queries),
+                                **search_options)
+
+    async def add(self, words: Iterable[TWord],
+                  doc_id: Optional[str] = None, **add_options) -> Any:
+        return await self._write('add', words, doc_id=doc_id, **add_options)
+
+    async def add_many(
+            self,
+            docs: Iterable[Tuple[Any, ...]]) -> BulkAddReport:
+        """Calls `add_many` of the database. The iterable is consumed in
+        the thread of the executor."""
+        return await self._write('add_many', docs)
+
+    async def remove(self, doc_id: str) -> None:
+        await self._write('remove', doc_id)
+
+    async def update(self, doc_id: str, words: Iterable[TWord],
+                     **add_options) -> Any:
+        return await self._write('update', doc_id, words, **add_options)
+
+    async def compact(self) -> None:
+        await self._write('compact')
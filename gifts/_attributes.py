@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, \
+    NamedTuple, Optional
+
+from gifts._bitmap import _Bitmap, _union
+
+_MULTIPLE = (list, set, frozenset)
+"""The types of the attribute values, that are several values at once."""
+
+
+class Range(NamedTuple):
+    """The condition of a `where` filter, that matches the attribute values
+    from `low` to `high` inclusive. A `None` bound is not checked."""
+    low: Any = None
+    high: Any = None
+
+    def __contains__(self, value: Any) -> bool:
+        return (self.low is None or self.low <= value) \
+            and (self.high is None or value <= self.high)
+
+
+def _values(value: Any) -> Iterable[Hashable]:
+    return value if isinstance(value, _MULTIPLE) else (value,)
+
+
+def _where_key(where: Optional[Mapping[str, Any]]) -> Hashable:
+    """Returns the `where` filter as a hashable value for the cache."""
+    if not where:
+        return None
+    return frozenset((name, frozenset(condition)
+                      if isinstance(condition, _MULTIPLE) else condition)
+                     for name, condition in where.items())
+
+
+class _AttributeIndex:
+    """Bitmaps of the ordinals of the documents by the names and values of
+    their attributes.
+
+    The bitmaps keep the removed documents until the compaction. So
+    the ordinals selected by them must be checked against the tombstones.
+    """
+
+    __slots__ = ('_name_to_values',)
+
+    def __init__(self):
+        self._name_to_values: Dict[str, Dict[Hashable, _Bitmap]] = {}
+
+    def add(self, ordinal: int, attributes: Mapping[str, Any]) -> None:
+        """Adds the document with the attributes. A list or a set is
+        several values of the same attribute."""
+        for name, value in attributes.items():
+            value_to_bitmap = self._name_to_values.get(name)
+            if value_to_bitmap is None:
+                value_to_bitmap = {}
+                self._name_to_values[name] = value_to_bitmap
+            for single_value in _values(value):
+                bitmap = value_to_bitmap.get(single_value)
+                if bitmap is None:
+                    bitmap = _Bitmap()
+                    value_to_bitmap[single_value] = bitmap
+                bitmap.add(ordinal)
+
+    def matching(self, where: Mapping[str, Any]) -> _Bitmap:
+        """Returns the ordinals of the documents matching all the conditions
+        of `where`. A condition is a value, a list or a set of values that
+        match any of them, or a `Range`."""
+        result: Optional[_Bitmap] = None
+        for name, condition in where.items():
+            value_to_bitmap = self._name_to_values.get(name, {})
+            if isinstance(condition, Range):
+                bitmaps = [bitmap for value, bitmap in value_to_bitmap.items()
+                           if value in condition]
+            else:
+                bitmaps = [value_to_bitmap[value]
+                           for value in _values(condition)
+                           if value in value_to_bitmap]
+            union = bitmaps[0] if len(bitmaps) == 1 else _union(bitmaps)
+            result = union if result is None else result & union
+            if not result:
+                break
+        return result if result is not None else _Bitmap()
+
+    def compact(self, new_ordinals: List[int]) -> None:
+        """Drops the removed documents and renumbers the ordinals by
+        `_DocIds.compact`."""
+        for value_to_bitmap in self._name_to_values.values():
+            for value, bitmap in list(value_to_bitmap.items()):
+                compacted = bitmap.compacted(new_ordinals)
+                if compacted:
+                    value_to_bitmap[value] = compacted
+                else:
+                    del value_to_bitmap[value]
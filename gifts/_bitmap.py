@@ -0,0 +1,188 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import itertools
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Union
+
+_CHUNK_BITS = 16
+_CHUNK_SIZE = 1 << _CHUNK_BITS
+_LOW_MASK = _CHUNK_SIZE - 1
+_BITSET_BYTES = _CHUNK_SIZE // 8
+_ARRAY_MAX = 4096
+"""A chunk with more values takes less memory as a bitset."""
+
+_Chunk = Union[array, bytearray]
+
+
+def _bitset_values(bitset: bytearray) -> List[int]:
+    result = []
+    for index, byte in enumerate(bitset):
+        if byte:
+            base = index * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    result.append(base + bit)
+    return result
+
+
+def _from_int(bits: int) -> _Chunk:
+    """Returns the chunk with the bits of the int set."""
+    count = bin(bits).count('1')
+    bitset = bytearray(bits.to_bytes(_BITSET_BYTES, 'little'))
+    if count > _ARRAY_MAX:
+        return bitset
+    return array('H', _bitset_values(bitset))
+
+
+def _bitset(values: Iterable[int]) -> bytearray:
+    bitset = bytearray(_BITSET_BYTES)
+    for value in values:
+        bitset[value >> 3] |= 1 << (value & 7)
+    return bitset
+
+
+def _as_int(chunk: _Chunk) -> int:
+    return int.from_bytes(
+        chunk if isinstance(chunk, bytearray) else _bitset(chunk), 'little')
+
+
+def _contains(chunk: _Chunk, value: int) -> bool:
+    if isinstance(chunk, bytearray):
+        return bool(chunk[value >> 3] >> (value & 7) & 1)
+    index = bisect_left(chunk, value)
+    return index < len(chunk) and chunk[index] == value
+
+
+def _chunk_len(chunk: _Chunk) -> int:
+    if isinstance(chunk, bytearray):
+        return bin(int.from_bytes(chunk, 'little')).count('1')
+    return len(chunk)
+
+
+class _Bitmap:
+    """A set of ordinals, split into chunks by the high 16 bits, as in
+    the Roaring bitmaps. A chunk keeps the low bits either as a sorted
+    array of up to 4096 values, or as a bitset of 8 KB. So a sparse set
+    takes 2 bytes per ordinal, and a dense one 1 bit.
+
+    The intersections and unions of the bitsets are made by the bitwise
+    operations on ints, so the cost is proportional to the size of the
+    chunks, not to the number of the ordinals.
+    """
+
+    __slots__ = ('_chunks', '_length')
+
+    def __init__(self, ordinals: Iterable[int] = ()):
+        self._chunks: Dict[int, _Chunk] = {}
+        self._length = 0
+        for ordinal in ordinals:
+            self.add(ordinal)
+
+    @classmethod
+    def _of_chunks(cls, chunks: Dict[int, _Chunk]) -> '_Bitmap':
+        result = cls()
+        result._chunks = dict((high, chunk) for high, chunk in chunks.items()
+                              if len(chunk))
+        result._length = sum(map(_chunk_len, result._chunks.values()))
+        return result
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[int]:
+        """Yields the ordinals in ascending order."""
+        for high in sorted(self._chunks):
+            chunk = self._chunks[high]
+            base = high << _CHUNK_BITS
+            values = _bitset_values(chunk) \
+                if isinstance(chunk, bytearray) else chunk
+            for value in values:
+                yield base | value
+
+    def __contains__(self, ordinal: int) -> bool:
+        chunk = self._chunks.get(ordinal >> _CHUNK_BITS)
+        return chunk is not None and _contains(chunk, ordinal & _LOW_MASK)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(chunk) if isinstance(chunk, bytearray)
+                   else len(chunk) * chunk.itemsize
+                   for chunk in self._chunks.values())
+
+    def add(self, ordinal: int) -> None:
+        high, low = ordinal >> _CHUNK_BITS, ordinal & _LOW_MASK
+        chunk = self._chunks.get(high)
+        if chunk is None:
+            self._chunks[high] = array('H', (low,))
+        elif isinstance(chunk, bytearray):
+            mask = 1 << (low & 7)
+            if chunk[low >> 3] & mask:
+                return
+            chunk[low >> 3] |= mask
+        elif not chunk or chunk[-1] < low:
+            # the ordinals are usually added in ascending order
+            chunk.append(low)
+        else:
+            index = bisect_left(chunk, low)
+            if chunk[index] == low:
+                return
+            chunk.insert(index, low)
+        self._length += 1
+        chunk = self._chunks[high]
+        if isinstance(chunk, array) and len(chunk) > _ARRAY_MAX:
+            self._chunks[high] = _bitset(chunk)
+
+    def __and__(self, other: '_Bitmap') -> '_Bitmap':
+        chunks: Dict[int, _Chunk] = {}
+        for high, chunk in self._chunks.items():
+            other_chunk = other._chunks.get(high)
+            if other_chunk is None:
+                continue
+            if isinstance(chunk, bytearray) \
+                    and isinstance(other_chunk, bytearray):
+                chunks[high] = _from_int(
+                    _as_int(chunk) & _as_int(other_chunk))
+            else:
+                # probing the bitset or the longer array with the values
+                # of the array
+                if isinstance(chunk, bytearray) \
+                        or len(chunk) > len(other_chunk):
+                    chunk, other_chunk = other_chunk, chunk
+                chunks[high] = array('H', (value for value in chunk
+                                           if _contains(other_chunk, value)))
+        return _Bitmap._of_chunks(chunks)
+
+    def __or__(self, other: '_Bitmap') -> '_Bitmap':
+        return _union([self, other])
+
+    def compacted(self, new_ordinals: List[int]) -> '_Bitmap':
+        """Returns the ordinals without the tombstones, renumbered by
+        `_DocIds.compact`."""
+        return _Bitmap(new_ordinals[ordinal] for ordinal in self
+                       if new_ordinals[ordinal] >= 0)
+
+
+def _union(bitmaps: List[_Bitmap]) -> _Bitmap:
+    """Returns the ordinals present in any of the bitmaps. Each chunk is
+    merged from all the bitmaps at once."""
+    high_to_parts: Dict[int, List[_Chunk]] = {}
+    for bitmap in bitmaps:
+        for high, chunk in bitmap._chunks.items():
+            high_to_parts.setdefault(high, []).append(chunk)
+    chunks: Dict[int, _Chunk] = {}
+    for high, parts in high_to_parts.items():
+        arrays = [part for part in parts if isinstance(part, array)]
+        if len(arrays) == len(parts) \
+                and sum(map(len, arrays)) <= _ARRAY_MAX:
+            chunks[high] = array('H', sorted(set(
+                itertools.chain.from_iterable(arrays))))
+            continue
+        bits = int.from_bytes(
+            _bitset(itertools.chain.from_iterable(arrays)), 'little')
+        for part in parts:
+            if isinstance(part, bytearray):
+                bits |= int.from_bytes(part, 'little')
+        chunks[high] = _from_int(bits)
+    return _Bitmap._of_chunks(chunks)
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import gc
+import time
+from contextlib import contextmanager
+from typing import (NamedTuple, Iterator, Iterable, Tuple, Any, Callable,
+                    Optional, Mapping, Set, Collection)
+
+
+class BulkAddReport(NamedTuple):
+    """Returned by `add_many`."""
+    documents: int
+    seconds: float
+
+    @property
+    def documents_per_second(self) -> float:
+        if self.seconds <= 0:
+            return float('inf')
+        return self.documents / self.seconds
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Disables the cyclic garbage collector for the duration of a bulk
+    load. The index does not create reference cycles, but millions of new
+    containers trigger the collector over and over, and each full collection
+    walks the whole (growing) index."""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _add_all(docs: Iterable[Tuple[Any, ...]],
+             add_document: Callable[[Any, Optional[str],
+                                     Optional[Mapping[str, Any]]],
+                                    Collection[Any]],
+             finish: Callable[[Set[Any], int], None]) -> BulkAddReport:
+    """Adds the `(doc_id, words[, attributes])` tuples with `add_document`,
+    that returns the unique words of the document. Then calls `finish` with
+    the words of all the added documents and their number, even if
+    an ID was not unique: the documents added before it must be
+    searchable."""
+    started = time.monotonic()
+    added = 0
+    touched_words: Set[Any] = set()
+    with _gc_paused():
+        try:
+            for doc_id, words, *attributes in docs:
+                touched_words.update(add_document(
+                    words, doc_id, attributes[0] if attributes else None))
+                added += 1
+        finally:
+            finish(touched_words, added)
+    return BulkAddReport(documents=added, seconds=time.monotonic() - started)
@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import sys
+import threading
+from collections import OrderedDict, Counter
+from typing import NamedTuple, Optional, Any, Hashable, Iterable, Tuple, \
+    List
+
+
+class CacheStats(NamedTuple):
+    """Returned by `cache_stats`. The `bytes` is an estimate of the memory
+    taken by the cached results."""
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+
+
+def _query_key(query: Iterable[Any]) -> Tuple[Tuple[Any, int], ...]:
+    """The words of the query with their counts. The order of the words
+    matters: the scores are summed in that order, and the last digits of
+    the sums may depend on it."""
+    return tuple(Counter(query).items())
+
+
+def _size(entries: List[Tuple[Any, Any]]) -> int:
+    """Estimates the memory taken by a list of (key, item) pairs. The
+    document IDs are not counted, since they are shared with the index."""
+    result = sys.getsizeof(entries)
+    for entry in entries:
+        result += sys.getsizeof(entry) + sys.getsizeof(entry[0]) \
+                  + sys.getsizeof(entry[1])
+    return result
+
+
+class _ResultCache:
+    """Least recently used search results.
+
+    Each result is stored with a stamp: the versions of everything the
+    result depends on. A result is returned only if the current stamp is
+    the same, so there is no need to clear the cache on changes.
+
+    The cache is shared by the concurrent searches of `AsyncFts`, so
+    the access is locked.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int]):
+        if max_entries < 1:
+            raise ValueError(f"Cache size must be positive: {max_entries}")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError(f"Cache bytes must be positive: {max_bytes}")
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        """Values are (stamp, result, size)."""
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self._hits, misses=self._misses,
+                          entries=len(self._entries), bytes=self._bytes)
+
+    def get(self, key: Hashable, stamp: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, stamp: Hashable,
+            result: List[Tuple[Any, Any]]) -> None:
+        size = _size(result)
+        if self._max_bytes is not None and size > self._max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (stamp, result, size)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or (
+                    self._max_bytes is not None
+                    and self._bytes > self._max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
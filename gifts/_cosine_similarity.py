@@ -1,10 +1,6 @@
-# todo benchmark different approaches
-
-# this can be hugely optimized with
-# https://medium.com/analytics-vidhya/beating-numpy-performance-by-extending-python-with-c-c9b644ee2ca8
-#
-# But we do not want heavy dependencies like numpy or any can of
-# platform-dependent native code.
+# The plain cosine similarity of dense vectors. The searches do not use it:
+# they sum the products over the posting lists or with the NumPy matrix.
+# It is kept as the reference the tests check the scores against.
 from typing import Iterable, Collection
 
 
@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import base64
+import json
+from typing import NamedTuple, List, Optional, Tuple, Any
+
+from gifts._scored_match import ScoredMatch
+
+
+class SearchPage(NamedTuple):
+    """A page of results returned by `search_page`.
+
+    The `next_cursor` is passed to `search_page` to get the next page. It is
+    `None` when the page is not full, so there are no more results.
+    """
+    matches: List[ScoredMatch]
+    next_cursor: Optional[str]
+
+
+def _encode_cursor(key: Tuple[Any, ...]) -> str:
+    """The cursor is the ranking key of the last match of the page. The next
+    page starts with the highest key below it. So there is no state to keep
+    between the requests. But if the database was changed in between, the
+    scores are not the same, and the pages may overlap or skip matches."""
+    # JSON keeps the floats exactly: `repr` of float is round-trip
+    return base64.urlsafe_b64encode(
+        json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, ...]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError:
+        key = None
+    if not isinstance(key, list) or not key:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return tuple(key)
+
+
+def _page_size(page_size: int) -> int:
+    if page_size < 1:
+        raise ValueError(f"Page size must be positive: {page_size}")
+    return page_size
+
+
+def _page(entries: List[Tuple[Any, ScoredMatch]],
+          page_size: int) -> SearchPage:
+    """Creates the page from the (ranking key, match) pairs."""
+    next_cursor = None
+    if len(entries) >= page_size:
+        next_cursor = _encode_cursor(entries[-1][0])
+    return SearchPage(matches=[match for _, match in entries],
+                      next_cursor=next_cursor)
@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+# Nice articles:
+# * https://towardsdatascience.com/measure-text-weight-using-tf-idf-in-python-plain-code-and-scikit-learn-50cb1e4375ad
+# * https://towardsdatascience.com/tf-idf-for-document-ranking-from-scratch-in-python-on-real-world-dataset-796d339a4089
+
+import threading
+from collections import Counter
+from math import log, sqrt
+from typing import Iterable, Optional, TypeVar, Generic, Dict, Callable, \
+    Collection
+
+TWord = TypeVar('TWord')
+
+
+class _Counters(threading.local):
+    norms_computed = 0
+    """Number of the norms of the stored documents computed by the current
+    thread. Read by `_Profile`."""
+
+
+_counters = _Counters()
+
+
+def _idf(docs_with_word: int, docs_total: int) -> float:
+    """Inverse document frequency. Gives lower values for frequently used
+    words.
+
+    Here, the variant of the formula used in SciKit (https://bit.ly/3zEDkMn)
+    is closest to "inverse document frequency smooth" from
+    [Wikipedia](https://en.wikipedia.org/wiki/Tf%E2%80%93idf).
+    """
+    assert docs_with_word <= docs_total
+    return log((docs_total + 1) / (docs_with_word + 1)) + 1
+
+
+class _Document(Generic[TWord]):
+    # The document is kept for each row of the database, so it is as small
+    # as possible: no `__dict__`, and no list of the original words
+    __slots__ = ('doc_id', '_tf', '_norm', '_norm_version')
+
+    def __init__(self, doc_id: Optional[str], words: Iterable[TWord]):
+        self.doc_id = doc_id
+        counts = Counter(words)
+        words_in_doc = sum(counts.values())
+        # Term frequency of each word in the document.
+        # See: https://bit.ly/3zEDkMn
+        self._tf: Dict[TWord, float] = \
+            {word: word_occurrences / words_in_doc
+             for word, word_occurrences in counts.items()}
+        self._norm: Optional[float] = None
+        self._norm_version: Optional[int] = None
+
+    @property
+    def unique_words(self) -> Collection[TWord]:
+        return self._tf.keys()
+
+    def weight(self,
+               word: TWord,
+               idf: Callable[[TWord], float],
+               idf_version: int) \
+            -> float:
+        """Returns the normalized weight of `word` in the current document.
+
+        It is a smoothed version of TF-IDF, as used is SciKit-Learn and
+        described at https://bit.ly/3zEDkMn V_norm.
+
+        Basically it is a euclidean norm like:
+            V[i] / sqrt(V[1]**2 + V[2]**2 + ... + V[n]**2)
+        where V[i] is a TF-IDF of term i
+        """
+        # We cannot calculate the weight when creating a document: at that time,
+        # we still do not have statistics on all (other) documents and the
+        # frequency of words in them. And now we have been given information
+        # about the frequency by the `idf` argument.
+        if self._norm is None or self._norm_version != idf_version:
+            # Either we never calculated the norm, or the word frequency
+            # information has been updated. In any case, the norm must
+            # be recalculated.
+            #
+            # The denominator is the same for all words. We keep only it,
+            # and the numerators are computed from the raw TF on demand
+            self._norm = sqrt(sum(self._tf_idf(w, idf) ** 2
+                                  for w in self._tf.keys()))
+            self._norm_version = idf_version
+            if self.doc_id is not None:  # not a query
+                _counters.norms_computed += 1
+
+        assert self._norm_version == idf_version
+        if word not in self._tf:
+            return 0
+        return self._tf_idf(word, idf) / self._norm
+
+        # https://stackoverflow.com/a/46812408
+
+    def _tf_idf(self, word: TWord, idf: Callable[[TWord], float]) -> float:
+        return self._tf.get(word, 0) * idf(word)
+
+    # def normalized_term_weight(self, word: TWord) -> float:
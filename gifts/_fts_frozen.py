@@ -0,0 +1,273 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import heapq
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, TypeVar, Generic, Dict, Tuple, \
+    NamedTuple, Mapping, Sequence, Union, Callable
+
+from gifts._document import _Document, _idf
+from gifts._stop import _check_stopped
+from gifts._storage import _save, _load
+from gifts._top_k import _TopK, _ROUNDING
+
+TWord = TypeVar('TWord')
+
+
+class _ImpactPostings(NamedTuple):
+    """Ordinals of the documents containing a word, and the impacts of the
+    word on the scores of these documents. Sorted by impact, highest first.
+
+    Takes 12 bytes per posting. The impacts are double-precision and are
+    combined with the query weights by the same operations as in
+    the database we froze.
+    """
+    ordinals: array  # array('I') or the same memoryview of a file
+    impacts: array  # array('d') or the same memoryview of a file
+
+
+def _impact_ordered(postings: Iterable[Tuple[float, int]]) -> _ImpactPostings:
+    ordered = sorted(postings, key=lambda p: p[0], reverse=True)
+    return _ImpactPostings(
+        ordinals=array('I', (ordinal for _, ordinal in ordered)),
+        impacts=array('d', (impact for impact, _ in ordered)))
+
+
+class FrozenFts(Generic[TWord]):
+    """Read-only database with the weights of all the words precomputed.
+
+    Created by `SmoothFts.freeze()` or `SimpleFts.freeze()`, and returns
+    the same results as the database it was created from, up to
+    floating-point ties: the weights of a document are summed in another
+    order, so its score may differ in the last bits, and the documents with
+    almost equal scores may swap. The postings of
+    each word are sorted by impact, so a search with a `limit` stops
+    collecting documents from a posting list as soon as the remaining
+    impacts cannot get a new document into the top.
+    """
+
+    def __init__(self,
+                 word_to_postings: Mapping[TWord, _ImpactPostings],
+                 doc_ids: Sequence[str],
+                 word_to_idf: Optional[Mapping[TWord, float]]):
+        self._word_to_postings = word_to_postings
+        self._doc_ids = doc_ids
+        """Document IDs by ordinal."""
+        self._word_to_idf = word_to_idf
+        """When `None`, the query words are weighted just by the number of
+        occurrences, and the impacts are divided by the number of documents
+        with the word (as in `SimpleFts`). Otherwise, the query is
+        a normalized TF-IDF vector (as in `SmoothFts`)."""
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Writes the database to a binary file, that can be opened by
+        `FrozenFts.load`.
+
+        The words must be strings, bytes, numbers, `None` or tuples of them,
+        otherwise `TypeError` is raised. As in a dict, the equal words are
+        the same word: `1`, `1.0` and `True` are found by each other.
+        """
+        word_to_idf = self._word_to_idf
+        _save(path,
+              doc_ids=self._doc_ids,
+              terms=((word,
+                      None if word_to_idf is None else word_to_idf[word],
+                      postings.ordinals, postings.impacts)
+                     for word, postings in self._word_to_postings.items()))
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) \
+            -> 'FrozenFts':
+        """Opens the database saved by `save`.
+
+        With `mmap`, the file is memory-mapped and nothing is read in
+        advance: the pages are read on demand and shared by all the
+        processes that opened the same file. Otherwise, the file is read
+        into memory. In both cases the words and the document IDs are
+        decoded only when needed.
+
+        The file is trusted: do not load the files from unknown sources.
+        """
+        doc_ids, word_to_postings, word_to_idf = _load(
+            path, use_mmap=mmap, make_postings=_ImpactPostings)
+        return cls(word_to_postings=word_to_postings,
+                   doc_ids=doc_ids,
+                   word_to_idf=word_to_idf)
+
+    @property
+    def words_count(self) -> int:
+        return len(self._word_to_postings)
+
+    @property
+    def documents_count(self) -> int:
+        return len(self._doc_ids)
+
+    def _idf(self, word: TWord) -> float:
+        assert self._word_to_idf is not None
+        result = self._word_to_idf.get(word)
+        if result is None:
+            return _idf(docs_with_word=0, docs_total=self.documents_count)
+        return result
+
+    def _df(self, word: TWord) -> int:
+        # no tombstones after the compaction, so all the documents with
+        # the word are in the postings
+        postings = self._word_to_postings.get(word)
+        return len(postings.ordinals) if postings is not None else 0
+
+    def query_weights(self, query: List[TWord],
+                      df: Optional[Callable[[TWord], int]] = None,
+                      documents_count: Optional[int] = None) \
+            -> Dict[TWord, Tuple[float, int]]:
+        """Returns the weight of each query word, and the number
+        the products of the weight and the impacts are divided by.
+
+        They are computed from the statistics of this database, or from
+        `df` and `documents_count` of a larger one, that this database is
+        a segment of."""
+        if self._word_to_idf is None:
+            # as in `SimpleFts`. A word may be only in the removed
+            # documents of the larger database, then its df is 0
+            df = df if df is not None else self._df
+            return dict((word, (count, max(df(word), 1)))
+                        for word, count in Counter(query).items())
+        def idf(word: TWord) -> float:
+            if df is None:
+                return self._idf(word)
+            assert documents_count is not None
+            return _idf(docs_with_word=df(word),
+                        docs_total=documents_count)
+
+        query_doc = _Document(doc_id=None, words=query)
+        return dict((w, (query_doc.weight(w, idf, 0), 1))
+                    for w in query_doc.unique_words)
+
+    def search(self, query: List[TWord],
+               limit: Optional[int] = None) -> List[str]:
+        """Returns IDs of documents that include at least one word from `query`.
+        More relevant matches will be at the top of the list.
+
+        `limit` is the maximum number of IDs to return.
+        """
+        return [doc_id for _, doc_id in self.ranked(query, limit)]
+
+    def ranked(self, query: List[TWord],
+               limit: Optional[int] = None,
+               word_to_weight: Optional[
+                   Mapping[TWord, Tuple[float, int]]] = None) \
+            -> List[Tuple[float, str]]:
+        """Returns the (score, ID) pairs of the top documents, the best
+        first. The `word_to_weight` is returned by `query_weights`, so
+        the segments of a larger database can be scored with the same
+        weights. By default it is computed from the statistics of this
+        database."""
+        if len(query) <= 0:
+            raise ValueError("Query is empty")
+        if word_to_weight is None:
+            word_to_weight = self.query_weights(query)
+        top: _TopK[str] = _TopK(limit)
+
+        # The words with the highest possible impact go first, so the top
+        # is filled with good matches early
+        terms = []
+        for word, (query_weight, divisor) in word_to_weight.items():
+            postings = self._word_to_postings.get(word)
+            if postings:
+                terms.append((query_weight, divisor, postings))
+        terms.sort(key=lambda t: t[2].impacts[0] * t[0] / t[1], reverse=True)
+
+        ordinal_to_score: Dict[int, float] = {}
+        for term_idx, (query_weight, divisor, (ordinals, impacts)) \
+                in enumerate(terms):
+            _check_stopped()
+            remaining_terms = terms[term_idx + 1:]
+
+            pos = 0
+            end, preliminary = _admit_until(
+                pos, limit, ordinal_to_score, ordinals, impacts,
+                query_weight, divisor, remaining_terms)
+            while pos < end:
+                ordinal = ordinals[pos]
+                ordinal_to_score[ordinal] = \
+                    ordinal_to_score.get(ordinal, 0.0) \
+                    + impacts[pos] * query_weight / divisor
+                pos += 1
+                if pos == end and preliminary:
+                    end, preliminary = _admit_until(
+                        pos, limit, ordinal_to_score, ordinals, impacts,
+                        query_weight, divisor, remaining_terms)
+
+            for pos in range(end, len(ordinals)):
+                score = ordinal_to_score.get(ordinals[pos])
+                if score is not None:
+                    ordinal_to_score[ordinals[pos]] = \
+                        score + impacts[pos] * query_weight / divisor
+
+        for ordinal, score in ordinal_to_score.items():
+            doc_id = self._doc_ids[ordinal]
+            top.push((score, doc_id), doc_id)
+        return [key for key, _ in top.sorted_entries()]
+
+
+def _lowest_in_top(scores: Iterable[float], limit: int) -> float:
+    # the scores are not final yet, but they can only grow. So it is
+    # a lower bound of the final lowest score in the top
+    return heapq.nlargest(limit, scores)[-1]
+
+
+def _admit_until(pos: int,
+                 limit: Optional[int],
+                 ordinal_to_score: Dict[int, float],
+                 ordinals: array,
+                 impacts: array,
+                 query_weight: float,
+                 divisor: int,
+                 remaining_terms: List[Tuple[float, int, _ImpactPostings]]) \
+        -> Tuple[int, bool]:
+    """Returns the position until which the postings from `pos` may add new
+    documents to the scores. After that position the postings may only update
+    the scores. The second value is `True`, if the position is preliminary
+    and must be revised after reaching it."""
+    if limit is None:
+        return len(ordinals), False
+    if limit == 0:
+        return 0, False
+    if len(ordinal_to_score) < limit:
+        # we will know the lowest score in the top after collecting a few
+        # more documents
+        return min(len(ordinals), pos + limit - len(ordinal_to_score)), True
+    cut = _admission_cut(query_weight, divisor, impacts, remaining_terms,
+                         _lowest_in_top(ordinal_to_score.values(), limit))
+    return max(pos, cut), False
+
+
+def _admission_cut(query_weight: float,
+                   divisor: int,
+                   impacts: array,
+                   remaining_terms: List[Tuple[float, int, _ImpactPostings]],
+                   lowest_in_top: float) -> int:
+    """Returns the position of the first posting that cannot get a new
+    document into the top. The impacts are sorted, so all the following
+    postings cannot do it either."""
+
+    def max_new_score(pos: int) -> float:
+        # summing in the same order as the actual scores will be summed
+        result = impacts[pos] * query_weight / divisor
+        for remaining_weight, remaining_divisor, (_, remaining_impacts) \
+                in remaining_terms:
+            result += (remaining_impacts[0] * remaining_weight
+                       / remaining_divisor)
+        return result
+
+    lo, hi = 0, len(impacts)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        # a document tying the lowest score may still get into the top by
+        # its ID, and the sums may differ in the last bits
+        if max_new_score(mid) < lowest_in_top - _ROUNDING:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
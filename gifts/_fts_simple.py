@@ -1,97 +1,896 @@
 # SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
 # SPDX-License-Identifier: MIT
 
+import heapq
 import uuid
+from array import array
 from collections import defaultdict, Counter
 from dataclasses import dataclass
-from typing import Iterable, List, Optional, TypeVar, Generic, Dict, NamedTuple
-
-TWord = TypeVar('TWord')
+from pathlib import Path
+from typing import Iterable, List, Optional, TypeVar, Generic, Dict, Tuple, \
+    Union, Set, Any, Collection, Iterator, Hashable, AbstractSet, Callable, \
+    Sequence, Mapping
 
+from gifts._attributes import _AttributeIndex, _where_key
+from gifts._bulk import BulkAddReport, _add_all
+from gifts._cache import CacheStats, _ResultCache, _query_key
+from gifts._cursor import SearchPage, _decode_cursor, _page, _page_size
+from gifts._fts_frozen import FrozenFts, _impact_ordered
+from gifts._minhash import _MinHashIndex
+from gifts._positions import _PositionIndex
+from gifts._profile import SearchStats, _Profile, _cached_stats
+from gifts._postings import _DocIds, _Postings, _filtered, _intersect, \
+    _matching
+from gifts._scored_match import ScoredMatch
+from gifts._stop import _check_stopped
+from gifts._top_k import _ROUNDING, _TopK, _drop_hopeless
 
-class _WeightedDoc(NamedTuple):
-    doc_id: str
-    weight: float
+TWord = TypeVar('TWord')
 
 
 @dataclass
 class _Match:
-    doc_id: str
+    ordinal: int
     sum_weight: float
     words_matched: int
 
 
 class SimpleFts(Generic[TWord]):
-    def __init__(self):
-        self._word_to_docs: Dict[TWord, List[_WeightedDoc]] = defaultdict(list)
-        self._ids = set()
+    def __init__(self, max_tombstones_ratio: float = 0.5,
+                 cache_size: int = 0,
+                 cache_bytes: Optional[int] = None,
+                 positions: bool = False,
+                 on_search: Optional[Callable[[SearchStats], None]] = None,
+                 minhash_bands: int = 0,
+                 minhash_rows: int = 4,
+                 compress_postings: bool = False,
+                 stop_words_ratio: Optional[float] = None):
+        """`max_tombstones_ratio` is the share of removed documents, after
+        which the database is compacted automatically.
+
+        `cache_size` enables the cache of the results of up to that number
+        of queries, optionally limited to about `cache_bytes` of memory.
+        The least recently used results are evicted first. A cached result
+        is dropped when the documents with the query words change.
+
+        `positions` enables the index of the positions of the words in
+        the documents, that is needed for `search_phrase` and `search_near`.
+
+        `on_search` is called after each search, except `search_iter`, with
+        the `SearchStats` of what it did and how long it took. Without it,
+        nothing is measured.
+
+        `minhash_bands` enables the approximate searches. The sets of words
+        of the documents get MinHash signatures of `minhash_bands` bands of
+        `minhash_rows` hashes each, and the documents are indexed by the
+        bands. A search with `approximate=True` scores only the documents
+        that share a band with the query. A document with the Jaccard
+        similarity `s` to the query is found with the probability of
+        `1 - (1 - s ** minhash_rows) ** minhash_bands`. More bands give
+        a better recall, more rows give fewer candidates.
+
+        `compress_postings` keeps the ordinals of the documents in the long
+        posting lists as delta-encoded varints, in blocks with skips: about
+        a byte per posting instead of 4. The weights take 8 bytes anyway.
+        The searches decode the ordinals, so they are slower.
+
+        `stop_words_ratio` makes the words that occur in more than that
+        share of the documents the stop words. The searches ignore them:
+        they neither select the documents nor add to the scores. Unless
+        the query has no other words that occur in the database. The
+        share is checked at each search, so the words become stop words
+        and stop being them as the documents are added and removed.
+        """
+        if stop_words_ratio is not None and not 0 < stop_words_ratio <= 1:
+            raise ValueError(f"Ratio out of (0, 1]: {stop_words_ratio}")
+        self._word_to_docs: Dict[TWord, _Postings] = defaultdict(_Postings)
+        self._word_to_max_weight: Dict[TWord, float] = {}
+        self._word_to_removed: Dict[TWord, int] = {}
+        """Number of tombstones in the posting list of each word."""
+        self._ids = _DocIds()
+        self._ordinal_to_words: List[Optional[Tuple[TWord, ...]]] = []
+        """Unique words of each document. Needed to remove the document."""
+        self._max_tombstones_ratio = max_tombstones_ratio
+        self._compress_postings = compress_postings
+        self._stop_words_ratio = stop_words_ratio
+        self._foreign_df: Dict[TWord, int] = {}
+        """Number of documents containing each word in the other shards of
+        `ShardedFts`. Added to the local numbers, so the weights are
+        global."""
+        self._foreign_documents = 0
+        self._stats_version = 0
+        """Updates each time when the foreign statistics change."""
+
+        self._cache = _ResultCache(cache_size, cache_bytes) \
+            if cache_size else None
+        self._positions: Optional[_PositionIndex[TWord]] = \
+            _PositionIndex() if positions else None
+        self._version = 0
+        self._word_to_version: Dict[TWord, int] = {}
+        """The `_version` of the last change of the posting list of each
+        word. Maintained only with the cache."""
+        self._on_search = on_search
+        self._minhash: Optional[_MinHashIndex[TWord]] = \
+            _MinHashIndex(minhash_bands, minhash_rows) if minhash_bands \
+            else None
+        self._attributes = _AttributeIndex()
 
-    def add(self, words: Iterable[TWord], doc_id: Optional[str] = None) -> str:
-        """Adds a document to the database and returns its ID."""
+    @property
+    def documents_count(self) -> int:
+        return len(self._ids)
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        """The hits and misses of the result cache, or `None` if the cache
+        is not enabled."""
+        return self._cache.stats if self._cache is not None else None
+
+    def add(self, words: Iterable[TWord], doc_id: Optional[str] = None,
+            attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """Adds a document to the database and returns its ID.
+
+        The `attributes` map the names to the values, that the searches
+        can filter by (see `where` of `search`). A list or a set is several
+        values of the same attribute. The values must be hashable, and
+        comparable to be filtered by a `Range`."""
+        doc_id, unique_words = self._add_document(words, doc_id, attributes)
+        self._compress(unique_words)
+        self._touch(unique_words)
+        return doc_id
+
+    def add_many(self, docs: Iterable[Tuple[Any, ...]]) -> BulkAddReport:
+        """Adds documents from an iterable of `(doc_id, words)` pairs, or
+        `(doc_id, words, attributes)` triples.
+
+        Does the same as calling `add` for each document. The iterable is
+        consumed lazily. The posting lists are compressed and the cached
+        results are invalidated once at the end.
+        """
+        return _add_all(
+            docs,
+            lambda words, doc_id, attributes:
+            self._add_document(words, doc_id, attributes)[1],
+            self._finish_adding)
+
+    def _finish_adding(self, touched_words: Set[TWord], _added: int) -> None:
+        self._compress(touched_words)
+        self._touch(touched_words)
+
+    def _add_document(self, words: Iterable[TWord], doc_id: Optional[str],
+                      attributes: Optional[Mapping[str, Any]]) \
+            -> Tuple[str, Tuple[TWord, ...]]:
+        """Adds the document to the posting lists, and returns its ID and
+        its unique words. The caller compresses the posting lists of
+        the words and invalidates the cache."""
         if doc_id is None:
             doc_id = str(uuid.uuid4())
-        if doc_id in self._ids:
-            raise ValueError(f"Id '{doc_id}' is not unique")
-        self._ids.add(doc_id)
+        ordinal = self._ids.add(doc_id)
+        if attributes:
+            self._attributes.add(ordinal, attributes)
+        if self._positions is not None:
+            words = list(words)
+            self._positions.add(ordinal, words)
         ctr = Counter(words)
         total = sum(ctr.values())
         for word, count_in_this_doc in ctr.items():
             assert count_in_this_doc >= 1
             assert count_in_this_doc <= total
-            assert doc_id is not None
-            self._word_to_docs[word].append(
-                _WeightedDoc(doc_id=doc_id, weight=count_in_this_doc / total))
-        return doc_id
+            weight = count_in_this_doc / total
+            self._word_to_docs[word].append(ordinal, weight)
+            if weight > self._word_to_max_weight.get(word, 0):
+                self._word_to_max_weight[word] = weight
+        unique_words = tuple(ctr.keys())
+        self._ordinal_to_words.append(unique_words)
+        if self._minhash is not None:
+            self._minhash.add(ordinal, unique_words)
+        return doc_id, unique_words
+
+    def remove(self, doc_id: str) -> None:
+        """Removes the document from the database.
+
+        The postings of the document are only marked as removed. They are
+        dropped by `compact`, which runs automatically when the share of
+        removed documents exceeds `max_tombstones_ratio`.
+        """
+        ordinal = self._ids.remove(doc_id)
+        words = self._ordinal_to_words[ordinal]
+        assert words is not None
+        self._ordinal_to_words[ordinal] = None
+        for word in words:
+            removed = self._word_to_removed.get(word, 0) + 1
+            if removed == len(self._word_to_docs[word]):
+                # no more documents with this word
+                del self._word_to_docs[word]
+                del self._word_to_max_weight[word]
+                self._word_to_removed.pop(word, None)
+            else:
+                self._word_to_removed[word] = removed
+        self._touch(words)
+        if self._ids.tombstones_ratio > self._max_tombstones_ratio:
+            self.compact()
+
+    def update(self, doc_id: str, words: Iterable[TWord],
+               attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """Replaces the words and the attributes of the document."""
+        self.remove(doc_id)
+        return self.add(words, doc_id=doc_id, attributes=attributes)
+
+    def compact(self) -> None:
+        """Drops the postings of the removed documents."""
+        if not self._ids.tombstones_ratio:
+            return
+        new_ordinals = self._ids.compact()
+        self._ordinal_to_words = [words for words in self._ordinal_to_words
+                                  if words is not None]
+        if self._positions is not None:
+            self._positions.compact(new_ordinals)
+        if self._minhash is not None:
+            self._minhash.compact(new_ordinals)
+        self._attributes.compact(new_ordinals)
+        for word, postings in self._word_to_docs.items():
+            if word in self._word_to_removed:
+                postings = postings.compacted(new_ordinals)
+                self._word_to_docs[word] = postings
+                self._word_to_max_weight[word] = max(postings.weights)
+            elif isinstance(postings.ordinals, array):
+                for i, ordinal in enumerate(postings.ordinals):
+                    postings.ordinals[i] = new_ordinals[ordinal]
+            else:
+                postings.ordinals = postings.ordinals.compacted(new_ordinals)
+        self._word_to_removed = {}
+
+    def _compress(self, words: Iterable[TWord]) -> None:
+        """Compresses the posting lists of the words that got long enough,
+        if `compress_postings` is enabled."""
+        if self._compress_postings:
+            for word in words:
+                self._word_to_docs[word].compress()
+
+    def _touch(self, words: Iterable[TWord]) -> None:
+        """Marks the posting lists of the words as changed, so the cached
+        results of their queries are stale."""
+        if self._cache is not None:
+            self._version += 1
+            version = self._version
+            for word in words:
+                self._word_to_version[word] = version
+
+    def _cache_stamp(self, query: List[TWord]) -> Hashable:
+        """The versions of everything the results of the query depend on:
+        the posting lists of the query words, and the statistics of the
+        other shards."""
+        return (self._stats_version,
+                frozenset((word, self._word_to_version.get(word))
+                          for word in set(query)))
+
+    def _local_df(self, word: TWord) -> int:
+        docs_with_word = self._word_to_docs.get(word)
+        if docs_with_word is None:
+            return 0
+        return len(docs_with_word) - self._word_to_removed.get(word, 0)
+
+    def _df(self, word: TWord) -> int:
+        """Number of documents containing the word."""
+        return self._local_df(word) + self._foreign_df.get(word, 0)
+
+    @property
+    def stop_words(self) -> Set[TWord]:
+        """The words that are in more than `stop_words_ratio` of
+        the documents now."""
+        if self._stop_words_ratio is None:
+            return set()
+        max_df = self._stop_words_ratio \
+            * (self.documents_count + self._foreign_documents)
+        return set(word for word in self._word_to_docs
+                   if self._df(word) > max_df)
+
+    def _query_stop_words(self, words: Iterable[TWord]) -> Tuple[TWord, ...]:
+        """Returns the stop words among the query words that occur in
+        the database, or nothing, if all of them are stop words."""
+        if self._stop_words_ratio is None:
+            return ()
+        max_df = self._stop_words_ratio \
+            * (self.documents_count + self._foreign_documents)
+        dfs = [(word, self._df(word)) for word in words]
+        if all(df > max_df for _, df in dfs if df > 0):
+            return ()
+        return tuple(word for word, df in dfs if df > max_df)
+
+    def _document_frequencies(self) -> Dict[TWord, int]:
+        """Number of documents containing each word in this database."""
+        return dict((word, self._local_df(word))
+                    for word in self._word_to_docs)
+
+    def use_global_stats(self, word_to_df: Dict[TWord, int],
+                         documents_count: int) -> None:
+        """Makes the weights computed from the statistics of all the shards
+        of `ShardedFts`, or all the segments of `SegmentedFts`, including
+        this one. Until the next call, the numbers from the others are
+        considered constant."""
+        self._foreign_df = dict((word, df - self._local_df(word))
+                                for word, df in word_to_df.items()
+                                if df > self._local_df(word))
+        self._foreign_documents = documents_count - self.documents_count
+        self._stats_version += 1
 
     def search(self, query: Iterable[TWord],
-               prioritize_number_of_words_matched: bool = False) -> List[str]:
+               prioritize_number_of_words_matched: bool = False,
+               limit: Optional[int] = None,
+               min_score: Optional[float] = None,
+               required: Iterable[TWord] = (),
+               excluded: Iterable[TWord] = (),
+               match_all: bool = False,
+               approximate: bool = False,
+               where: Optional[Mapping[str, Any]] = None) -> List[str]:
         """Returns IDs of documents that include at least one word from `query`.
         More relevant matches will be at the top of the list.
         `prioritize_words_count` determines whether the documents with the most
         words from the query should always be ranked higher. If `False`, the
         number of matches may be outweighed by the rarity of matched words
         or their frequency in the document.
+
+        `limit` is the maximum number of IDs to return. With a limit, only
+        the best matches are ranked, and the documents that cannot get into
+        the top are not even collected.
+
+        `min_score` excludes the documents with lower sums of weights (see
+        `search_scored`). The documents that cannot reach it are not
+        collected either.
+
+        `required` words must all be in the returned documents, and
+        `excluded` words must not be in them. With `match_all`, all
+        the words of the query are required. These filters do not change
+        the scores. The documents are selected by intersecting the sorted
+        posting lists, starting from the shortest one, and only they are
+        scored.
+
+        With `approximate`, only the documents with similar sets of words
+        are scored (see `minhash_bands`). Some of the matches may be
+        missed, but the found ones have the same scores.
+
+        `where` maps the names of the attributes of the documents (see
+        `add`) to the conditions they must match: a value, a list or a set
+        of values to match any of them, or a `Range`. The documents are
+        selected by the bitmaps of the attribute values before scoring, so
+        the search is as fast as the selected documents are few.
+        """
+        # the ID is the last item of the ranking key
+        return [key[-1] for key, _ in self._ranked(
+            query,
+            prioritize_number_of_words_matched=
+            prioritize_number_of_words_matched,
+            limit=limit,
+            min_score=min_score,
+            required=required,
+            excluded=excluded,
+            match_all=match_all,
+            approximate=approximate,
+            where=where)]
+
+    def search_scored(self, query: Iterable[TWord],
+                      prioritize_number_of_words_matched: bool = False,
+                      limit: Optional[int] = None,
+                      min_score: Optional[float] = None,
+                      required: Iterable[TWord] = (),
+                      excluded: Iterable[TWord] = (),
+                      match_all: bool = False,
+                      approximate: bool = False,
+                      where: Optional[Mapping[str, Any]] = None) \
+            -> List[ScoredMatch]:
+        """Same as `search`, but returns the scores of the documents, that
+        are the sums of weights of the matched words."""
+        return [match for _, match in self._scored_matches(self._ranked(
+            query,
+            prioritize_number_of_words_matched=
+            prioritize_number_of_words_matched,
+            limit=limit,
+            min_score=min_score,
+            required=required,
+            excluded=excluded,
+            match_all=match_all,
+            approximate=approximate,
+            where=where))]
+
+    def search_iter(self, query: Iterable[TWord],
+                    prioritize_number_of_words_matched: bool = False,
+                    min_score: Optional[float] = None,
+                    required: Iterable[TWord] = (),
+                    excluded: Iterable[TWord] = (),
+                    match_all: bool = False,
+                    where: Optional[Mapping[str, Any]] = None) \
+            -> Iterator[ScoredMatch]:
+        """Returns an iterator over the results of `search_scored`.
+
+        All the matching documents are scored at once, but they are sorted
+        lazily, as the iterator is consumed. So the first results are ready
+        in linear time.
         """
+        top = self._top(query,
+                        prioritize_number_of_words_matched=
+                        prioritize_number_of_words_matched,
+                        min_score=min_score,
+                        required=required,
+                        excluded=excluded,
+                        match_all=match_all,
+                        where=where)
+        return (self._scored_match(key, match)
+                for key, match in top.iter_sorted_entries())
+
+    def search_page(self, query: Iterable[TWord], page_size: int,
+                    cursor: Optional[str] = None,
+                    prioritize_number_of_words_matched: bool = False,
+                    min_score: Optional[float] = None,
+                    required: Iterable[TWord] = (),
+                    excluded: Iterable[TWord] = (),
+                    match_all: bool = False,
+                    where: Optional[Mapping[str, Any]] = None) -> SearchPage:
+        """Returns a page of the results of `search_scored`.
+
+        The first page is the same as the search with `limit=page_size`.
+        The next pages are requested with the `next_cursor` of the previous
+        page and the same query and options. The pages are consistent while
+        the database is not changed.
+        """
+        below = _decode_cursor(cursor) if cursor is not None else None
+        entries = self._ranked(query,
+                               prioritize_number_of_words_matched=
+                               prioritize_number_of_words_matched,
+                               limit=_page_size(page_size),
+                               min_score=min_score,
+                               below=below,
+                               required=required,
+                               excluded=excluded,
+                               match_all=match_all,
+                               where=where)
+        return _page(self._scored_matches(entries), page_size)
+
+    def search_phrase(self, phrase: List[TWord],
+                      limit: Optional[int] = None,
+                      min_score: Optional[float] = None) -> List[str]:
+        """Returns IDs of documents that contain the words of `phrase` one
+        after another, in the same order. They are ranked as by `search`
+        for the words of the phrase. Requires `positions=True`."""
+        positions = self._position_index()
+        return [key[-1] for key, _ in self._sorted_top(
+            phrase, limit=limit, min_score=min_score, match_all=True,
+            narrow=lambda ordinals: positions.with_phrase(phrase, ordinals))]
+
+    def search_near(self, words: List[TWord], distance: int,
+                    limit: Optional[int] = None,
+                    min_score: Optional[float] = None) -> List[str]:
+        """Returns IDs of documents that contain all the `words`, in any
+        order, within `distance` positions from the first to the last. For
+        example, the neighbouring words are within the distance of 1. They
+        are ranked as by `search` for the words. Requires
+        `positions=True`."""
+        if distance < 0:
+            raise ValueError(f"Negative distance: {distance}")
+        positions = self._position_index()
+        return [key[-1] for key, _ in self._sorted_top(
+            words, limit=limit, min_score=min_score, match_all=True,
+            narrow=lambda ordinals: positions.with_near(words, distance,
+                                                        ordinals))]
+
+    def _position_index(self) -> _PositionIndex[TWord]:
+        if self._positions is None:
+            raise ValueError("The positions are not indexed. "
+                             "Create the database with positions=True")
+        return self._positions
+
+    def search_many(self, queries: Iterable[Iterable[TWord]],
+                    prioritize_number_of_words_matched: bool = False,
+                    limit: Optional[int] = None,
+                    min_score: Optional[float] = None,
+                    required: Iterable[TWord] = (),
+                    excluded: Iterable[TWord] = (),
+                    match_all: bool = False,
+                    approximate: bool = False,
+                    where: Optional[Mapping[str, Any]] = None) \
+            -> List[List[str]]:
+        """Does the same as calling `search` for each query, and returns
+        the results in the same order as the queries."""
+        return [[key[-1] for key, _ in entries]
+                for entries in self._ranked_many(
+                queries,
+                prioritize_number_of_words_matched=
+                prioritize_number_of_words_matched,
+                limit=limit,
+                min_score=min_score,
+                required=required,
+                excluded=excluded,
+                match_all=match_all,
+                approximate=approximate,
+                where=where)]
+
+    def _ranked_many(self, queries: Iterable[Iterable[TWord]],
+                     prioritize_number_of_words_matched: bool = False,
+                     limit: Optional[int] = None,
+                     min_score: Optional[float] = None,
+                     below: Optional[Tuple[Any, ...]] = None,
+                     scored: bool = False,
+                     **filters) -> List[List[Tuple[Any, Any]]]:
+        """Returns the `_ranked` results for each query. With `scored`,
+        the items are converted to `ScoredMatch`."""
+        # The weights are stored in the postings, so there is nothing to
+        # compute once for the batch
+        result = [self._ranked(query,
+                               prioritize_number_of_words_matched=
+                               prioritize_number_of_words_matched,
+                               limit=limit,
+                               min_score=min_score,
+                               below=below,
+                               **filters)
+                  for query in queries]
+        if scored:
+            return [self._scored_matches(entries) for entries in result]
+        return result
+
+    def _ranked(self, query: Iterable[TWord], **options) \
+            -> List[Tuple[Any, _Match]]:
+        """Returns the (ranking key, match) pairs of the top documents.
+        The last item of the key is the document ID."""
+        if self._cache is None:
+            return self._sorted_top(query, **options)
+        query = list(query)
+        required = frozenset(options.pop('required', ()))
+        excluded = frozenset(options.pop('excluded', ()))
+        where = options.pop('where', None)
+        key = (_query_key(query), required, excluded, _where_key(where),
+               frozenset(options.items()),
+               frozenset(self._query_stop_words(set(query))))
+        stamp = self._cache_stamp([*query, *required, *excluded])
+        entries = self._cache.get(key, stamp)
+        if entries is None:
+            entries = self._sorted_top(query, required=required,
+                                       excluded=excluded, where=where,
+                                       **options)
+            self._cache.put(key, stamp, entries)
+        elif self._on_search is not None:
+            self._on_search(_cached_stats(query))
+        return entries
+
+    def _sorted_top(self, query: Iterable[TWord], **options) \
+            -> List[Tuple[Any, _Match]]:
+        """Returns the sorted entries of `_top`, and reports the search to
+        `on_search`."""
+        if self._on_search is None:
+            return self._top(query, **options).sorted_entries()
+        query = list(query)
+        profile = _Profile()
+        entries = self._top(query, profile=profile, **options) \
+            .sorted_entries()
+        self._on_search(profile.stats(query))
+        return entries
+
+    def _top(self, query: Iterable[TWord],
+             prioritize_number_of_words_matched: bool = False,
+             limit: Optional[int] = None,
+             min_score: Optional[float] = None,
+             below: Optional[Tuple[Any, ...]] = None,
+             required: Iterable[TWord] = (),
+             excluded: Iterable[TWord] = (),
+             match_all: bool = False,
+             narrow: Optional[Callable[[List[int]], List[int]]] = None,
+             profile: Optional[_Profile] = None,
+             approximate: bool = False,
+             where: Optional[Mapping[str, Any]] = None) \
+            -> _TopK[_Match]:
+        """Returns the top of matches. `below` is the cursor key of
+        the previous page. The other arguments are the filters of
+        `search`, and `narrow`, that gets the sorted ordinals selected by
+        them and returns a part of them. The `profile` collects the stats
+        of the search. With `approximate`, only the MinHash candidates
+        are matched, and with `where`, only the documents with matching
+        attributes."""
         query_word_to_count = Counter(query)
         if len(query_word_to_count) <= 0:
             raise ValueError("Query is empty")
+        required = frozenset(required).union(query_word_to_count) \
+            if match_all else frozenset(required)
+        excluded = frozenset(excluded)
+        top: _TopK[_Match] = _TopK(limit, below)
+        # The matches above the cursor would take places in the top, while
+        # they will not be returned. So a search after the cursor collects
+        # all the matches
+        pruning_limit = limit if below is None else None
 
-        candidates: Dict[str, _Match] = {}
-        for word, word_occurrences_in_query in query_word_to_count.items():
-            docs_with_word = self._word_to_docs.get(word) or []
-            for weighted_by_word in docs_with_word:
-                # `weighted_by_word` - это часть базы. Мы сейчас возьмем
-                # сведения из это объекта и оставим его неизменным в базе.
-                # `weighted_by_word` содержит ссылку на документ,
-                # где встретилось слово `word` из запроса, а также весовой
-                # коэффициент 0..1 этого слова относительно конкретного
-                # документа (вес больше, если слово в документе встречалось
-                # чаще)
-                assert 0 < weighted_by_word.weight <= 1
+        ordinal_to_id = self._ids.ordinal_to_id
+        if prioritize_number_of_words_matched:
+            def sorting_key(match: _Match):
+                return (match.words_matched, match.sum_weight,
+                        ordinal_to_id[match.ordinal])
+        else:
+            def sorting_key(match: _Match):
+                return match.sum_weight, ordinal_to_id[match.ordinal]
+
+        # Each word of the query cannot add to the `sum_weight` of a document
+        # more than its upper bound. We process the words with the highest
+        # bounds first. When the top is already filled with matches, and
+        # the remaining words cannot lift a new document above the top,
+        # we stop collecting new documents (this is the MaxScore approach).
+        stop_words = self._query_stop_words(query_word_to_count)
+        query_terms = [term for term
+                       in self._query_terms(query_word_to_count)
+                       if term[0] not in stop_words]
+        terms = sorted(query_terms, key=lambda t: t[2], reverse=True)
+        if profile is not None:
+            profile.stop_words = stop_words
+
+        if required or excluded or narrow is not None or approximate \
+                or where:
+            # The documents are known in advance, so there is nothing to
+            # prune. The weights are summed in the order of the query
+            candidates_lists: List[Sequence[int]] = []
+            if approximate:
+                candidates_lists.append(
+                    self._minhash_candidates(query_word_to_count))
+            if where:
+                candidates_lists.append(list(self._attributes.matching(where)))
+            filtered = self._filtered_ordinals(
+                [word for word, _, _ in terms], required, excluded,
+                _intersect(candidates_lists) if candidates_lists else None)
+            if narrow is not None:
+                filtered = narrow(filtered)
+            if profile is not None:
+                profile.prepared(len(terms))
+                profile.postings = sum(
+                    min(len(self._word_to_docs[word]), len(filtered))
+                    for word, _, _ in terms)
+            candidates = self._filtered_matches(query_terms, filtered)
+            if profile is not None:
+                profile.scored(len(candidates))
+            self._push_matches(top, candidates, sorting_key, min_score)
+            return top
+
+        if profile is not None:
+            profile.prepared(len(terms))
+        candidates = {}
+        collecting_new = (limit is None or limit > 0) \
+            and self._new_match_can_get_into_top(
+            terms, [], sorting_key, None, min_score,
+            prioritize_number_of_words_matched)
+        for term_idx, (word, word_occurrences_in_query, _) \
+                in enumerate(terms):
+            _check_stopped()
+            docs_with_word = self._word_to_docs[word]
+            df = self._df(word)
+            if not collecting_new and len(candidates) < len(docs_with_word):
+                # The top is already known to consist of the collected
+                # documents, and there are fewer of them than the documents
+                # with the word. So we do not walk the posting list, but
+                # look up the collected documents in it
+                if profile is not None:
+                    profile.postings += len(candidates)
+                    profile.skipped_words.append(word)
+                for ordinal, index in _matching(docs_with_word.ordinals,
+                                                sorted(candidates)):
+                    collected = candidates[ordinal]
+                    collected.sum_weight += (
+                            docs_with_word.weights[index]
+                            * word_occurrences_in_query
+                            / df)
+                    collected.words_matched += 1
+                continue
+            if profile is not None:
+                profile.postings += len(docs_with_word)
+            for ordinal, weight in docs_with_word:
+                if ordinal_to_id[ordinal] is None:
+                    continue  # removed
+                # `ordinal` и `weight` - это часть базы. `ordinal` ссылается
+                # на документ, где встретилось слово `word` из запроса,
+                # а `weight` - весовой коэффициент 0..1 этого слова
+                # относительно конкретного документа (вес больше, если слово
+                # в документе встречалось чаще)
+                assert 0 < weight <= 1
 
                 # `match` - это объект, используемый только при анализе
                 # данного запроса. Он соответствует отдельному документу.
                 # Перебирая все слова из запроса, мы возвращаемся к одним и
                 # тем же `match`, обновляя их поля
-                match = candidates.get(weighted_by_word.doc_id)
+                match = candidates.get(ordinal)
                 if match is None:
+                    if not collecting_new:
+                        continue
                     match = _Match(
                         sum_weight=0,
                         words_matched=0,
-                        doc_id=weighted_by_word.doc_id)
-                    candidates[weighted_by_word.doc_id] = match
+                        ordinal=ordinal)
+                    candidates[ordinal] = match
                 match.sum_weight += (
-                        weighted_by_word.weight
+                        weight
                         * word_occurrences_in_query
-                        / len(docs_with_word))
+                        / df)
                 match.words_matched += 1
 
-        if prioritize_number_of_words_matched:
-            def sorting_key(match: _Match):
-                return match.words_matched, match.sum_weight, match.doc_id
-        else:
-            def sorting_key(match: _Match):
-                return match.sum_weight, match.doc_id
+            remaining = terms[term_idx + 1:]
+            if collecting_new:
+                collecting_new = self._new_match_can_get_into_top(
+                    remaining, candidates.values(), sorting_key,
+                    pruning_limit, min_score,
+                    prioritize_number_of_words_matched)
+            if not collecting_new and remaining:
+                # The documents that cannot get into the top are not
+                # needed anymore, so the next words may be looked up for
+                # fewer documents
+                max_sum_weight = 0.0
+                for _, _, upper_bound in remaining:
+                    max_sum_weight += upper_bound
+                _drop_hopeless(
+                    candidates, lambda match: match.sum_weight,
+                    max_sum_weight,
+                    None if prioritize_number_of_words_matched
+                    else pruning_limit,
+                    min_score)
+
+        if terms != query_terms:
+            self._resum_in_query_order(candidates, query_terms)
+        if profile is not None:
+            profile.scored(len(candidates))
+        self._push_matches(top, candidates, sorting_key, min_score)
+        return top
+
+    def _resum_in_query_order(self, candidates: Dict[int, _Match],
+                              query_terms: List[Tuple[TWord, int, float]]) \
+            -> None:
+        """Sums the weights of the matches again in the order of the query
+        words, so the scores do not depend on the order the words were
+        processed in. Two weights give the same sum in any order, so only
+        the matches with more words are summed again."""
+        resummed = sorted(ordinal for ordinal, match in candidates.items()
+                          if match.words_matched > 2)
+        if not resummed:
+            return
+        for ordinal in resummed:
+            candidates[ordinal].sum_weight = 0
+        for word, word_occurrences_in_query, _ in query_terms:
+            postings = self._word_to_docs[word]
+            df = self._df(word)
+            for ordinal, index in _matching(postings.ordinals, resummed):
+                candidates[ordinal].sum_weight += (
+                        postings.weights[index]
+                        * word_occurrences_in_query
+                        / df)
+
+    @staticmethod
+    def _push_matches(top: _TopK[_Match], candidates: Dict[int, _Match],
+                      sorting_key: Callable[[_Match], Any],
+                      min_score: Optional[float]) -> None:
+        for match in candidates.values():
+            if min_score is not None and match.sum_weight < min_score:
+                continue
+            top.push(sorting_key(match), match)
+
+    def _minhash_candidates(self, words: Iterable[TWord]) -> List[int]:
+        if self._minhash is None:
+            raise ValueError("The approximate search is not enabled. "
+                             "Create the database with minhash_bands")
+        return self._minhash.candidates(words)
 
-        result = sorted(candidates.values(), key=sorting_key, reverse=True)
-        return [r.doc_id for r in result]
+    def _filtered_ordinals(self, words: List[TWord],
+                           required: AbstractSet[TWord],
+                           excluded: AbstractSet[TWord],
+                           candidates: Optional[List[int]] = None) \
+            -> List[int]:
+        """Returns the sorted ordinals of the documents with any of the
+        words, all the `required` words and none of the `excluded`. With
+        the sorted `candidates`, only they are selected."""
+        if not all(self._word_to_docs.get(word) for word in required):
+            return []
+        all_of: List[Sequence[int]] = [self._word_to_docs[word].ordinals
+                                       for word in required]
+        if candidates is not None:
+            all_of.append(candidates)
+        ordinals = _filtered(
+            any_of=[self._word_to_docs[word].ordinals for word in words],
+            all_of=all_of,
+            none_of=[self._word_to_docs[word].ordinals for word in excluded
+                     if word in self._word_to_docs])
+        ordinal_to_id = self._ids.ordinal_to_id
+        return [ordinal for ordinal in ordinals
+                if ordinal_to_id[ordinal] is not None]
+
+    def _filtered_matches(self, terms: List[Tuple[TWord, int, float]],
+                          ordinals: List[int]) -> Dict[int, _Match]:
+        """Matches the query terms with the documents of the sorted
+        ordinals only."""
+        candidates: Dict[int, _Match] = {}
+        for word, word_occurrences_in_query, _ in terms:
+            _check_stopped()
+            postings = self._word_to_docs[word]
+            df = self._df(word)
+            for ordinal, index in _matching(postings.ordinals, ordinals):
+                match = candidates.get(ordinal)
+                if match is None:
+                    match = _Match(sum_weight=0, words_matched=0,
+                                   ordinal=ordinal)
+                    candidates[ordinal] = match
+                match.sum_weight += (
+                        postings.weights[index]
+                        * word_occurrences_in_query
+                        / df)
+                match.words_matched += 1
+        return candidates
+
+    @staticmethod
+    def _scored_match(key: Tuple[Any, ...], match: _Match) -> ScoredMatch:
+        return ScoredMatch(doc_id=key[-1], score=match.sum_weight,
+                           words_matched=match.words_matched)
+
+    def _scored_matches(self, entries: List[Tuple[Any, _Match]]) \
+            -> List[Tuple[Any, ScoredMatch]]:
+        return [(key, self._scored_match(key, match))
+                for key, match in entries]
+
+    def freeze(self) -> FrozenFts[TWord]:
+        """Returns a read-only copy of the database, where the weights
+        of all the words in all the documents are precomputed and sorted
+        by impact. The copy returns the same results as this database at
+        the moment of freezing, up to floating-point ties, but searches with
+        a `limit` faster.
+
+        The copy does not support `prioritize_number_of_words_matched`.
+        The database is compacted before freezing.
+        """
+        self.compact()
+        word_to_postings = dict(
+            (word, _impact_ordered(
+                (weight, ordinal) for ordinal, weight in docs_with_word))
+            for word, docs_with_word in self._word_to_docs.items()
+            if docs_with_word)
+        return FrozenFts(
+            word_to_postings=word_to_postings,
+            # no tombstones after the compaction
+            doc_ids=[doc_id for doc_id in self._ids.ordinal_to_id
+                     if doc_id is not None],
+            word_to_idf=None)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Freezes the database and writes it to a binary file. The file is
+        opened by `FrozenFts.load`."""
+        self.freeze().save(path)
+
+    def _query_terms(self, query_word_to_count: Dict[TWord, int]) \
+            -> Iterable[Tuple[TWord, int, float]]:
+        """Yields (word, occurrences in query, upper bound) for each query
+        word that occurs in the database. The upper bound is computed by
+        the same formula as the weight added to a match, so the rounding
+        errors cannot make the actual weight greater than the bound."""
+        for word, word_occurrences_in_query in query_word_to_count.items():
+            docs_with_word = self._word_to_docs.get(word)
+            if not docs_with_word:
+                continue
+            upper_bound = (self._word_to_max_weight[word]
+                           * word_occurrences_in_query
+                           / self._df(word))
+            yield word, word_occurrences_in_query, upper_bound
+
+    @staticmethod
+    def _new_match_can_get_into_top(
+            remaining_terms: List[Tuple[TWord, int, float]],
+            matches: Collection[_Match],
+            sorting_key,
+            limit: Optional[int],
+            min_score: Optional[float],
+            prioritize_number_of_words_matched: bool) -> bool:
+        """Checks whether a match that is not collected yet can get into
+        the full top, and reach the `min_score`, using only the remaining
+        words of the query."""
+        if not remaining_terms:
+            return False
+        top_is_full = limit is not None and len(matches) >= limit
+        if min_score is None and not top_is_full:
+            return True
+        # The weights of the matches will be summed again in the order of
+        # the query, that may change the last bits of the sums
+        max_sum_weight = _ROUNDING
+        for _, _, upper_bound in remaining_terms:
+            max_sum_weight += upper_bound
+        if min_score is not None and max_sum_weight < min_score:
+            return False
+        if not top_is_full:
+            return True
+        assert limit is not None
+        lowest_in_top = heapq.nlargest(limit, map(sorting_key, matches))[-1]
+        if prioritize_number_of_words_matched:
+            return (len(remaining_terms), max_sum_weight) >= lowest_in_top[:2]
+        return max_sum_weight >= lowest_in_top[0]
@@ -1,114 +1,141 @@
 # SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
 # SPDX-License-Identifier: MIT
 
-# Nice articles:
-# * https://towardsdatascience.com/measure-text-weight-using-tf-idf-in-python-plain-code-and-scikit-learn-50cb1e4375ad
-# * https://towardsdatascience.com/tf-idf-for-document-ranking-from-scratch-in-python-on-real-world-dataset-796d339a4089
-
+import heapq
 import uuid
+from array import array
 from collections import defaultdict, Counter
-from math import log, sqrt
-from typing import Iterable, List, Optional, TypeVar, Generic, Dict, Callable, \
-    Collection
+from pathlib import Path
+from typing import Iterable, List, Optional, TypeVar, Generic, Dict, Tuple, \
+    Union, Set, Any, Collection, Iterator, Hashable, AbstractSet, Callable, \
+    Mapping, Sequence
 
-from gifts._cosine_similarity import cosine_similarity
+from gifts._attributes import _AttributeIndex, _where_key
+from gifts._bulk import BulkAddReport, _add_all
+from gifts._cache import CacheStats, _ResultCache, _query_key
+from gifts._cursor import SearchPage, _decode_cursor, _page, _page_size
+from gifts._document import _Document, _idf
+from gifts._fts_frozen import FrozenFts, _impact_ordered
+from gifts._matrix import _Matrix, numpy
+from gifts._positions import _PositionIndex
+from gifts._profile import SearchStats, _Profile, _cached_stats
+from gifts._postings import _DocIds, _Ordinals, _ordinals, \
+    _compact_ordinals, _compressed, _filtered, _matching
+from gifts._scored_match import ScoredMatch
+from gifts._similar import SimilarPair, _all_pairs
+from gifts._stop import _check_stopped
+from gifts._top_k import _TopK, _drop_hopeless
 
 TWord = TypeVar('TWord')
 
 
-def _idf(docs_with_word: int, docs_total: int) -> float:
-    """Inverse document frequency. Gives lower values for frequently used
-    words.
+class SmoothFts(Generic[TWord]):
+    def __init__(self, idf_refresh_ratio: float = 0.0,
+                 max_tombstones_ratio: float = 0.5,
+                 use_numpy: Optional[bool] = None,
+                 cache_size: int = 0,
+                 cache_bytes: Optional[int] = None,
+                 positions: bool = False,
+                 on_search: Optional[Callable[[SearchStats], None]] = None,
+                 compress_postings: bool = False,
+                 stop_words_ratio: Optional[float] = None):
+        """`idf_refresh_ratio` allows the IDF statistics to get stale.
 
-    Here, the variant of the formula used in SciKit (https://bit.ly/3zEDkMn)
-    is closest to "inverse document frequency smooth" from
-    [Wikipedia](https://en.wikipedia.org/wiki/Tf%E2%80%93idf).
-    """
-    assert docs_with_word <= docs_total
-    return log((docs_total + 1) / (docs_with_word + 1)) + 1
+        By default (`0.0`), the IDF is recomputed after every change, and the
+        weights of the documents are recomputed at the next search. With
+        `0.1`, the IDF is kept until the number of added and removed
+        documents exceeds 10% of the documents since the last refresh.
+        The scores are then approximate, but the cached weights survive
+        the changes. Call `refresh` to get the exact scores at any moment.
 
+        `max_tombstones_ratio` is the share of removed documents, after
+        which the database is compacted automatically.
 
-def _tf(word_occured_in_doc: int, total_words_in_doc: int) -> float:
-    """Term frequency of a word in certain document.
+        `use_numpy` makes the searches compute the scores with a sparse
+        matrix of weights by NumPy. The results are the same. The matrix
+        is built when the database has not changed since the previous
+        search, or for a batch of queries, and kept until the next change.
+        By default (`None`), NumPy is used if it is installed.
 
-    See: https://bit.ly/3zEDkMn
-    """
+        `cache_size` enables the cache of the results of up to that number
+        of queries, optionally limited to about `cache_bytes` of memory.
+        The least recently used results are evicted first. A cached result
+        is dropped when the documents with the query words change, or the
+        IDF is refreshed.
 
-    assert word_occured_in_doc <= total_words_in_doc
-    return word_occured_in_doc / total_words_in_doc
+        `positions` enables the index of the positions of the words in
+        the documents, that is needed for `search_phrase` and `search_near`.
 
+        `on_search` is called after each search, except `search_iter`, with
+        the `SearchStats` of what it did and how long it took. Without it,
+        nothing is measured.
 
-class _Document(Generic[TWord]):
-    def __init__(self, doc_id: Optional[str], words: List[TWord]):
-        self.doc_id = doc_id
-        self._words = words
-        counts = Counter(self._words)
-        words_in_doc = len(self._words)
-        assert sum(counts.values()) == len(self._words)
-        self._tf: Dict[TWord, float] = \
-            dict((word, _tf(word_occurrences, words_in_doc))
-                 for (word, word_occurrences)
-                 in counts.items())
-        self._word_to_weight: Optional[Dict[TWord, float]] = None
-        self._weights_version: Optional[int] = None
+        `compress_postings` keeps the ordinals of the documents in the long
+        posting lists as delta-encoded varints, in blocks with skips: about
+        a byte per posting instead of 4. The searches decode them, so they
+        are slower.
 
-    @property
-    def unique_words(self) -> Collection[TWord]:
-        return self._tf.keys()
-
-    def weight(self,
-               word: TWord,
-               idf: Callable[[TWord], float],
-               idf_version: int) \
-            -> float:
-        """Returns the normalized weight of `word` in the current document.
-
-        It is a smoothed version of TF-IDF, as used is SciKit-Learn and
-        described at https://bit.ly/3zEDkMn V_norm.
-
-        Basically it is a euclidean norm like:
-            V[i] / sqrt(V[1]**2 + V[2]**2 + ... + V[n]**2)
-        where V[i] is a TF-IDF of term i
+        `stop_words_ratio` makes the words that occur in more than that
+        share of the documents the stop words. The searches ignore them:
+        they neither select the documents nor add to the scores. Unless
+        the query has no other words that occur in the database. The
+        share is checked at each search, so the words become stop words
+        and stop being them as the documents are added and removed.
+        `more_like_this` and `similar_pairs` compare all the words.
         """
-        # We cannot calculate the weight when creating a document: at that time,
-        # we still do not have statistics on all (other) documents and the
-        # frequency of words in them. And now we have been given information
-        # about the frequency by the `idf` argument.
-        if self._word_to_weight is None or self._weights_version != idf_version:
-            # Either we never calculated the weights, or the word frequency
-            # information has been updated. In any case, the weights must
-            # be recalculated.
-            #
-            # Now we will compute euclidean norm for all words in document.
-            # Numerator will be different for each word, denominator will be
-            # the same for all words. We prefer to compute weights for all
-            # words at once to avoid recomputing denominator
-            unique_words = self._tf.keys()
-            denominator = sqrt(sum(self._tf_idf(w, idf) ** 2
-                                   for w in unique_words))
-            self._word_to_weight = dict(
-                (w, self._tf_idf(w, idf) / denominator)
-                for w in unique_words)
-            self._weights_version = idf_version
-
-        assert self._weights_version == idf_version
-        return self._word_to_weight.get(word, 0)
-
-        # https://stackoverflow.com/a/46812408
-
-    def _tf_idf(self, word: TWord, idf: Callable[[TWord], float]) -> float:
-        return self._tf.get(word, 0) * idf(word)
-
-    # def normalized_term_weight(self, word: TWord) -> float:
-
-
-class SmoothFts(Generic[TWord]):
-    def __init__(self):
-        self._id_to_doc: Dict[str, _Document] = {}
-        self._word_to_docs: Dict[TWord, List[_Document]] = defaultdict(list)
+        if stop_words_ratio is not None and not 0 < stop_words_ratio <= 1:
+            raise ValueError(f"Ratio out of (0, 1]: {stop_words_ratio}")
+        if idf_refresh_ratio < 0:
+            raise ValueError(f"Negative ratio: {idf_refresh_ratio}")
+        if use_numpy and numpy is None:
+            raise ImportError("NumPy is not installed")
+        self._ids = _DocIds()
+        self._docs: List[Optional[_Document]] = []
+        """Documents by ordinal. `None` for the removed documents."""
+        self._word_to_docs: Dict[TWord, _Ordinals] = defaultdict(_ordinals)
+        """Ordinals of the documents containing each word."""
+        self._word_to_removed: Dict[TWord, int] = {}
+        """Number of tombstones in the posting list of each word."""
+        self._max_tombstones_ratio = max_tombstones_ratio
+        self._compress_postings = compress_postings
+        self._stop_words_ratio = stop_words_ratio
 
         self._db_version = 0
         """Updates each time when we add or remove document."""
+        self._word_to_version: Dict[TWord, int] = {}
+        """The `_db_version` of the last change of the posting list of each
+        word. Maintained only with the cache."""
+        self._compacted_version = 0
+        """The `_db_version` of the last compaction, that renumbered the
+        ordinals."""
+
+        self._idf_refresh_ratio = idf_refresh_ratio
+        self._idf_version = 0
+        """Updates each time when the IDF statistics are refreshed. The
+        weights cached in the documents are valid for a single version."""
+        self._idf_documents_count = 0
+        self._changes_since_refresh = 0
+        self._word_to_idf_cache: Dict[TWord, float] = {}
+        self._word_to_max_weight: Dict[TWord, float] = {}
+        """The max weight of each word among the documents. It is an upper
+        bound of what a word can add to a score. Computed as a side effect of
+        the searches, valid for the current `_idf_version`."""
+
+        self._foreign_df: Dict[TWord, int] = {}
+        """Number of documents containing each word in the other shards of
+        `ShardedFts`. Added to the local numbers, so the IDF is global."""
+        self._foreign_documents = 0
+
+        self._use_numpy = numpy is not None and use_numpy is not False
+        self._matrix: Optional[_Matrix[TWord]] = None
+        self._last_search_stamp: Optional[Tuple[int, int]] = None
+
+        self._cache = _ResultCache(cache_size, cache_bytes) \
+            if cache_size else None
+        self._positions: Optional[_PositionIndex[TWord]] = \
+            _PositionIndex() if positions else None
+        self._on_search = on_search
+        self._attributes = _AttributeIndex()
 
     @property
     def words_count(self) -> int:
@@ -116,81 +143,885 @@ class SmoothFts(Generic[TWord]):
 
     @property
     def documents_count(self) -> int:
-        return len(self._id_to_doc)
+        return len(self._ids)
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        """The hits and misses of the result cache, or `None` if the cache
+        is not enabled."""
+        return self._cache.stats if self._cache is not None else None
 
     def add(self, words: List[TWord],
-            doc_id: Optional[str] = None) -> _Document:
-        """Adds a document to the database and returns its ID."""
+            doc_id: Optional[str] = None,
+            attributes: Optional[Mapping[str, Any]] = None) -> _Document:
+        """Adds a document to the database and returns its ID.
+
+        The `attributes` map the names to the values, that the searches
+        can filter by (see `where` of `search`). A list or a set is several
+        values of the same attribute. The values must be hashable, and
+        comparable to be filtered by a `Range`."""
+        self._db_version += 1
+        document = self._add_document(words, doc_id, attributes)
+        self._compress(document.unique_words)
+        self._touch(document.unique_words)
+
+        self._changes_since_refresh += 1
+        self._refresh_if_stale()
+        return document
+
+    def add_many(self, docs: Iterable[Tuple[Any, ...]]) -> BulkAddReport:
+        """Adds documents from an iterable of `(doc_id, words)` pairs, or
+        `(doc_id, words, attributes)` triples.
+
+        Does the same as calling `add` for each document. The iterable is
+        consumed lazily. The posting lists are compressed, the cached
+        results are invalidated and the IDF statistics are refreshed once
+        at the end.
+        """
+        return _add_all(
+            docs,
+            lambda words, doc_id, attributes:
+            self._add_document(words, doc_id, attributes).unique_words,
+            self._finish_adding)
+
+    def _finish_adding(self, touched_words: Set[TWord], added: int) -> None:
+        self._compress(touched_words)
+        self._db_version += 1
+        self._touch(touched_words)
+        self._changes_since_refresh += added
+        self._refresh_if_stale()
+
+    def _add_document(self, words: List[TWord], doc_id: Optional[str],
+                      attributes: Optional[Mapping[str, Any]]) -> _Document:
+        """Adds the document to the posting lists and returns it. The caller
+        compresses the posting lists of the words and invalidates
+        the cache."""
         if doc_id is None:
             doc_id = str(uuid.uuid4())
-        if doc_id in self._id_to_doc:
-            raise ValueError(f"Id '{doc_id}' is not unique")
+        ordinal = self._ids.add(doc_id)
+        if self._positions is not None:
+            words = list(words)
+            self._positions.add(ordinal, words)
+        if attributes:
+            self._attributes.add(ordinal, attributes)
+        document = _Document(doc_id, words)
+        self._docs.append(document)
+        for word in document.unique_words:
+            self._word_to_docs[word].append(ordinal)
+            # the new document may have greater weight
+            self._word_to_max_weight.pop(word, None)
+        return document
 
-        self._db_version += 1  # todo test
+    def remove(self, doc_id: str) -> None:
+        """Removes the document from the database.
+
+        The postings of the document are only marked as removed. They are
+        dropped by `compact`, which runs automatically when the share of
+        removed documents exceeds `max_tombstones_ratio`.
+        """
+        ordinal = self._ids.remove(doc_id)
+        document = self._docs[ordinal]
+        assert document is not None
+        self._docs[ordinal] = None
+        self._db_version += 1
 
-        document = _Document(doc_id, words)
-        self._id_to_doc[doc_id] = document
         for word in document.unique_words:
-            self._word_to_docs[word].append(document)
+            removed = self._word_to_removed.get(word, 0) + 1
+            if removed == len(self._word_to_docs[word]):
+                # no more documents with this word
+                del self._word_to_docs[word]
+                self._word_to_removed.pop(word, None)
+            else:
+                self._word_to_removed[word] = removed
+        self._touch(document.unique_words)
 
-        return document
+        self._changes_since_refresh += 1
+        self._refresh_if_stale()
+        if self._ids.tombstones_ratio > self._max_tombstones_ratio:
+            self.compact()
+
+    def update(self, doc_id: str, words: List[TWord],
+               attributes: Optional[Mapping[str, Any]] = None) -> _Document:
+        """Replaces the words and the attributes of the document."""
+        self.remove(doc_id)
+        return self.add(words, doc_id=doc_id, attributes=attributes)
+
+    def compact(self) -> None:
+        """Drops the postings of the removed documents."""
+        if not self._ids.tombstones_ratio:
+            return
+        self._db_version += 1  # the ordinals change
+        self._compacted_version = self._db_version
+        new_ordinals = self._ids.compact()
+        self._docs = [doc for doc in self._docs if doc is not None]
+        if self._positions is not None:
+            self._positions.compact(new_ordinals)
+        self._attributes.compact(new_ordinals)
+        for word, docs_with_word in self._word_to_docs.items():
+            if word in self._word_to_removed:
+                self._word_to_docs[word] = \
+                    _compact_ordinals(docs_with_word, new_ordinals)
+            elif isinstance(docs_with_word, array):
+                for i, ordinal in enumerate(docs_with_word):
+                    docs_with_word[i] = new_ordinals[ordinal]
+            else:
+                self._word_to_docs[word] = \
+                    docs_with_word.compacted(new_ordinals)
+        self._word_to_removed = {}
+
+    def _compress(self, words: Iterable[TWord]) -> None:
+        """Compresses the posting lists of the words that got long enough,
+        if `compress_postings` is enabled."""
+        if self._compress_postings:
+            word_to_docs = self._word_to_docs
+            for word in words:
+                word_to_docs[word] = _compressed(word_to_docs[word])
+
+    def _touch(self, words: Iterable[TWord]) -> None:
+        """Marks the posting lists of the words as changed in the current
+        `_db_version`, so the cached results of their queries are stale."""
+        if self._cache is not None:
+            version = self._db_version
+            for word in words:
+                self._word_to_version[word] = version
+
+    def _cache_stamp(self, query: List[TWord]) -> Hashable:
+        """The versions of everything the results of the query depend on.
+
+        Those are the posting lists of the query words and the IDF, which
+        is the same within `_idf_version`. And the ordinals, that are
+        renumbered by compaction. The words not in the database also get
+        weights in the query, that depend on the number of documents."""
+        words = set(query)
+        return (self._idf_version, self._compacted_version,
+                frozenset((word, self._word_to_version.get(word))
+                          for word in words),
+                None if all(word in self._word_to_docs for word in words)
+                else self.documents_count)
+
+    def refresh(self) -> None:
+        """Recomputes the IDF statistics, so the next search returns exact
+        scores. The weights of documents are recomputed lazily, as they are
+        matched by the queries."""
+        self._idf_version += 1
+        self._idf_documents_count = self.documents_count
+        self._changes_since_refresh = 0
+        self._word_to_idf_cache = {}
+        self._word_to_max_weight = {}
+
+    def _refresh_if_stale(self) -> None:
+        if self._changes_since_refresh > \
+                self._idf_documents_count * self._idf_refresh_ratio:
+            self.refresh()
 
     def _d(self, word: TWord) -> int:
         docs_with_word = self._word_to_docs.get(word)
         if docs_with_word is not None:
-            return len(docs_with_word)
+            return len(docs_with_word) - self._word_to_removed.get(word, 0)
         return 0
 
+    def _global_d(self, word: TWord) -> int:
+        return self._d(word) + self._foreign_df.get(word, 0)
+
+    @property
+    def stop_words(self) -> Set[TWord]:
+        """The words that are in more than `stop_words_ratio` of
+        the documents now."""
+        if self._stop_words_ratio is None:
+            return set()
+        max_d = self._stop_words_ratio \
+            * (self.documents_count + self._foreign_documents)
+        return set(word for word in self._word_to_docs
+                   if self._global_d(word) > max_d)
+
+    def _query_stop_words(self, words: Iterable[TWord]) -> Tuple[TWord, ...]:
+        """Returns the stop words among the query words that occur in
+        the database, or nothing, if all of them are stop words."""
+        if self._stop_words_ratio is None:
+            return ()
+        max_d = self._stop_words_ratio \
+            * (self.documents_count + self._foreign_documents)
+        ds = [(word, self._global_d(word)) for word in words]
+        if all(d > max_d for _, d in ds if d > 0):
+            return ()
+        return tuple(word for word, d in ds if d > max_d)
+
+    def _document_frequencies(self) -> Dict[TWord, int]:
+        """Number of documents containing each word in this database."""
+        return dict((word, self._d(word)) for word in self._word_to_docs)
+
+    def use_global_stats(self, word_to_df: Dict[TWord, int],
+                         documents_count: int) -> None:
+        """Makes the IDF computed from the statistics of all the shards of
+        `ShardedFts`, or all the segments of `SegmentedFts`, including this
+        one. Until the next call, the numbers from the others are considered
+        constant."""
+        self._foreign_df = dict((word, df - self._d(word))
+                                for word, df in word_to_df.items()
+                                if df > self._d(word))
+        self._foreign_documents = documents_count - self.documents_count
+        self.refresh()
+
     def _word_to_idf(self, word: TWord) -> float:
-        # docs_with_word = self._word_to_docs.get(word)
-        return _idf(
-            docs_with_word=self._d(word),
-            docs_total=self.documents_count)
-
-    def _docs_containing_any_word_from(self, words: Iterable[TWord]) \
-            -> Collection[_Document]:
-        matched_docs = {}
-        for word in words:
-            for doc in self._word_to_docs.get(word) or []:
-                matched_docs[doc.doc_id] = doc
-        return matched_docs.values()
-
-    def search(self, query: List[TWord]) -> List[str]:
+        # The value is kept until the next refresh. So all the weights
+        # computed within the same `_idf_version` are consistent with each
+        # other, even if documents were added in between
+        result = self._word_to_idf_cache.get(word)
+        if result is None:
+            docs_with_word = self._global_d(word)
+            result = _idf(
+                docs_with_word=docs_with_word,
+                docs_total=self.documents_count + self._foreign_documents)
+            if docs_with_word > 0:
+                # not caching the words from queries that are not in the
+                # database
+                self._word_to_idf_cache[word] = result
+        return result
+
+    def search(self, query: List[TWord],
+               limit: Optional[int] = None,
+               min_score: Optional[float] = None,
+               required: Iterable[TWord] = (),
+               excluded: Iterable[TWord] = (),
+               match_all: bool = False,
+               where: Optional[Mapping[str, Any]] = None) -> List[str]:
         """Returns IDs of documents that include at least one word from `query`.
         More relevant matches will be at the top of the list.
 
-        `prioritize_words_count` determines whether the documents with the most
-        words from the query should always be ranked higher. If `False`, the
-        number of matches may be outweighed by the rarity of matched words
-        or their frequency in the document.
+        `limit` is the maximum number of IDs to return. With a limit, only
+        the best matches are ranked, and the documents that cannot get into
+        the top are not even collected.
+
+        `min_score` excludes the documents with lower scores (see
+        `search_scored`). The documents that cannot reach it are not
+        collected either.
+
+        `required` words must all be in the returned documents, and
+        `excluded` words must not be in them. With `match_all`, all
+        the words of the query are required. These filters do not change
+        the scores. The documents are selected by intersecting the sorted
+        posting lists, starting from the shortest one, and only they are
+        scored.
+
+        `where` maps the names of the attributes of the documents (see
+        `add`) to the conditions they must match: a value, a list or a set
+        of values to match any of them, or a `Range`. The documents are
+        selected by the bitmaps of the attribute values before scoring, so
+        the search is as fast as the selected documents are few.
+        """
+        # the ID is the last item of the ranking key
+        return [key[-1] for key, _ in self._ranked(
+            query, limit=limit, min_score=min_score, required=required,
+            excluded=excluded, match_all=match_all, where=where)]
+
+    def search_scored(self, query: List[TWord],
+                      limit: Optional[int] = None,
+                      min_score: Optional[float] = None,
+                      required: Iterable[TWord] = (),
+                      excluded: Iterable[TWord] = (),
+                      match_all: bool = False,
+                      where: Optional[Mapping[str, Any]] = None) \
+            -> List[ScoredMatch]:
+        """Same as `search`, but returns the scores of the documents, that
+        are cosine similarities to the query from 0 to 1."""
+        return [match for _, match in self._scored_matches(
+            self._ranked(query, limit=limit, min_score=min_score,
+                         required=required, excluded=excluded,
+                         match_all=match_all, where=where),
+            query)]
+
+    def search_iter(self, query: List[TWord],
+                    min_score: Optional[float] = None,
+                    required: Iterable[TWord] = (),
+                    excluded: Iterable[TWord] = (),
+                    match_all: bool = False,
+                    where: Optional[Mapping[str, Any]] = None) \
+            -> Iterator[ScoredMatch]:
+        """Returns an iterator over the results of `search_scored`.
+
+        All the matching documents are scored at once, but they are sorted
+        lazily, as the iterator is consumed. So the first results are ready
+        in linear time. The database must not be changed during the
+        iteration.
+        """
+        top = self._top(query, min_score=min_score,
+                        matrix=self._matrix_for_search(queries=1),
+                        required=required, excluded=excluded,
+                        match_all=match_all, where=where)
+        query_words = set(query)
+        return (self._scored_match(key, ordinal, query_words)
+                for key, ordinal in top.iter_sorted_entries())
+
+    def search_page(self, query: List[TWord], page_size: int,
+                    cursor: Optional[str] = None,
+                    min_score: Optional[float] = None,
+                    required: Iterable[TWord] = (),
+                    excluded: Iterable[TWord] = (),
+                    match_all: bool = False,
+                    where: Optional[Mapping[str, Any]] = None) -> SearchPage:
+        """Returns a page of the results of `search_scored`.
+
+        The first page is the same as the search with `limit=page_size`.
+        The next pages are requested with the `next_cursor` of the previous
+        page and the same query. The pages are consistent while
+        the database is not changed.
+        """
+        below = _decode_cursor(cursor) if cursor is not None else None
+        entries = self._ranked(query, limit=_page_size(page_size),
+                               min_score=min_score, below=below,
+                               required=required, excluded=excluded,
+                               match_all=match_all, where=where)
+        return _page(self._scored_matches(entries, query), page_size)
+
+    def search_phrase(self, phrase: List[TWord],
+                      limit: Optional[int] = None,
+                      min_score: Optional[float] = None) -> List[str]:
+        """Returns IDs of documents that contain the words of `phrase` one
+        after another, in the same order. They are ranked as by `search`
+        for the words of the phrase. Requires `positions=True`."""
+        positions = self._position_index()
+        return [key[-1] for key, _ in self._sorted_top(
+            phrase, limit=limit, min_score=min_score, match_all=True,
+            narrow=lambda ordinals: positions.with_phrase(phrase, ordinals))]
+
+    def search_near(self, words: List[TWord], distance: int,
+                    limit: Optional[int] = None,
+                    min_score: Optional[float] = None) -> List[str]:
+        """Returns IDs of documents that contain all the `words`, in any
+        order, within `distance` positions from the first to the last. For
+        example, the neighbouring words are within the distance of 1. They
+        are ranked as by `search` for the words. Requires
+        `positions=True`."""
+        if distance < 0:
+            raise ValueError(f"Negative distance: {distance}")
+        positions = self._position_index()
+        return [key[-1] for key, _ in self._sorted_top(
+            words, limit=limit, min_score=min_score, match_all=True,
+            narrow=lambda ordinals: positions.with_near(words, distance,
+                                                        ordinals))]
+
+    def more_like_this(self, doc_id: str,
+                       limit: Optional[int] = None,
+                       min_score: Optional[float] = None) -> List[str]:
+        """Returns IDs of documents similar to the document `doc_id`,
+        except itself. They are ranked as by `search` for the words of
+        the document, but the stored weights of the document are reused."""
+        if limit is not None and limit < 0:
+            # the limit is increased below, so `_TopK` would not reject it
+            raise ValueError(f"Negative limit: {limit}")
+        ordinal = self._ids.id_to_ordinal.get(doc_id)
+        if ordinal is None:
+            raise KeyError(doc_id)
+        doc = self._docs[ordinal]
+        assert doc is not None
+        if not doc.unique_words:
+            return []
+        # the document itself is in its own top
+        entries = self._sorted_top(
+            list(doc.unique_words), query_doc=doc,
+            limit=limit + 1 if limit is not None else None,
+            min_score=min_score)
+        return [key[-1] for key, other in entries if other != ordinal][:limit]
+
+    def similar_pairs(self, threshold: float) -> List[SimilarPair]:
+        """Returns all the pairs of documents with the cosine similarity
+        of at least `threshold`, from the most similar.
+
+        Takes a single pass over the documents. Each of them is matched
+        only with the documents that may reach the threshold, and only
+        the pairs that pass the bounds of the similarity are scored.
+        A lower threshold means more candidates, so it takes longer.
         """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Threshold is not in (0, 1]: {threshold}")
+        docs = self._docs
+        idf_version = self._idf_version
+
+        def weights(doc: _Document) -> List[Tuple[TWord, float]]:
+            return [(word, doc.weight(word, self._word_to_idf, idf_version))
+                    for word in doc.unique_words]
+
+        word_to_max_weight: Dict[TWord, float] = {}
+        for doc in docs:
+            if doc is not None:
+                for word, weight in weights(doc):
+                    if weight > word_to_max_weight.get(word, 0.0):
+                        word_to_max_weight[word] = weight
+        # the most frequent words go first, to get into the prefixes
+        word_to_rank = dict(
+            (word, rank) for rank, word in enumerate(sorted(
+                word_to_max_weight, key=self._global_d, reverse=True)))
 
+        def exact_score(first: int, second: int) -> float:
+            # summing in the same order as `more_like_this(first)`
+            first_doc, second_doc = docs[first], docs[second]
+            assert first_doc is not None and second_doc is not None
+            score = 0.0
+            for word in sorted(first_doc.unique_words, key=self._global_d):
+                if word in second_doc.unique_words:
+                    score += first_doc.weight(
+                        word, self._word_to_idf, idf_version) \
+                             * second_doc.weight(
+                        word, self._word_to_idf, idf_version)
+            return score
+
+        vectors = ((ordinal, sorted(weights(doc),
+                                    key=lambda t: word_to_rank[t[0]]))
+                   for ordinal, doc in enumerate(docs) if doc is not None)
+        ordinal_to_id = self._ids.ordinal_to_id
+        pairs = [SimilarPair(first=ordinal_to_id[first],  # type: ignore
+                             second=ordinal_to_id[second],  # type: ignore
+                             score=score)
+                 for first, second, score in _all_pairs(
+                vectors, word_to_max_weight, threshold, exact_score)]
+        pairs.sort(key=lambda p: p.score, reverse=True)
+        return pairs
+
+    def _position_index(self) -> _PositionIndex[TWord]:
+        if self._positions is None:
+            raise ValueError("The positions are not indexed. "
+                             "Create the database with positions=True")
+        return self._positions
+
+    def search_many(self, queries: Iterable[List[TWord]],
+                    limit: Optional[int] = None,
+                    min_score: Optional[float] = None,
+                    required: Iterable[TWord] = (),
+                    excluded: Iterable[TWord] = (),
+                    match_all: bool = False,
+                    where: Optional[Mapping[str, Any]] = None) \
+            -> List[List[str]]:
+        """Does the same as calling `search` for each query, and returns
+        the results in the same order as the queries.
+
+        The weights of the words shared by several queries are computed
+        once for the whole batch, and reused by each of the queries.
+        """
+        return [[key[-1] for key, _ in entries]
+                for entries in self._ranked_many(
+                    queries, limit=limit, min_score=min_score,
+                    required=required, excluded=excluded,
+                    match_all=match_all, where=where)]
+
+    def _ranked_many(self, queries: Iterable[List[TWord]],
+                     limit: Optional[int] = None,
+                     min_score: Optional[float] = None,
+                     below: Optional[Tuple[float, str]] = None,
+                     scored: bool = False,
+                     required: Iterable[TWord] = (),
+                     excluded: Iterable[TWord] = (),
+                     match_all: bool = False,
+                     where: Optional[Mapping[str, Any]] = None) \
+            -> List[List[Tuple[Any, Any]]]:
+        """Returns the `_ranked` results for each query. With `scored`,
+        the items are converted to `ScoredMatch`."""
+        queries = list(queries)
+        if any(len(query) <= 0 for query in queries):
+            raise ValueError("Query is empty")
+        required = frozenset(required)
+        excluded = frozenset(excluded)
+        result: List[Optional[List[Tuple[Tuple[float, str], int]]]] = \
+            [None] * len(queries)
+        keys: List[Hashable] = []
+        stamps: List[Hashable] = []
+        if self._cache is not None:
+            keys = [(_query_key(query), limit, min_score, below, required,
+                     excluded, match_all, _where_key(where),
+                     frozenset(self._query_stop_words(set(query))))
+                    for query in queries]
+            stamps = [self._cache_stamp([*query, *required, *excluded])
+                      for query in queries]
+            result = [self._cache.get(key, stamp)
+                      for key, stamp in zip(keys, stamps)]
+            if self._on_search is not None:
+                for query, entries in zip(queries, result):
+                    if entries is not None:
+                        self._on_search(_cached_stats(query))
+        missed = [i for i, entries in enumerate(result) if entries is None]
+        if missed:
+            # the work shared by the queries is counted to the first one
+            profile = _Profile() if self._on_search is not None else None
+            matrix = self._matrix_for_search(queries=len(missed))
+            word_to_weights: Dict[TWord, array] = {}
+            if matrix is None:
+                queries_with_word: Counter = Counter(
+                    word for i in missed for word in set(queries[i]))
+                word_to_weights = dict(
+                    (word, self._posting_weights(word))
+                    for word, count in queries_with_word.items()
+                    if count > 1 and word in self._word_to_docs)
+            for i in missed:
+                entries = self._sorted_top(queries[i], profile, limit=limit,
+                                           min_score=min_score, below=below,
+                                           word_to_weights=word_to_weights,
+                                           matrix=matrix, required=required,
+                                           excluded=excluded,
+                                           match_all=match_all, where=where)
+                profile = None
+                if self._cache is not None:
+                    self._cache.put(keys[i], stamps[i], entries)
+                result[i] = entries
+        if scored:
+            return [self._scored_matches(entries, query)  # type: ignore
+                    for entries, query in zip(result, queries)]
+        return result  # type: ignore
+
+    def _matrix_for_search(self, queries: int) -> Optional[_Matrix[TWord]]:
+        """Returns the NumPy matrix of the current weights, if it is worth
+        using for the search of `queries` queries.
+
+        Building the matrix takes about as long as walking all the posting
+        lists once. So we do it only for a batch, or when the database has
+        not changed since the previous search (then it is likely to be
+        searched again)."""
+        if not self._use_numpy:
+            return None
+        stamp = (self._db_version, self._idf_version)
+        if self._matrix is None or self._matrix.stamp != stamp:
+            self._matrix = None
+            if queries < 2 and self._last_search_stamp != stamp:
+                self._last_search_stamp = stamp
+                return None
+            idf_version = self._idf_version
+            docs = self._docs
+
+            def weight(ordinal: int, word: TWord) -> Optional[float]:
+                doc = docs[ordinal]
+                if doc is None:
+                    return None
+                return doc.weight(word, self._word_to_idf, idf_version)
+
+            self._matrix = _Matrix(self._word_to_docs.items(), weight,
+                                   columns=len(docs), stamp=stamp)
+        return self._matrix
+
+    def _posting_weights(self, word: TWord) -> array:
+        """Returns the weights of the word in the documents of its posting
+        list, zeros for the removed documents."""
+        idf_version = self._idf_version
+        docs = self._docs
+        weights = array('d', (
+            0.0 if docs[ordinal] is None
+            else docs[ordinal].weight(  # type: ignore
+                word, self._word_to_idf, idf_version)
+            for ordinal in self._word_to_docs[word]))
+        self._word_to_max_weight[word] = max(weights, default=0.0)
+        return weights
+
+    def _ranked(self, query: List[TWord],
+                limit: Optional[int] = None,
+                min_score: Optional[float] = None,
+                below: Optional[Tuple[float, str]] = None,
+                **filters) -> List[Tuple[Tuple[float, str], int]]:
+        """Returns the ((score, ID), ordinal) pairs of the top documents."""
+        return self._ranked_many([query], limit=limit, min_score=min_score,
+                                 below=below, **filters)[0]
+
+    def _sorted_top(self, query: List[TWord],
+                    profile: Optional[_Profile] = None,
+                    **options) -> List[Tuple[Tuple[float, str], int]]:
+        """Returns the sorted entries of `_top`, and reports the search to
+        `on_search`. The `profile` is started before, to count the work
+        done for the search in advance."""
+        if self._on_search is None:
+            return self._top(query, **options).sorted_entries()
+        if profile is None:
+            profile = _Profile()
+        entries = self._top(query, profile=profile, **options) \
+            .sorted_entries()
+        self._on_search(profile.stats(query))
+        return entries
+
+    def _top(self, query: List[TWord],
+             limit: Optional[int] = None,
+             min_score: Optional[float] = None,
+             below: Optional[Tuple[float, str]] = None,
+             word_to_weights: Optional[Dict[TWord, array]] = None,
+             matrix: Optional[_Matrix[TWord]] = None,
+             required: Iterable[TWord] = (),
+             excluded: Iterable[TWord] = (),
+             match_all: bool = False,
+             narrow: Optional[Callable[[List[int]], List[int]]] = None,
+             profile: Optional[_Profile] = None,
+             query_doc: Optional[_Document] = None,
+             where: Optional[Mapping[str, Any]] = None) \
+            -> _TopK[int]:
+        """Returns the top of documents with (score, ID) keys and ordinal
+        items. `below` is the cursor key of the previous page.
+        `word_to_weights` are the precomputed `_posting_weights`. With
+        the `matrix`, the scores are computed by NumPy. The other
+        arguments are the filters of `search`, and `narrow`, that gets
+        the sorted ordinals selected by them and returns a part of them.
+        The `profile` collects the stats of the search. The `query_doc` is
+        the weighted query, if it is already known. With `where`, only
+        the documents with matching attributes are scored."""
         if len(query) <= 0:
             raise ValueError
+        required = frozenset(required).union(query) if match_all \
+            else frozenset(required)
+        excluded = frozenset(excluded)
+        top: _TopK[int] = _TopK(limit, below)
+        # The documents above the cursor take places in the top, while
+        # they will not be returned. So they cannot tell what documents are
+        # not needed, and a search after the cursor scores all the matches
+        pruning_limit = limit if below is None else None
 
-        query_doc = _Document(doc_id=None, words=query)
+        stop_words: Tuple[TWord, ...] = ()
+        if query_doc is None:
+            query_doc = _Document(doc_id=None, words=query)
+            stop_words = self._query_stop_words(query_doc.unique_words)
+        if profile is not None:
+            profile.stop_words = stop_words
+        idf_version = self._idf_version
 
         def term_to_weight(doc: _Document, word: TWord) -> float:
-            return doc.weight(word, self._word_to_idf, self._db_version)
+            return doc.weight(word, self._word_to_idf, idf_version)
+
+        # Both the query and the documents are normalized vectors. So their
+        # cosine similarity is just the sum of products of the weights of the
+        # shared words. We accumulate the sums word by word, walking only the
+        # posting lists of the query words (term-at-a-time).
+        #
+        # The rarest words go first: they usually have the highest weights,
+        # so the top is filled with good matches early
+        terms = []
+        for word in query_doc.unique_words:
+            docs_with_word = self._word_to_docs.get(word)
+            if docs_with_word and word not in stop_words:
+                terms.append((word, term_to_weight(query_doc, word),
+                              docs_with_word))
+        terms.sort(key=lambda t: self._global_d(t[0]))
+
+        if required or excluded or narrow is not None or where:
+            # The documents are known in advance, so there is nothing to
+            # prune. The scores are summed in the same order as below
+            docs = self._docs
+            ordinal_to_score: Dict[int, float] = {}
+            filtered = self._filtered_ordinals(
+                [word for word, _, _ in terms], required, excluded,
+                list(self._attributes.matching(where)) if where else None)
+            if narrow is not None:
+                filtered = narrow(filtered)
+            if profile is not None:
+                profile.prepared(len(terms))
+            for word, query_weight, docs_with_word in terms:
+                _check_stopped()
+                if profile is not None:
+                    profile.postings += min(len(docs_with_word),
+                                            len(filtered))
+                for ordinal, _ in _matching(docs_with_word, filtered):
+                    ordinal_to_score[ordinal] = \
+                        ordinal_to_score.get(ordinal, 0.0) \
+                        + query_weight * term_to_weight(
+                            docs[ordinal], word)  # type: ignore
+            if profile is not None:
+                profile.scored(len(ordinal_to_score))
+            self._push_scores(top, ordinal_to_score, min_score)
+            return top
 
-        matches = []
+        if profile is not None:
+            profile.prepared(len(terms))
 
-        # finding all documents containing at least one word from query
-        for match_doc in self._docs_containing_any_word_from(
-                query_doc.unique_words):
-            # listing all unique words in both query and vector
-            all_words = list(set(match_doc.unique_words) |
-                             set(query_doc.unique_words))
-            query_vector = [term_to_weight(query_doc, w) for w in all_words]
-            doc_vector = [term_to_weight(match_doc, w) for w in all_words]
-            assert len(doc_vector) == len(query_vector)
+        if matrix is not None:
+            candidates = matrix.fill_top(
+                top, ((word, query_weight) for word, query_weight, _ in terms),
+                min_score, self._ids.ordinal_to_id)
+            if profile is not None:
+                profile.postings = sum(len(docs_with_word)
+                                       for _, _, docs_with_word in terms)
+                profile.scored(candidates)
+            return top
+
+        docs = self._docs
+        ordinal_to_score = {}
+        collecting_new = (limit is None or limit > 0) \
+            and self._new_doc_can_get_into_top(terms, (), None, min_score)
+        for term_idx, (word, query_weight, docs_with_word) in enumerate(terms):
+            _check_stopped()
+            weights = word_to_weights.get(word) if word_to_weights else None
+            if profile is not None:
+                profile.postings += len(docs_with_word) \
+                    if collecting_new or weights is not None \
+                    else min(len(docs_with_word), len(ordinal_to_score))
+            if collecting_new and weights is not None:
+                # the weights are precomputed for the batch of queries
+                for ordinal, weight in zip(docs_with_word, weights):
+                    if weight:  # zero if removed
+                        ordinal_to_score[ordinal] = \
+                            ordinal_to_score.get(ordinal, 0.0) \
+                            + query_weight * weight
+            elif collecting_new:
+                max_weight = 0.0
+                for ordinal in docs_with_word:
+                    doc = docs[ordinal]
+                    if doc is None:
+                        continue  # removed
+                    weight = term_to_weight(doc, word)
+                    if weight > max_weight:
+                        max_weight = weight
+                    ordinal_to_score[ordinal] = \
+                        ordinal_to_score.get(ordinal, 0.0) \
+                        + query_weight * weight
+                self._word_to_max_weight[word] = max_weight
+            elif weights is not None:
+                for ordinal, weight in zip(docs_with_word, weights):
+                    score = ordinal_to_score.get(ordinal)
+                    if score is not None:
+                        ordinal_to_score[ordinal] = \
+                            score + query_weight * weight
+            elif len(docs_with_word) <= len(ordinal_to_score):
+                # The top is already known to consist of the collected
+                # documents. We only update their scores
+                for ordinal in docs_with_word:
+                    score = ordinal_to_score.get(ordinal)
+                    if score is not None:
+                        doc = docs[ordinal]
+                        assert doc is not None
+                        ordinal_to_score[ordinal] = \
+                            score + query_weight * term_to_weight(doc, word)
+            else:
+                # Same as above, but there are fewer collected documents
+                # than the documents with the word. So we do not walk the
+                # posting list, but look up the weights in the documents
+                if profile is not None:
+                    profile.skipped_words.append(word)
+                for ordinal, score in ordinal_to_score.items():
+                    doc = docs[ordinal]
+                    assert doc is not None
+                    weight = term_to_weight(doc, word)
+                    if weight:
+                        ordinal_to_score[ordinal] = \
+                            score + query_weight * weight
+
+            remaining = terms[term_idx + 1:]
+            if collecting_new:
+                collecting_new = self._new_doc_can_get_into_top(
+                    remaining, ordinal_to_score.values(),
+                    pruning_limit, min_score)
+            if not collecting_new and remaining:
+                # The documents that cannot get into the top are not
+                # needed anymore, so the next words may be looked up for
+                # fewer documents
+                _drop_hopeless(ordinal_to_score, lambda score: score,
+                               self._max_new_score(remaining),
+                               pruning_limit, min_score)
+
+        if profile is not None:
+            profile.scored(len(ordinal_to_score))
+        self._push_scores(top, ordinal_to_score, min_score)
+        return top
+
+    def _push_scores(self, top: _TopK[int], ordinal_to_score: Dict[int, float],
+                     min_score: Optional[float]) -> None:
+        for ordinal, score in ordinal_to_score.items():
+            if min_score is not None and score < min_score:
+                continue
+            doc_id = self._ids.ordinal_to_id[ordinal]
+            assert doc_id is not None
+            top.push((score, doc_id), ordinal)
+
+    def _filtered_ordinals(self, words: List[TWord],
+                           required: AbstractSet[TWord],
+                           excluded: AbstractSet[TWord],
+                           candidates: Optional[List[int]] = None) \
+            -> List[int]:
+        """Returns the sorted ordinals of the documents with any of the
+        words, all the `required` words and none of the `excluded`. With
+        the sorted `candidates`, only they are selected."""
+        if not all(self._word_to_docs.get(word) for word in required):
+            return []
+        all_of: List[Sequence[int]] = [self._word_to_docs[word]
+                                       for word in required]
+        if candidates is not None:
+            all_of.append(candidates)
+        ordinals = _filtered(
+            any_of=[self._word_to_docs[word] for word in words],
+            all_of=all_of,
+            none_of=[self._word_to_docs[word] for word in excluded
+                     if word in self._word_to_docs])
+        docs = self._docs
+        return [ordinal for ordinal in ordinals if docs[ordinal] is not None]
+
+    def _scored_matches(self, entries: List[Tuple[Tuple[float, str], int]],
+                        query: List[TWord]) \
+            -> List[Tuple[Any, ScoredMatch]]:
+        """Converts the ((score, ID), ordinal) pairs of the top to
+        the (key, match) pairs."""
+        query_words = set(query)
+        return [(key, self._scored_match(key, ordinal, query_words))
+                for key, ordinal in entries]
+
+    def _scored_match(self, key: Tuple[float, str], ordinal: int,
+                      query_words: Set[TWord]) -> ScoredMatch:
+        doc = self._docs[ordinal]
+        assert doc is not None
+        doc_words = doc.unique_words
+        score, doc_id = key
+        return ScoredMatch(
+            doc_id=doc_id, score=score,
+            words_matched=sum(1 for w in query_words if w in doc_words))
+
+    def freeze(self) -> FrozenFts[TWord]:
+        """Returns a read-only copy of the database, where the weights
+        of all the words in all the documents are precomputed and sorted
+        by impact. The copy returns the same results as this database at
+        the moment of freezing, up to floating-point ties, but searches with
+        a `limit` faster.
+
+        The database is compacted before freezing.
+        """
+        self.compact()
+        idf_version = self._idf_version
+        word_to_postings = dict(
+            (word, _impact_ordered(
+                (self._docs[ordinal].weight(  # type: ignore
+                    word, self._word_to_idf, idf_version), ordinal)
+                for ordinal in docs_with_word))
+            for word, docs_with_word in self._word_to_docs.items()
+            if docs_with_word)
+        return FrozenFts(
+            word_to_postings=word_to_postings,
+            # no tombstones after the compaction
+            doc_ids=[doc_id for doc_id in self._ids.ordinal_to_id
+                     if doc_id is not None],
+            word_to_idf=dict((word, self._word_to_idf(word))
+                             for word in word_to_postings))
 
-            score = cosine_similarity(doc_vector, query_vector)
-            # todo optimize
-            #
+    def save(self, path: Union[str, Path]) -> None:
+        """Freezes the database and writes it to a binary file. The file is
+        opened by `FrozenFts.load`."""
+        self.freeze().save(path)
 
-            assert match_doc.doc_id is not None
-            matches.append((score, match_doc.doc_id))
+    def _new_doc_can_get_into_top(
+            self,
+            remaining_terms: List[Tuple[TWord, float, _Ordinals]],
+            scores: Collection[float],
+            limit: Optional[int],
+            min_score: Optional[float]) -> bool:
+        """Checks whether a document that is not collected yet can get
+        into the full top, and reach the `min_score`, using only
+        the remaining words of the query (the MaxScore approach)."""
+        if not remaining_terms:
+            return False
+        lowest = min_score
+        if limit is not None and len(scores) >= limit:
+            lowest_in_top = heapq.nlargest(limit, scores)[-1]
+            if lowest is None or lowest_in_top > lowest:
+                lowest = lowest_in_top
+        if lowest is None:
+            return True
+        return self._max_new_score(remaining_terms) >= lowest
 
-        matches.sort(reverse=True)
-        return [doc_id for score, doc_id in matches]
+    def _max_new_score(
+            self,
+            remaining_terms: List[Tuple[TWord, float, _Ordinals]]) -> float:
+        """The upper bound of what the remaining words of the query can add
+        to a score."""
+        # The weight of a word in a document cannot be greater than the
+        # max weight of the word, and cannot be greater than 1 in any case.
+        # Summing in the same order as the actual scores will be summed
+        max_new_score = 0.0
+        for word, query_weight, _ in remaining_terms:
+            max_new_score += \
+                query_weight * self._word_to_max_weight.get(word, 1.0)
+        return max_new_score
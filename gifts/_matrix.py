@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from array import array
+from typing import Iterable, List, Optional, TypeVar, Generic, Dict, Tuple, \
+    Callable, Hashable
+
+from gifts._top_k import _TopK
+from gifts._stop import _check_stopped
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore
+
+TWord = TypeVar('TWord')
+
+
+class _Matrix(Generic[TWord]):
+    """The weights of all the words in all the documents as a sparse matrix
+    in the CSR format, with a row for each word and a column for each
+    document ordinal. Scoring a query is a product of the matrix and the
+    query vector computed by NumPy.
+
+    The rows are added to the scores in the same order and by the same
+    floating point operations as in the pure Python search, so the scores
+    are exactly the same.
+    """
+
+    def __init__(self,
+                 word_to_ordinals: Iterable[Tuple[TWord, Iterable[int]]],
+                 weight: Callable[[int, TWord], Optional[float]],
+                 columns: int,
+                 stamp: Hashable):
+        """`weight(ordinal, word)` returns the weight of the word in the
+        document, or `None` if the document is removed. The `stamp`
+        identifies the state of the database the matrix was built from."""
+        assert numpy is not None
+        self.stamp = stamp
+        self._columns = columns
+        self._word_to_row: Dict[TWord, int] = {}
+        indptr = array('q', [0])
+        indices = array('i')
+        data = array('d')
+        for word, ordinals in word_to_ordinals:
+            for ordinal in ordinals:
+                value = weight(ordinal, word)
+                if value is not None:
+                    indices.append(ordinal)
+                    data.append(value)
+            if len(indices) > indptr[-1]:
+                self._word_to_row[word] = len(indptr) - 1
+                indptr.append(len(indices))
+        self._indptr = numpy.frombuffer(indptr, dtype=numpy.int64)
+        self._indices = numpy.frombuffer(indices, dtype=numpy.int32)
+        self._data = numpy.frombuffer(data, dtype=numpy.float64)
+
+    def fill_top(self, top: _TopK[int],
+                 terms: Iterable[Tuple[TWord, float]],
+                 min_score: Optional[float],
+                 ordinal_to_id: List[Optional[str]]) -> int:
+        """Pushes the matching documents for the query given as (word,
+        query weight) pairs to the top with (score, ID) keys and ordinal
+        items. Only the documents that can get into the top are pushed.
+        Returns the number of the matching documents."""
+        scores = numpy.zeros(self._columns)
+        for word, query_weight in terms:
+            _check_stopped()
+            row = self._word_to_row.get(word)
+            if row is None:
+                continue
+            start, end = self._indptr[row], self._indptr[row + 1]
+            # the ordinals are unique within a row, so this is a plain
+            # element-wise addition
+            scores[self._indices[start:end]] += \
+                query_weight * self._data[start:end]
+
+        is_matched = scores > 0
+        if min_score is not None:
+            is_matched &= scores >= min_score
+        ties: List[int] = []
+        if top.below is not None:
+            # the documents with the same score as the cursor are below
+            # it if their IDs are
+            below_score, below_id = top.below
+            ties = [ordinal
+                    for ordinal in numpy.flatnonzero(
+                        is_matched & (scores == below_score)).tolist()
+                    if ordinal_to_id[ordinal] < below_id]  # type: ignore
+            is_matched &= scores < below_score
+        matched = numpy.concatenate(
+            (numpy.flatnonzero(is_matched), numpy.array(ties, dtype=int)))
+
+        candidates = len(matched)
+        limit = top.limit
+        if limit is not None and len(matched) > limit:
+            if limit == 0:
+                return candidates
+            # keeping only the documents with scores not lower than the
+            # score at the limit. The ties are resolved by `_TopK`
+            matched_scores = scores[matched]
+            kth = len(matched) - limit
+            lowest = numpy.partition(matched_scores, kth)[kth]
+            matched = matched[matched_scores >= lowest]
+
+        for ordinal, score in zip(matched.tolist(), scores[matched].tolist()):
+            doc_id = ordinal_to_id[ordinal]
+            assert doc_id is not None
+            top.push((score, doc_id), ordinal)
+        return candidates
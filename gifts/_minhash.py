@@ -0,0 +1,99 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import itertools
+import random
+from array import array
+from typing import Dict, Generic, Iterable, List, TypeVar
+
+from gifts._matrix import numpy
+
+TWord = TypeVar('TWord')
+
+_MASK = (1 << 64) - 1
+
+
+class _MinHashIndex(Generic[TWord]):
+    """MinHash signatures of the sets of words of the documents, split into
+    bands, with a table of the documents by the hash of each band (LSH).
+
+    Two sets with the Jaccard similarity `s` have the same band with
+    the probability of `s ** rows`. So a document is a candidate for
+    a query with the probability of `1 - (1 - s ** rows) ** bands`. More
+    bands find more of the similar documents, more rows find fewer of
+    the dissimilar ones.
+
+    The signatures themselves are not kept, only the band tables: 4 bytes
+    per document per band, plus the buckets.
+    """
+
+    def __init__(self, bands: int, rows: int, seed: int = 0):
+        if bands < 1:
+            raise ValueError(f"Bands must be positive: {bands}")
+        if rows < 1:
+            raise ValueError(f"Rows must be positive: {rows}")
+        rnd = random.Random(seed)
+        self._rows = rows
+        # Multiply-add-shift hashing of 32-bit keys:
+        # ((a * key + b) mod 2**64) >> 32, with random 64-bit a and b
+        self._multipliers = [rnd.getrandbits(64) for _ in range(bands * rows)]
+        self._increments = [rnd.getrandbits(64) for _ in range(bands * rows)]
+        self._tables: List[Dict[int, array]] = [{} for _ in range(bands)]
+
+    def _signature(self, words: Iterable[TWord]) -> List[int]:
+        keys = []
+        for word in words:
+            h = hash(word) & _MASK
+            keys.append((h ^ (h >> 32)) & 0xFFFFFFFF)
+        if numpy is not None:
+            # the same arithmetic, the unsigned 64-bit ints wrap around
+            products = numpy.outer(
+                numpy.array(self._multipliers, dtype=numpy.uint64),
+                numpy.array(keys, dtype=numpy.uint64))
+            products += numpy.array(self._increments,
+                                    dtype=numpy.uint64)[:, None]
+            return (products >> numpy.uint64(32)).min(axis=1).tolist()
+        return [min(((a * key + b) & _MASK) >> 32 for key in keys)
+                for a, b in zip(self._multipliers, self._increments)]
+
+    def _band_keys(self, words: Iterable[TWord]) -> List[int]:
+        signature = self._signature(words)
+        rows = self._rows
+        return [hash(tuple(signature[start:start + rows]))
+                for start in range(0, len(signature), rows)]
+
+    def add(self, ordinal: int, words: Iterable[TWord]) -> None:
+        """Adds the document with the unique `words`, if any."""
+        words = list(words)
+        if not words:
+            return
+        for table, key in zip(self._tables, self._band_keys(words)):
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = array('I')
+                table[key] = bucket
+            bucket.append(ordinal)
+
+    def candidates(self, words: Iterable[TWord]) -> List[int]:
+        """Returns the sorted ordinals of the documents that have any band
+        in common with the unique `words`. They include the removed
+        documents."""
+        words = list(words)
+        if not words:
+            return []
+        return sorted(set(itertools.chain.from_iterable(
+            table.get(key, ())
+            for table, key in zip(self._tables, self._band_keys(words)))))
+
+    def compact(self, new_ordinals: List[int]) -> None:
+        """Drops the removed documents and renumbers the ordinals by
+        `_DocIds.compact`."""
+        for table in self._tables:
+            for key, bucket in list(table.items()):
+                compacted = array('I', (new_ordinals[ordinal]
+                                        for ordinal in bucket
+                                        if new_ordinals[ordinal] >= 0))
+                if compacted:
+                    table[key] = compacted
+                else:
+                    del table[key]
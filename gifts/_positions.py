@@ -0,0 +1,144 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from array import array
+from collections import defaultdict
+from typing import Dict, Generic, Iterable, List, TypeVar
+
+from gifts._postings import _matching
+from gifts._varint import _encode_deltas, _decode_deltas
+
+TWord = TypeVar('TWord')
+
+
+class _PositionList:
+    """The positions of a word in the documents containing it. The positions
+    of each document are delta-encoded varints in a shared buffer, so
+    a position usually takes a byte. Plus 8 bytes per document: the ordinal
+    and the offset in the buffer."""
+
+    __slots__ = ('ordinals', 'offsets', 'data')
+
+    def __init__(self):
+        self.ordinals = array('I')
+        self.offsets = array('I')
+        self.data = bytearray()
+
+    def append(self, ordinal: int, positions: Iterable[int]) -> None:
+        self.ordinals.append(ordinal)
+        self.offsets.append(len(self.data))
+        self.data += _encode_deltas(positions)
+
+    def positions(self, index: int) -> List[int]:
+        """Returns the positions in the document at the index of the list."""
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) \
+            else len(self.data)
+        return _decode_deltas(self.data, self.offsets[index], end)
+
+
+class _PositionIndex(Generic[TWord]):
+    """The positions of the words in the documents, for the phrase and
+    proximity searches. Kept apart from the posting lists used for
+    scoring, so the other searches do not pay for them."""
+
+    def __init__(self):
+        self._word_to_list: Dict[TWord, _PositionList] = {}
+
+    def add(self, ordinal: int, words: Iterable[TWord]) -> None:
+        word_to_positions: Dict[TWord, List[int]] = defaultdict(list)
+        for position, word in enumerate(words):
+            word_to_positions[word].append(position)
+        for word, positions in word_to_positions.items():
+            position_list = self._word_to_list.get(word)
+            if position_list is None:
+                position_list = _PositionList()
+                self._word_to_list[word] = position_list
+            position_list.append(ordinal, positions)
+
+    def compact(self, new_ordinals: List[int]) -> None:
+        """Drops the removed documents and renumbers the ordinals by
+        `_DocIds.compact`."""
+        word_to_list: Dict[TWord, _PositionList] = {}
+        for word, old_list in self._word_to_list.items():
+            new_list = _PositionList()
+            for index, ordinal in enumerate(old_list.ordinals):
+                if new_ordinals[ordinal] >= 0:
+                    new_list.append(new_ordinals[ordinal],
+                                    old_list.positions(index))
+            if new_list.ordinals:
+                word_to_list[word] = new_list
+        self._word_to_list = word_to_list
+
+    def _positions(self, word: TWord,
+                   ordinals: List[int]) -> Dict[int, List[int]]:
+        """Returns the positions of the word in each of the sorted ordinals
+        that contain it."""
+        position_list = self._word_to_list.get(word)
+        if position_list is None:
+            return {}
+        return dict((ordinal, position_list.positions(index))
+                    for ordinal, index in _matching(position_list.ordinals,
+                                                    ordinals))
+
+    def with_phrase(self, phrase: List[TWord],
+                    ordinals: List[int]) -> List[int]:
+        """Returns the sorted ordinals of the documents where the words of
+        the phrase occur one after another."""
+        word_to_positions = dict((word, self._positions(word, ordinals))
+                                 for word in set(phrase))
+        result = []
+        for ordinal in ordinals:
+            first = word_to_positions[phrase[0]].get(ordinal)
+            if first is None:
+                continue
+            next_positions = [
+                set(word_to_positions[word].get(ordinal, ()))
+                for word in phrase[1:]]
+            if any(all(start + shift in positions
+                       for shift, positions in enumerate(next_positions, 1))
+                   for start in first):
+                result.append(ordinal)
+        return result
+
+    def with_near(self, words: List[TWord], distance: int,
+                  ordinals: List[int]) -> List[int]:
+        """Returns the sorted ordinals of the documents where all the words
+        occur, in any order, within `distance` positions from the first to
+        the last."""
+        unique_words = list(dict.fromkeys(words))
+        word_to_positions = [self._positions(word, ordinals)
+                             for word in unique_words]
+        result = []
+        for ordinal in ordinals:
+            if not all(ordinal in positions
+                       for positions in word_to_positions):
+                continue
+            occurrences = sorted(
+                (position, word_idx)
+                for word_idx, positions in enumerate(word_to_positions)
+                for position in positions[ordinal])
+            if _shortest_window(occurrences, len(unique_words)) <= distance:
+                result.append(ordinal)
+        return result
+
+
+def _shortest_window(occurrences: List[tuple], words_count: int) -> float:
+    """Returns the shortest distance between the first and the last of
+    the sorted (position, word index) occurrences, that covers all
+    the words."""
+    result = float('inf')
+    counts = [0] * words_count
+    covered = 0
+    left = 0
+    for position, word_idx in occurrences:
+        if counts[word_idx] == 0:
+            covered += 1
+        counts[word_idx] += 1
+        while covered == words_count:
+            left_position, left_idx = occurrences[left]
+            result = min(result, position - left_position)
+            counts[left_idx] -= 1
+            if counts[left_idx] == 0:
+                covered -= 1
+            left += 1
+    return result
@@ -0,0 +1,309 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import itertools
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Tuple, Sequence, \
+    Iterable, Union
+
+from gifts._varint import _encode_deltas, _decode_deltas
+
+
+class _DocIds:
+    """Interns the document IDs. Each ID string is stored once, and all the
+    other structures refer to the documents by ordinals, which are 4-byte
+    unsigned ints in the arrays. The ordinals are given in the order of
+    addition, so the posting lists are always sorted by ordinal.
+
+    The ordinals of removed documents are not reused. They stay in the
+    posting lists as tombstones (with `None` instead of ID) until
+    the compaction.
+    """
+
+    def __init__(self):
+        self.ordinal_to_id: List[Optional[str]] = []
+        self.id_to_ordinal: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.id_to_ordinal)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.id_to_ordinal
+
+    def add(self, doc_id: str) -> int:
+        if doc_id in self.id_to_ordinal:
+            raise ValueError(f"Id '{doc_id}' is not unique")
+        ordinal = len(self.ordinal_to_id)
+        self.ordinal_to_id.append(doc_id)
+        self.id_to_ordinal[doc_id] = ordinal
+        return ordinal
+
+    def remove(self, doc_id: str) -> int:
+        """Removes the ID and returns its ordinal."""
+        ordinal = self.id_to_ordinal.pop(doc_id, None)
+        if ordinal is None:
+            raise KeyError(doc_id)
+        self.ordinal_to_id[ordinal] = None
+        return ordinal
+
+    @property
+    def tombstones_ratio(self) -> float:
+        if not self.ordinal_to_id:
+            return 0.0
+        return 1 - len(self.id_to_ordinal) / len(self.ordinal_to_id)
+
+    def compact(self) -> List[int]:
+        """Drops the tombstones and renumbers the ordinals keeping their
+        order. Returns a list of new ordinals by old ordinals, where the
+        tombstones are mapped to -1."""
+        new_ordinals: List[int] = []
+        compacted: List[Optional[str]] = []
+        for doc_id in self.ordinal_to_id:
+            if doc_id is None:
+                new_ordinals.append(-1)
+            else:
+                new_ordinals.append(len(compacted))
+                compacted.append(doc_id)
+        self.ordinal_to_id = compacted
+        self.id_to_ordinal = dict((doc_id, ordinal)
+                                  for ordinal, doc_id in enumerate(compacted)
+                                  if doc_id is not None)
+        return new_ordinals
+
+
+_BLOCK = 128
+"""Number of the ordinals in a block of `_CompressedOrdinals`."""
+
+
+class _CompressedOrdinals(Sequence[int]):
+    """Sorted ordinals as the differences between the neighbours, each as
+    a varint. For a word in many documents, the differences are small, so
+    a posting takes about a byte instead of 4.
+
+    The ordinals are split into blocks of `_BLOCK`. For each block but
+    the first, the ordinal before it and its offset in the data are kept
+    in the skips. A search for some ordinals decodes only the blocks that
+    may contain them.
+    """
+
+    __slots__ = ('_data', '_skips', '_last', '_length')
+
+    def __init__(self, ordinals: Iterable[int] = ()):
+        self._data = bytearray()
+        self._skips: Optional[array] = None
+        """Pairs of the ordinal before a block and the offset of
+        the block. Created with the second block."""
+        self._last = 0
+        self._length = 0
+        for ordinal in ordinals:
+            self.append(ordinal)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(_decode_deltas(self._data))
+
+    def __getitem__(self, index: int) -> int:  # type: ignore[override]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._block(index // _BLOCK)[index % _BLOCK]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) + \
+            (len(self._skips) * 4 if self._skips is not None else 0)
+
+    def append(self, ordinal: int) -> None:
+        if self._length and self._length % _BLOCK == 0:
+            if self._skips is None:
+                self._skips = array('I')
+            self._skips.append(self._last)
+            self._skips.append(len(self._data))
+        self._data += _encode_deltas((ordinal,), self._last)
+        self._last = ordinal
+        self._length += 1
+
+    def _block(self, index: int) -> List[int]:
+        skips = self._skips if self._skips is not None else array('I')
+        # the block `index` is described by the skip `index - 1`
+        previous, start = (skips[index * 2 - 2], skips[index * 2 - 1]) \
+            if index else (0, 0)
+        end = skips[index * 2 + 1] if index * 2 < len(skips) \
+            else len(self._data)
+        return _decode_deltas(self._data, start, end, previous)
+
+    def matching(self, targets: Iterable[int]) -> Iterator[Tuple[int, int]]:
+        """Same as `_matching` for these ordinals."""
+        bases = [0]
+        if self._skips is not None:
+            bases.extend(self._skips[0::2])
+        index = -1
+        block: List[int] = []
+        position = 0
+        for target in targets:
+            # the last block with the ordinal before it less than the
+            # target. The first block has no ordinal before it
+            found = bisect_left(bases, target, max(index, 1)) - 1
+            if found != index:
+                index = found
+                block = self._block(index)
+                position = 0
+            position = _gallop(block, target, position)
+            if position < len(block) and block[position] == target:
+                yield target, index * _BLOCK + position
+
+    def compacted(self, new_ordinals: List[int]) -> '_CompressedOrdinals':
+        """Returns the ordinals without the tombstones, renumbered by
+        `_DocIds.compact`."""
+        return _CompressedOrdinals(new_ordinals[o] for o in self
+                                   if new_ordinals[o] >= 0)
+
+
+_Ordinals = Union[array, _CompressedOrdinals]
+"""A posting list of ordinals, compressed or not."""
+
+
+def _ordinals() -> array:
+    """Creates an empty posting list that holds only the ordinals of the
+    documents: 4 bytes per posting."""
+    return array('I')
+
+
+def _compressed(ordinals: _Ordinals) -> _Ordinals:
+    """Returns the ordinals as `_CompressedOrdinals`, if they fill
+    a block. The shorter lists are kept as they are, since the compression
+    would not pay for the overhead of the object."""
+    if isinstance(ordinals, array) and len(ordinals) >= _BLOCK:
+        return _CompressedOrdinals(ordinals)
+    return ordinals
+
+
+def _compact_ordinals(ordinals: _Ordinals,
+                      new_ordinals: List[int]) -> _Ordinals:
+    """Returns the posting list with the tombstones dropped and the ordinals
+    renumbered by `_DocIds.compact`."""
+    if isinstance(ordinals, _CompressedOrdinals):
+        return ordinals.compacted(new_ordinals)
+    return array('I', (new_ordinals[o] for o in ordinals
+                       if new_ordinals[o] >= 0))
+
+
+class _Postings:
+    """The documents containing a word, and the weights of the word in these
+    documents.
+
+    The ordinals and the weights are kept in two arrays, which takes
+    12 bytes per posting (up to 13 with the over-allocation of the arrays).
+    Compare it to about 90 bytes for a tuple of `str` and `float` in a list.
+    The weights are double-precision floats, so the scores are the same
+    as computed from the counts of the words.
+    """
+
+    __slots__ = ('ordinals', 'weights')
+
+    def __init__(self):
+        self.ordinals: _Ordinals = array('I')
+        self.weights = array('d')
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        return zip(self.ordinals, self.weights)
+
+    def append(self, ordinal: int, weight: float) -> None:
+        self.ordinals.append(ordinal)
+        self.weights.append(weight)
+
+    def compacted(self, new_ordinals: List[int]) -> '_Postings':
+        """Returns the posting list with the tombstones dropped and the
+        ordinals renumbered by `_DocIds.compact`."""
+        result = _Postings()
+        for ordinal, weight in self:
+            if new_ordinals[ordinal] >= 0:
+                result.ordinals.append(new_ordinals[ordinal])
+                result.weights.append(weight)
+        if isinstance(self.ordinals, _CompressedOrdinals):
+            result.compress()
+        return result
+
+    def compress(self) -> None:
+        """Compresses the ordinals, if the list is long enough (see
+        `_compressed`)."""
+        self.ordinals = _compressed(self.ordinals)
+
+
+def _gallop(ordinals: Sequence[int], target: int, lo: int) -> int:
+    """Returns the index of the first ordinal not less than `target`,
+    searching the sorted ordinals from `lo`. The steps double until they
+    overstep the target, so it takes a logarithm of the distance, not
+    of the whole list."""
+    end = len(ordinals)
+    step = 1
+    hi = lo
+    while hi < end and ordinals[hi] < target:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(ordinals, target, lo, min(hi, end))
+
+
+def _matching(ordinals: Sequence[int],
+              targets: Iterable[int]) -> Iterator[Tuple[int, int]]:
+    """Yields (ordinal, index in `ordinals`) for each of the sorted targets
+    found in the sorted ordinals."""
+    if isinstance(ordinals, _CompressedOrdinals):
+        yield from ordinals.matching(targets)
+        return
+    end = len(ordinals)
+    index = 0
+    for target in targets:
+        index = _gallop(ordinals, target, index)
+        if index == end:
+            return
+        if ordinals[index] == target:
+            yield target, index
+
+
+def _intersect(lists: List[Sequence[int]]) -> List[int]:
+    """Returns the ordinals present in all the sorted lists. Starts from
+    the shortest list, so the next lists are only probed for the remaining
+    ordinals."""
+    lists = sorted(lists, key=len)
+    result: List[int] = list(lists[0]) if lists else []
+    for ordinals in lists[1:]:
+        if not result:
+            break
+        result = [ordinal for ordinal, _ in _matching(ordinals, result)]
+    return result
+
+
+def _subtract(ordinals: List[int], lists: List[Sequence[int]]) -> List[int]:
+    """Returns the sorted ordinals that are not present in any of the
+    sorted lists."""
+    for other in lists:
+        if not ordinals:
+            break
+        found = set(ordinal for ordinal, _ in _matching(other, ordinals))
+        if found:
+            ordinals = [ordinal for ordinal in ordinals
+                        if ordinal not in found]
+    return ordinals
+
+
+def _filtered(any_of: List[Sequence[int]], all_of: List[Sequence[int]],
+              none_of: List[Sequence[int]]) -> List[int]:
+    """Returns the sorted ordinals present in all the `all_of` lists (or,
+    if there are none, in any of the `any_of` lists), and not present in
+    the `none_of` lists. When the `any_of` lists are shorter than the
+    `all_of` ones, the result is also narrowed to them."""
+    if all_of and min(map(len, all_of)) <= sum(map(len, any_of)):
+        result = _intersect(all_of)
+    else:
+        any_of_union = sorted(set(itertools.chain.from_iterable(any_of)))
+        result = _intersect([any_of_union, *all_of])
+    return _subtract(result, none_of)
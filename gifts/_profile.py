@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import time
+from typing import Any, NamedTuple, Tuple, Iterable, List
+
+from gifts._document import _counters
+
+
+class SearchStats(NamedTuple):
+    """What a single search did. Passed to the `on_search` callback of
+    `SmoothFts` and `SimpleFts`."""
+    query: Tuple[Any, ...]
+    cached: bool
+    """The result was taken from the cache. The other numbers are zero
+    then."""
+    terms: int
+    """Words of the query that occur in the database."""
+    postings: int
+    """Entries of the posting lists visited. When the remaining words can
+    only change the scores of the collected documents, and there are fewer
+    of them than the entries, the documents are visited instead."""
+    candidates: int
+    """Documents that got a score."""
+    weights_computed: int
+    """Documents whose weights were recomputed after a change of the IDF
+    statistics. Always zero for `SimpleFts`."""
+    prepare_seconds: float
+    """Weighting and ordering the query words, selecting the filtered
+    documents, and building the NumPy matrix."""
+    score_seconds: float
+    """Walking the posting lists and summing the scores."""
+    rank_seconds: float
+    """Selecting and sorting the top."""
+    stop_words: Tuple[Any, ...] = ()
+    """Words of the query ignored as too common (see `stop_words_ratio`)."""
+    skipped_words: Tuple[Any, ...] = ()
+    """Words of the query, whose posting lists were not walked: the top
+    was already known to be among the collected documents, so the weights
+    were looked up for them only."""
+
+    @property
+    def total_seconds(self) -> float:
+        return self.prepare_seconds + self.score_seconds + self.rank_seconds
+
+
+class _Profile:
+    """Collects the `SearchStats` while a search runs. The phases are
+    timed from the creation to `prepared`, then to `scored`, then to
+    `stats`."""
+    __slots__ = ('terms', 'postings', 'candidates', 'stop_words',
+                 'skipped_words', '_norms_computed', '_started', '_prepared',
+                 '_scored')
+
+    def __init__(self) -> None:
+        self.terms = 0
+        self.postings = 0
+        self.candidates = 0
+        self.stop_words: Tuple[Any, ...] = ()
+        self.skipped_words: List[Any] = []
+        self._norms_computed = _counters.norms_computed
+        self._started = time.perf_counter()
+        self._prepared = self._scored = self._started
+
+    def prepared(self, terms: int) -> None:
+        self.terms = terms
+        self._prepared = self._scored = time.perf_counter()
+
+    def scored(self, candidates: int) -> None:
+        self.candidates = candidates
+        self._scored = time.perf_counter()
+
+    def stats(self, query: Iterable[Any]) -> SearchStats:
+        finished = time.perf_counter()
+        return SearchStats(
+            query=tuple(query), cached=False, terms=self.terms,
+            postings=self.postings, candidates=self.candidates,
+            weights_computed=_counters.norms_computed - self._norms_computed,
+            prepare_seconds=self._prepared - self._started,
+            score_seconds=self._scored - self._prepared,
+            rank_seconds=finished - self._scored,
+            stop_words=self.stop_words,
+            skipped_words=tuple(self.skipped_words))
+
+
+def _cached_stats(query: Iterable[Any]) -> SearchStats:
+    return SearchStats(query=tuple(query), cached=True, terms=0, postings=0,
+                       candidates=0, weights_computed=0, prepare_seconds=0.0,
+                       score_seconds=0.0, rank_seconds=0.0)
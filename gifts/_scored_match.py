@@ -0,0 +1,16 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from typing import NamedTuple
+
+
+class ScoredMatch(NamedTuple):
+    """A document found by `search_scored`.
+
+    The `score` is the value the documents are ranked by: the cosine
+    similarity in `SmoothFts`, the sum of weights in `SimpleFts`.
+    The `words_matched` is the number of unique query words in the document.
+    """
+    doc_id: str
+    score: float
+    words_matched: int
@@ -0,0 +1,318 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import threading
+import uuid
+from collections import Counter
+from typing import Iterable, List, Optional, TypeVar, Generic, Tuple, Any, \
+    Dict, FrozenSet, NamedTuple
+
+from gifts._fts_frozen import FrozenFts
+from gifts._fts_smooth import SmoothFts
+from gifts._top_k import _TopK
+
+TWord = TypeVar('TWord')
+
+
+class _Segment(NamedTuple):
+    """Documents that are not changed anymore. Only marked as removed."""
+    frozen: FrozenFts
+    words: Dict[str, Tuple[Any, ...]]
+    """The words of each document, to rebuild the segment when merging."""
+    word_to_df: Counter
+    """Number of documents containing each word in the segment."""
+
+
+class Snapshot(Generic[TWord]):
+    """The documents of `SegmentedFts` at some moment. It is not affected by
+    the later changes, so the searches within the same snapshot are
+    consistent with each other."""
+
+    def __init__(self, segments: Tuple[_Segment, ...],
+                 removed: Tuple[FrozenSet[str], ...]):
+        self._segments = segments
+        self._removed = removed
+        """IDs of the removed documents of each segment."""
+        self._removed_df: Optional[Counter] = None
+        """Number of the removed documents containing each word. Counted
+        by the first search."""
+
+    @property
+    def documents_count(self) -> int:
+        return sum(segment.frozen.documents_count - len(removed)
+                   for segment, removed in zip(self._segments, self._removed))
+
+    @property
+    def segments_count(self) -> int:
+        return len(self._segments)
+
+    @property
+    def segments(self) -> Tuple[_Segment, ...]:
+        return self._segments
+
+    @property
+    def removed(self) -> Tuple[FrozenSet[str], ...]:
+        """IDs of the removed documents of each segment."""
+        return self._removed
+
+    def _df(self, word: TWord) -> int:
+        """Number of the documents containing the word in the snapshot."""
+        removed_df = self._removed_df
+        if removed_df is None:
+            removed_df = Counter()
+            for segment, removed in zip(self._segments, self._removed):
+                for doc_id in removed:
+                    removed_df.update(set(segment.words[doc_id]))
+            # several threads may count it at once, with the same result
+            self._removed_df = removed_df
+        return sum(segment.word_to_df[word] for segment in self._segments) \
+            - removed_df[word]
+
+    def search(self, query: List[TWord],
+               limit: Optional[int] = None) -> List[str]:
+        """Returns IDs of documents that include at least one word from `query`.
+        More relevant matches will be at the top of the list.
+
+        `limit` is the maximum number of IDs to return.
+        """
+        if len(query) <= 0:
+            raise ValueError("Query is empty")
+        top: _TopK[str] = _TopK(limit)
+        if not self._segments:
+            return []
+        # The query is weighted once with the statistics of all the
+        # segments, so the scores of different segments are comparable
+        word_to_weight = self._segments[0].frozen.query_weights(
+            query, df=self._df, documents_count=self.documents_count)
+        for segment, removed in zip(self._segments, self._removed):
+            # the removed documents may take places in the top of the segment
+            segment_limit = limit + len(removed) if limit is not None \
+                else None
+            for score, doc_id in segment.frozen.ranked(
+                    query, segment_limit, word_to_weight):
+                if doc_id not in removed:
+                    top.push((score, doc_id), doc_id)
+        return top.sorted_items()
+
+
+class SegmentedFts(Generic[TWord]):
+    """Can be searched by many threads while other threads change it.
+
+    The new documents are added to a small mutable database, that is not
+    searched. When it has `segment_size` documents, or on `flush`, it is
+    frozen into a read-only segment. The searches read a snapshot: a tuple
+    of segments, that is replaced as a whole on each change. So they never
+    wait for the changes, and never see a half-updated database.
+
+    When there are more than `max_segments`, the smallest ones are merged
+    in a background thread.
+
+    The documents of each segment are weighted with the statistics of all
+    the documents at the moment of its freezing or merging, so the scores
+    are approximate, like in `SmoothFts` with `idf_refresh_ratio`. After
+    `merge`, that leaves a single segment, they are exact. The query is
+    weighted with the statistics of the snapshot, the same for all
+    the segments.
+    """
+
+    def __init__(self, fts_type: type = SmoothFts,
+                 segment_size: int = 10000,
+                 max_segments: int = 8,
+                 **fts_options):
+        """The segments are built by `fts_type` (`SmoothFts` or `SimpleFts`)
+        created with `fts_options`."""
+        if segment_size < 1:
+            raise ValueError(f"Segment size must be positive: {segment_size}")
+        if max_segments < 1:
+            raise ValueError(f"Max segments must be positive: {max_segments}")
+        self._fts_type = fts_type
+        self._fts_options = fts_options
+        self._segment_size = segment_size
+        self._max_segments = max_segments
+
+        self._lock = threading.RLock()
+        """Taken by the changes. The searches do not take it."""
+        self._snapshot: Snapshot[TWord] = Snapshot((), ())
+        self._buffer = fts_type(**fts_options)
+        self._buffer_words: Dict[str, Tuple[Any, ...]] = {}
+        self._word_to_df: Counter = Counter()
+        """Number of the documents containing each word in the segments."""
+        self._merge_thread: Optional[threading.Thread] = None
+
+    @property
+    def documents_count(self) -> int:
+        """Including the documents that are not flushed yet."""
+        with self._lock:
+            return self._snapshot.documents_count + len(self._buffer_words)
+
+    def snapshot(self) -> Snapshot[TWord]:
+        """Returns the current state of the database for searching. It
+        contains the flushed documents."""
+        return self._snapshot
+
+    def search(self, query: List[TWord],
+               limit: Optional[int] = None) -> List[str]:
+        """Searches the current snapshot (see `Snapshot.search`)."""
+        return self._snapshot.search(query, limit=limit)
+
+    def add(self, words: Iterable[TWord], doc_id: Optional[str] = None) -> str:
+        """Adds a document and returns its ID. The document becomes
+        searchable after the next flush."""
+        if doc_id is None:
+            doc_id = str(uuid.uuid4())
+        words = tuple(words)
+        with self._lock:
+            if doc_id in self._buffer_words \
+                    or self._find_segment(doc_id) is not None:
+                raise ValueError(f"Id '{doc_id}' is not unique")
+            self._buffer.add(words, doc_id=doc_id)
+            self._buffer_words[doc_id] = words
+            if len(self._buffer_words) >= self._segment_size:
+                self._flush()
+        return doc_id
+
+    def add_many(self,
+                 docs: Iterable[Tuple[Optional[str], Iterable[TWord]]]) \
+            -> None:
+        """Adds documents from an iterable of `(doc_id, words)` pairs."""
+        for doc_id, words in docs:
+            self.add(words, doc_id=doc_id)
+
+    def remove(self, doc_id: str) -> None:
+        """Removes the document. The searches stop returning it after
+        the next flush, or at once if it was flushed."""
+        with self._lock:
+            if doc_id in self._buffer_words:
+                self._buffer.remove(doc_id)
+                del self._buffer_words[doc_id]
+                return
+            index = self._find_segment(doc_id)
+            if index is None:
+                raise KeyError(doc_id)
+            snapshot = self._snapshot
+            segment = snapshot.segments[index]
+            self._word_to_df.subtract(set(segment.words[doc_id]))
+            removed = list(snapshot.removed)
+            removed[index] = removed[index] | {doc_id}
+            self._snapshot = Snapshot(snapshot.segments, tuple(removed))
+
+    def update(self, doc_id: str, words: Iterable[TWord]) -> str:
+        """Replaces the words of the document."""
+        with self._lock:
+            self.remove(doc_id)
+            return self.add(words, doc_id=doc_id)
+
+    def flush(self) -> None:
+        """Makes the added documents searchable."""
+        with self._lock:
+            self._flush()
+
+    def merge(self) -> None:
+        """Merges all the segments into one, and waits for it. The scores
+        are exact after that, until the next change."""
+        self.flush()
+        self._wait_for_merge()
+        with self._lock:
+            segments = self._snapshot.segments
+        if len(segments) > 1 or any(self._snapshot.removed):
+            self._merge(segments)
+
+    def _find_segment(self, doc_id: str) -> Optional[int]:
+        snapshot = self._snapshot
+        for index, (segment, removed) in enumerate(
+                zip(snapshot.segments, snapshot.removed)):
+            if doc_id in segment.words and doc_id not in removed:
+                return index
+        return None
+
+    def _flush(self) -> None:
+        if not self._buffer_words:
+            return
+        segment = self._freeze(self._buffer, self._buffer_words, new=True)
+        self._word_to_df.update(segment.word_to_df)
+        snapshot = self._snapshot
+        self._snapshot = Snapshot(snapshot.segments + (segment,),
+                                  snapshot.removed + (frozenset(),))
+        self._buffer = self._fts_type(**self._fts_options)
+        self._buffer_words = {}
+        self._start_merge_if_needed()
+
+    def _start_merge_if_needed(self) -> None:
+        segments = self._snapshot.segments
+        if len(segments) <= self._max_segments or \
+                self._merge_thread is not None:
+            return
+        smallest = sorted(segments, key=lambda s: s.frozen.documents_count)
+        self._merge_thread = threading.Thread(
+            target=self._merge,
+            args=(tuple(smallest[:len(segments) - self._max_segments + 1]),),
+            daemon=True)
+        self._merge_thread.start()
+
+    def _wait_for_merge(self) -> None:
+        # a finished merge may start the next one
+        while True:
+            thread = self._merge_thread
+            if thread is None:
+                break
+            thread.join()
+
+    def _freeze(self, fts: Any, words: Dict[str, Tuple[Any, ...]],
+                new: bool) -> _Segment:
+        """Creates a segment from the database with the documents of
+        `words`. It is weighted with the statistics of all the segments.
+        The `new` documents are not counted in the statistics yet."""
+        word_to_df: Counter = Counter()
+        for doc_words in words.values():
+            word_to_df.update(set(doc_words))
+        fts.use_global_stats(
+            dict((word, self._word_to_df[word] + (df if new else 0))
+                 for word, df in word_to_df.items()),
+            self._snapshot.documents_count + (len(words) if new else 0))
+        return _Segment(frozen=fts.freeze(), words=words,
+                        word_to_df=word_to_df)
+
+    def _live_words(self, segments: Tuple[_Segment, ...]) \
+            -> Dict[str, Tuple[Any, ...]]:
+        """Returns the words of the documents of the segments, that are not
+        removed in the current snapshot."""
+        snapshot = self._snapshot
+        result: Dict[str, Tuple[Any, ...]] = {}
+        for segment, removed in zip(snapshot.segments, snapshot.removed):
+            if any(segment is s for s in segments):
+                result.update((doc_id, doc_words)
+                              for doc_id, doc_words in segment.words.items()
+                              if doc_id not in removed)
+        return result
+
+    def _merge(self, segments: Tuple[_Segment, ...]) -> None:
+        """Replaces the segments by a single one without the removed
+        documents. The documents are added without the lock. Then the lock
+        is taken to catch up with the removals made meanwhile, and to
+        replace the segments."""
+        try:
+            with self._lock:
+                words = self._live_words(segments)
+            fts = self._fts_type(**self._fts_options)
+            fts.add_many(words.items())
+            with self._lock:
+                snapshot = self._snapshot
+                if not all(any(segment is s for s in snapshot.segments)
+                           for segment in segments):
+                    return  # merged by someone else
+                live_words = self._live_words(segments)
+                for doc_id in words:
+                    if doc_id not in live_words:
+                        fts.remove(doc_id)
+                merged = self._freeze(fts, live_words, new=False)
+                kept = [(segment, removed) for segment, removed
+                        in zip(snapshot.segments, snapshot.removed)
+                        if not any(segment is s for s in segments)]
+                self._snapshot = Snapshot(
+                    tuple(segment for segment, _ in kept) + (merged,),
+                    tuple(removed for _, removed in kept) + (frozenset(),))
+        finally:
+            with self._lock:
+                if self._merge_thread is threading.current_thread():
+                    self._merge_thread = None
+                    self._start_merge_if_needed()
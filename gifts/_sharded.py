@@ -0,0 +1,294 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import itertools
+import multiprocessing
+import os
+import time
+import uuid
+import zlib
+from collections import Counter
+from multiprocessing.connection import Connection
+from typing import Iterable, List, Optional, TypeVar, Generic, Tuple, Any, \
+    Dict, Mapping
+
+from gifts._bulk import BulkAddReport
+from gifts._cursor import SearchPage, _decode_cursor, _page, _page_size
+from gifts._fts_smooth import SmoothFts
+from gifts._scored_match import ScoredMatch
+from gifts._top_k import _TopK
+
+TWord = TypeVar('TWord')
+
+_BATCH_SIZE = 10000
+"""Number of documents that `add_many` sends to the shards at once."""
+
+
+def _serve(connection: Connection, fts_type: type,
+           fts_options: Dict[str, Any]) -> None:
+    """The loop of a shard process. Receives (method name, args, kwargs),
+    calls the method of the database and sends back (`True`, result) or
+    (`False`, exception). Stops on `None`."""
+    fts = fts_type(**fts_options)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args, kwargs = request
+        try:
+            result = getattr(fts, method)(*args, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            connection.send((False, e))
+        else:
+            connection.send((True, result))
+    connection.close()
+
+
+class ShardedFts(Generic[TWord]):
+    """Splits the documents across `shards` databases, each served by its
+    own process. The queries are sent to all the shards at once, so they are
+    searched on multiple cores in parallel.
+
+    Each shard is an instance of `fts_type` (`SmoothFts` or `SimpleFts`)
+    created with `fts_options`. The document frequencies of the words are
+    exchanged between the shards before a search, so the scores and the
+    results are the same as in a single database with all the documents.
+
+    Close the database with `close` or use it as a context manager.
+    """
+
+    def __init__(self, fts_type: type = SmoothFts,
+                 shards: Optional[int] = None,
+                 stats_refresh_ratio: float = 0.0,
+                 **fts_options):
+        """`shards` is the number of processes, by default the number of
+        CPUs.
+
+        `stats_refresh_ratio` allows the global statistics to get stale,
+        like the `idf_refresh_ratio` of `SmoothFts`. By default, the shards
+        exchange the statistics before the first search after any change.
+        With `0.1`, they do it when the number of added and removed
+        documents exceeds 10% of the documents since the last exchange.
+        Each exchange transfers the whole dictionary of words.
+        """
+        if shards is None:
+            shards = os.cpu_count() or 1
+        if shards < 1:
+            raise ValueError(f"Number of shards must be positive: {shards}")
+        if stats_refresh_ratio < 0:
+            raise ValueError(f"Negative ratio: {stats_refresh_ratio}")
+        self._stats_refresh_ratio = stats_refresh_ratio
+        self._documents_at_exchange = 0
+        self._changes_since_exchange = 0
+
+        self._connections: List[Connection] = []
+        self._processes: List[multiprocessing.Process] = []
+        for _ in range(shards):
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve,
+                args=(child_connection, fts_type, fts_options),
+                daemon=True)
+            process.start()
+            child_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def __enter__(self) -> 'ShardedFts[TWord]':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops the processes of the shards."""
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    @property
+    def shards_count(self) -> int:
+        return len(self._connections)
+
+    @property
+    def documents_count(self) -> int:
+        return sum(self._call_all('__getattribute__', 'documents_count'))
+
+    def _shard_of(self, doc_id: str) -> int:
+        # not `hash`, which is randomized for each process
+        return zlib.crc32(doc_id.encode('utf-8')) % len(self._connections)
+
+    def _call(self, shard: int, method: str, *args, **kwargs) -> Any:
+        connection = self._connections[shard]
+        connection.send((method, args, kwargs))
+        return self._receive(connection)
+
+    def _call_all(self, method: str, *args, **kwargs) -> List[Any]:
+        """Calls the method in all the shards in parallel."""
+        return self._call_each([(args, kwargs)] * len(self._connections),
+                               method)
+
+    def _call_each(self, args_by_shard: List[Tuple[tuple, Dict[str, Any]]],
+                   method: str) -> List[Any]:
+        """Calls the method with different arguments in each shard in
+        parallel."""
+        for connection, (args, kwargs) in zip(self._connections,
+                                              args_by_shard):
+            connection.send((method, args, kwargs))
+        # receiving all the results even if some of them are errors, so the
+        # next call will not get a stale result
+        outcomes = [connection.recv() for connection in self._connections]
+        for succeeded, result in outcomes:
+            if not succeeded:
+                raise result
+        return [result for _, result in outcomes]
+
+    @staticmethod
+    def _receive(connection: Connection) -> Any:
+        succeeded, result = connection.recv()
+        if not succeeded:
+            raise result
+        return result
+
+    def add(self, words: Iterable[TWord], doc_id: Optional[str] = None,
+            attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """Adds a document to one of the shards and returns its ID."""
+        if doc_id is None:
+            doc_id = str(uuid.uuid4())
+        self._call(self._shard_of(doc_id), 'add_many',
+                   [(doc_id, list(words), attributes)])
+        self._changes_since_exchange += 1
+        return doc_id
+
+    def add_many(self, docs: Iterable[Tuple[Any, ...]]) -> BulkAddReport:
+        """Adds documents from an iterable of `(doc_id, words)` pairs, or
+        `(doc_id, words, attributes)` triples.
+
+        The documents are sent to the shards in batches, and the shards add
+        each batch in parallel.
+        """
+        started = time.monotonic()
+        added = 0
+        iterator = iter(docs)
+        while True:
+            batch = list(itertools.islice(iterator, _BATCH_SIZE))
+            if not batch:
+                break
+            shard_to_docs: List[List[Tuple[Any, ...]]] = \
+                [[] for _ in self._connections]
+            for doc_id, words, *attributes in batch:
+                if doc_id is None:
+                    doc_id = str(uuid.uuid4())
+                shard_to_docs[self._shard_of(doc_id)].append(
+                    (doc_id, list(words), *attributes))
+            try:
+                reports = self._call_each(
+                    [((shard_docs,), {}) for shard_docs in shard_to_docs],
+                    'add_many')
+                added += sum(report.documents for report in reports)
+            finally:
+                self._changes_since_exchange += len(batch)
+        return BulkAddReport(documents=added,
+                             seconds=time.monotonic() - started)
+
+    def remove(self, doc_id: str) -> None:
+        """Removes the document from its shard."""
+        self._call(self._shard_of(doc_id), 'remove', doc_id)
+        self._changes_since_exchange += 1
+
+    def update(self, doc_id: str, words: Iterable[TWord],
+               attributes: Optional[Mapping[str, Any]] = None) -> str:
+        """Replaces the words and the attributes of the document."""
+        self.remove(doc_id)
+        return self.add(words, doc_id=doc_id, attributes=attributes)
+
+    def compact(self) -> None:
+        """Drops the postings of the removed documents in all the shards."""
+        self._call_all('compact')
+
+    def refresh_stats(self) -> None:
+        """Exchanges the document frequencies between the shards."""
+        word_to_df: Counter = Counter()
+        for shard_word_to_df in self._call_all('_document_frequencies'):
+            word_to_df.update(shard_word_to_df)
+        documents_count = self.documents_count
+        self._call_all('use_global_stats', dict(word_to_df), documents_count)
+        self._documents_at_exchange = documents_count
+        self._changes_since_exchange = 0
+
+    def _refresh_stats_if_stale(self) -> None:
+        if self._changes_since_exchange > \
+                self._documents_at_exchange * self._stats_refresh_ratio:
+            self.refresh_stats()
+
+    def search(self, query: List[TWord], limit: Optional[int] = None,
+               **search_options) -> List[str]:
+        """Returns IDs of documents that include at least one word from `query`.
+        More relevant matches will be at the top of the list.
+
+        `limit` is the maximum number of IDs to return. Each shard returns
+        its own top, and the tops are merged. The other arguments (like
+        `min_score`) are passed to the `search` of the shards.
+        """
+        return [match.doc_id
+                for match in self.search_scored(query, limit=limit,
+                                                **search_options)]
+
+    def search_scored(self, query: List[TWord], limit: Optional[int] = None,
+                      **search_options) -> List[ScoredMatch]:
+        """Same as `search`, but returns the scores of the documents."""
+        if len(query) <= 0:
+            raise ValueError("Query is empty")
+        return [match for _, match in self._scored_many(
+            [list(query)], limit=limit, **search_options)[0]]
+
+    def search_page(self, query: List[TWord], page_size: int,
+                    cursor: Optional[str] = None,
+                    **search_options) -> SearchPage:
+        """Returns a page of the results of `search_scored`. The next pages
+        are requested with the `next_cursor` of the previous page."""
+        if len(query) <= 0:
+            raise ValueError("Query is empty")
+        below = _decode_cursor(cursor) if cursor is not None else None
+        entries = self._scored_many([list(query)],
+                                    limit=_page_size(page_size),
+                                    below=below, **search_options)[0]
+        return _page(entries, page_size)
+
+    def search_many(self, queries: Iterable[List[TWord]],
+                    limit: Optional[int] = None,
+                    **search_options) -> List[List[str]]:
+        """Does the same as calling `search` for each query, and returns
+        the results in the same order as the queries.
+
+        The whole batch is sent to each shard in one message, and the shards
+        search it in parallel by their `search_many`.
+        """
+        queries = [list(query) for query in queries]
+        if any(len(query) <= 0 for query in queries):
+            raise ValueError("Query is empty")
+        return [[match.doc_id for _, match in entries]
+                for entries in self._scored_many(queries, limit=limit,
+                                                 **search_options)]
+
+    def _scored_many(self, queries: List[List[TWord]],
+                     limit: Optional[int],
+                     below: Optional[Tuple[Any, ...]] = None,
+                     **search_options) \
+            -> List[List[Tuple[Any, ScoredMatch]]]:
+        """Returns the merged (ranking key, match) pairs of the shards for
+        each query."""
+        self._refresh_stats_if_stale()
+        tops: List[_TopK[ScoredMatch]] = [_TopK(limit, below)
+                                          for _ in queries]
+        for shard_entries in self._call_all('_ranked_many', queries,
+                                            limit=limit, below=below,
+                                            scored=True, **search_options):
+            for top, entries in zip(tops, shard_entries):
+                for key, match in entries:
+                    top.push(key, match)
+        return [top.sorted_entries() for top in tops]
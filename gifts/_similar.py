@@ -0,0 +1,115 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, \
+    NamedTuple, Tuple, TypeVar
+
+from gifts._stop import _check_stopped
+
+TWord = TypeVar('TWord')
+
+# The bounds are sums of the same products as the scores, but in another
+# order. So they may differ from the scores in the last digits
+_ROUNDING = 1e-9
+
+
+class SimilarPair(NamedTuple):
+    """Two documents found by `similar_pairs`. The `score` is the same as
+    the score of `second` in `more_like_this(first)`."""
+    first: str
+    second: str
+    score: float
+
+
+class _Indexed(NamedTuple):
+    prefix: Dict[Any, float]
+    """The weights of the words that are not in the index."""
+    size: int
+    max_weight: float
+
+
+def _all_pairs(vectors: Iterable[Tuple[int, List[Tuple[TWord, float]]]],
+               word_to_max_weight: Dict[TWord, float],
+               threshold: float,
+               exact_score: Callable[[int, int], float]) \
+        -> Iterator[Tuple[int, int, float]]:
+    """Yields `(first, second, score)` for the pairs of vectors with
+    the dot product of at least `threshold`, where the `first` vector came
+    before the `second`.
+
+    The vectors are `(key, [(word, weight), ...])` with the words in
+    the same global order, most frequent first. The `word_to_max_weight`
+    is the max weight of each word among all the vectors. The dot products
+    are verified by `exact_score(first, second)`.
+
+    It is the AllPairs algorithm (Bayardo et al., 2007). A vector is
+    indexed only by the words after its prefix, where the prefix is the
+    longest start, whose dot product with any vector is below the
+    threshold. So two similar vectors always share an indexed word, and
+    the frequent words, that usually make the prefixes, get short
+    posting lists. The candidates are also dropped by the number of their
+    words, and are not collected from the words of the vector that cannot
+    add up to the threshold anymore.
+    """
+    word_to_entries: Dict[TWord, Tuple[array, array]] = {}
+    indexed: Dict[int, _Indexed] = {}
+
+    for key, vector in vectors:
+        _check_stopped()
+        if not vector:
+            continue
+        size = len(vector)
+        max_weight = max(weight for _, weight in vector)
+
+        # matching with the vectors that came before, the rarest words
+        # first, since they have the shortest posting lists
+        key_to_sum: Dict[int, float] = {}
+        remaining = sum(weight * word_to_max_weight[word]
+                        for word, weight in vector)
+        for word, weight in reversed(vector):
+            collecting_new = remaining >= threshold - _ROUNDING
+            remaining -= weight * word_to_max_weight[word]
+            entries = word_to_entries.get(word)
+            if entries is None:
+                continue
+            for other, other_weight in zip(*entries):
+                product_sum = key_to_sum.get(other)
+                if product_sum is None:
+                    if not collecting_new:
+                        continue
+                    other_indexed = indexed[other]
+                    if min(size, other_indexed.size) * max_weight \
+                            * other_indexed.max_weight \
+                            < threshold - _ROUNDING:
+                        continue
+                    product_sum = 0.0
+                key_to_sum[other] = product_sum + weight * other_weight
+
+        if key_to_sum:
+            word_to_weight = dict(vector)
+            for other, product_sum in key_to_sum.items():
+                prefix_sum = sum(word_to_weight.get(word, 0.0) * weight
+                                 for word, weight
+                                 in indexed[other].prefix.items())
+                if product_sum + prefix_sum >= threshold - _ROUNDING:
+                    score = exact_score(other, key)
+                    if score >= threshold:
+                        yield other, key, score
+
+        # indexing the words after the prefix
+        prefix: Dict[TWord, float] = {}
+        bound = 0.0
+        for word, weight in vector:
+            bound += weight * word_to_max_weight[word]
+            if bound < threshold - _ROUNDING:
+                prefix[word] = weight
+                continue
+            entries = word_to_entries.get(word)
+            if entries is None:
+                entries = (array('I'), array('d'))
+                word_to_entries[word] = entries
+            entries[0].append(key)
+            entries[1].append(weight)
+        indexed[key] = _Indexed(prefix=prefix, size=size,
+                                max_weight=max_weight)
@@ -0,0 +1,34 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class SearchStopped(Exception):
+    """Raised by a search that was stopped before completion, because its
+    caller was cancelled or timed out (see `AsyncFts`)."""
+
+
+_local = threading.local()
+
+
+@contextmanager
+def _stoppable(stop: threading.Event) -> Iterator[None]:
+    """Makes the searches in the current thread raise `SearchStopped` after
+    the event is set."""
+    previous: Optional[threading.Event] = getattr(_local, 'stop', None)
+    _local.stop = stop
+    try:
+        yield
+    finally:
+        _local.stop = previous
+
+
+def _check_stopped() -> None:
+    """Called by the searches between the posting lists. The lists are
+    walked without checks, so the cost does not depend on their length."""
+    stop: Optional[threading.Event] = getattr(_local, 'stop', None)
+    if stop is not None and stop.is_set():
+        raise SearchStopped
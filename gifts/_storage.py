@@ -0,0 +1,291 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+# The binary file of a frozen database. All the numbers are in the native
+# byte order, all the sections are aligned to 8 bytes:
+#
+#   header         _HEADER struct: magic, format version, byte order,
+#                  flags, counts of documents/words/postings and
+#                  the offsets of the sections below
+#   doc_offsets    'Q' * (documents + 1), offsets within doc_blob
+#   doc_blob       UTF-8 document IDs
+#   word_offsets   'Q' * (words + 1), offsets within word_blob
+#   word_blob      words encoded by `_encode_word`, sorted as bytes, so
+#                  a word is looked up with a binary search without
+#                  loading the dictionary
+#   idfs           'd' * words (only for the databases with IDF)
+#   post_offsets   'Q' * (words + 1), offsets within the posting arrays
+#   ordinals       'I' * postings
+#   impacts        'd' * postings
+#
+# The file can be memory-mapped. Then nothing is read at loading, and the
+# pages are shared by all the processes that opened the same file.
+
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Iterable, Tuple, Optional, Any, List, Union, BinaryIO, \
+    Callable, Dict
+
+_MAGIC = b'GIFTSFTS'
+_FORMAT_VERSION = 3
+_FLAG_IDF = 1
+
+_HEADER = struct.Struct('<8sIIIIQQQ8Q')
+_HEADER_FIELDS = ('magic', 'version', 'little_endian', 'flags', 'reserved',
+                  'documents', 'words', 'postings',
+                  'doc_offsets', 'doc_blob', 'word_offsets', 'word_blob',
+                  'idfs', 'post_offsets', 'ordinals', 'impacts')
+
+_LENGTH = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+
+
+def _encode_word(word: Any) -> bytes:
+    """Encodes the word as a type tag and the value. The words equal in
+    a dict are encoded the same: `1`, `1.0` and `True` are the same word,
+    and so are the tuples of them.
+
+    Raises `TypeError` for the words other than strings, bytes, numbers,
+    `None` and tuples of them."""
+    if isinstance(word, str):
+        return b's' + word.encode('utf-8', 'surrogatepass')
+    if isinstance(word, float) and word.is_integer():
+        word = int(word)
+    if isinstance(word, int):
+        return b'i' + word.to_bytes(word.bit_length() // 8 + 1, 'little',
+                                    signed=True)
+    if isinstance(word, float):
+        return b'f' + _FLOAT.pack(word)
+    if isinstance(word, bytes):
+        return b'b' + word
+    if word is None:
+        return b'n'
+    if isinstance(word, tuple):
+        items = [_encode_word(item) for item in word]
+        return b't' + b''.join(_LENGTH.pack(len(item)) + item
+                               for item in items)
+    raise TypeError(f"Cannot save the word {word!r}: the words must be "
+                    f"strings, bytes, numbers, None or tuples of them")
+
+
+def _decode_word(encoded: bytes) -> Any:
+    tag, value = encoded[:1], encoded[1:]
+    if tag == b's':
+        return str(value, 'utf-8', 'surrogatepass')
+    if tag == b'i':
+        return int.from_bytes(value, 'little', signed=True)
+    if tag == b'f':
+        return _FLOAT.unpack(value)[0]
+    if tag == b'b':
+        return value
+    if tag == b'n':
+        return None
+    assert tag == b't'
+    items = []
+    position = 0
+    while position < len(value):
+        (length,) = _LENGTH.unpack_from(value, position)
+        position += _LENGTH.size
+        items.append(_decode_word(value[position:position + length]))
+        position += length
+    return tuple(items)
+
+
+class _MappedStrings(Sequence):
+    """Document IDs read from the file on demand."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):  # type: ignore
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]],
+                   'utf-8')
+
+
+class _MappedWords(Mapping):
+    """The dictionary of words read from the file on demand. Maps each word
+    to its index in the arrays of the file."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _encoded(self, index: int) -> bytes:
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+    def __getitem__(self, word: Any) -> int:
+        try:
+            encoded = _encode_word(word)
+        except TypeError:
+            # such words cannot be saved
+            raise KeyError(word) from None
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._encoded(mid) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._encoded(lo) == encoded:
+            return lo
+        raise KeyError(word)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield _decode_word(self._encoded(index))
+
+
+class _MappedFile(Mapping):
+    """Read-only mapping of words to the values stored in the file
+    for each word."""
+
+    def __init__(self, words: _MappedWords, value):
+        self._words = words
+        self._value = value
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __getitem__(self, word: Any):
+        return self._value(self._words[word])
+
+    def __iter__(self):
+        return iter(self._words)
+
+
+def _pad(out: BinaryIO) -> int:
+    position = out.tell()
+    if position % 8:
+        out.write(b'\0' * (8 - position % 8))
+    return out.tell()
+
+
+def _write_array(out: BinaryIO, typecode: str, values: Iterable) -> int:
+    start = _pad(out)
+    array(typecode, values).tofile(out)  # type: ignore
+    return start
+
+
+def _write_bytes(out: BinaryIO, data: bytes) -> int:
+    start = _pad(out)
+    out.write(data)
+    return start
+
+
+def _offsets(lengths: Iterable[int]) -> List[int]:
+    result = [0]
+    for length in lengths:
+        result.append(result[-1] + length)
+    return result
+
+
+def _save(path: Union[str, Path],
+          doc_ids: Sequence,
+          terms: Iterable[Tuple[Any, Optional[float], Sequence, Sequence]]) \
+        -> None:
+    """Writes the database to a file. The `terms` are tuples of
+    (word, idf or None, ordinals, impacts)."""
+    doc_blobs = [doc_id.encode('utf-8') for doc_id in doc_ids]
+    entries = sorted(((_encode_word(word), idf, ordinals, impacts)
+                      for word, idf, ordinals, impacts in terms),
+                     key=lambda e: e[0])
+    has_idf = any(idf is not None for _, idf, _, _ in entries)
+
+    header: Dict[str, Any] = dict.fromkeys(_HEADER_FIELDS, 0)
+    header.update(magic=_MAGIC,
+                  version=_FORMAT_VERSION,
+                  little_endian=int(sys.byteorder == 'little'),
+                  flags=_FLAG_IDF if has_idf else 0,
+                  documents=len(doc_blobs),
+                  words=len(entries),
+                  postings=sum(len(e[2]) for e in entries))
+
+    with Path(path).open('wb') as out:
+        out.write(b'\0' * _HEADER.size)
+        header['doc_offsets'] = _write_array(
+            out, 'Q', _offsets(len(b) for b in doc_blobs))
+        header['doc_blob'] = _write_bytes(out, b''.join(doc_blobs))
+        header['word_offsets'] = _write_array(
+            out, 'Q', _offsets(len(e[0]) for e in entries))
+        header['word_blob'] = _write_bytes(
+            out, b''.join(e[0] for e in entries))
+        if has_idf:
+            header['idfs'] = _write_array(
+                out, 'd', (e[1] for e in entries))
+        header['post_offsets'] = _write_array(
+            out, 'Q', _offsets(len(e[2]) for e in entries))
+        header['ordinals'] = _write_array(
+            out, 'I', (o for e in entries for o in e[2]))
+        header['impacts'] = _write_array(
+            out, 'd', (i for e in entries for i in e[3]))
+        out.seek(0)
+        out.write(_HEADER.pack(*(header[f] for f in _HEADER_FIELDS)))
+
+
+def _load(path: Union[str, Path], use_mmap: bool,
+          make_postings: Callable[..., Any]) \
+        -> Tuple[Sequence, Mapping, Optional[Mapping]]:
+    """Opens the database written by `_save`. Returns (doc_ids,
+    word_to_postings, word_to_idf). The postings are created by
+    `make_postings(ordinals, impacts)`."""
+    with Path(path).open('rb') as file:
+        if use_mmap:
+            buffer: Any = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = file.read()
+    view = memoryview(buffer)
+
+    if len(view) < _HEADER.size:
+        raise ValueError(f"Not a database file: {path}")
+    header = dict(zip(_HEADER_FIELDS, _HEADER.unpack(view[:_HEADER.size])))
+    if header['magic'] != _MAGIC:
+        raise ValueError(f"Not a database file: {path}")
+    if header['version'] != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {header['version']} "
+                         f"in {path}")
+    if header['little_endian'] != int(sys.byteorder == 'little'):
+        raise ValueError(f"The file was saved on a machine with different "
+                         f"byte order: {path}")
+
+    def section(name: str, typecode: Any, count: int) -> memoryview:
+        start = header[name]
+        return view[start:start + count * struct.calcsize(typecode)] \
+            .cast(typecode)
+
+    def blob(name: str, offsets: memoryview) -> memoryview:
+        start = header[name]
+        return view[start:start + offsets[-1]]
+
+    documents, words_count = header['documents'], header['words']
+    doc_offsets = section('doc_offsets', 'Q', documents + 1)
+    doc_ids = _MappedStrings(doc_offsets, blob('doc_blob', doc_offsets))
+    word_offsets = section('word_offsets', 'Q', words_count + 1)
+    words = _MappedWords(word_offsets, blob('word_blob', word_offsets))
+
+    post_offsets = section('post_offsets', 'Q', words_count + 1)
+    ordinals = section('ordinals', 'I', header['postings'])
+    impacts = section('impacts', 'd', header['postings'])
+
+    def postings(index: int) -> Any:
+        start, end = post_offsets[index], post_offsets[index + 1]
+        return make_postings(ordinals[start:end], impacts[start:end])
+
+    word_to_idf: Optional[Mapping] = None
+    if header['flags'] & _FLAG_IDF:
+        idfs = section('idfs', 'd', words_count)
+        word_to_idf = _MappedFile(words, idfs.__getitem__)
+
+    return doc_ids, _MappedFile(words, postings), word_to_idf
@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import heapq
+from typing import Any, Generic, List, Optional, Tuple, TypeVar, Iterator, \
+    Callable, Dict
+
+TItem = TypeVar('TItem')
+
+# The bounds are sums of the same numbers as the scores, but in another
+# order. So they may differ from the scores in the last digits
+_ROUNDING = 1e-9
+
+
+class _TopK(Generic[TItem]):
+    """Keeps the `limit` items with the largest keys pushed so far.
+
+    The keys must be unique (we always end them with the `doc_id`), so the
+    items themselves are never compared. When `limit` is `None`, all the
+    items are kept, and the object works like a list sorted at the end.
+
+    When `below` is set, only the keys less than it are kept. It is the key
+    of the last item of the previous page.
+    """
+
+    def __init__(self, limit: Optional[int], below: Optional[Any] = None):
+        if limit is not None and limit < 0:
+            raise ValueError(f"Negative limit: {limit}")
+        self.limit = limit
+        self.below = below
+        self._heap: List[Tuple[Any, TItem]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def is_full(self) -> bool:
+        return self.limit is not None and len(self._heap) >= self.limit
+
+    @property
+    def threshold(self) -> Optional[Any]:
+        """The smallest key that is still in the top, or `None` if the top
+        is not full yet. A new item can only get into the top if its key is
+        greater than this."""
+        if not self.is_full or not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def accepts(self, key: Any) -> bool:
+        if self.limit == 0:
+            return False
+        threshold = self.threshold
+        return threshold is None or key > threshold
+
+    def push(self, key: Any, item: TItem) -> None:
+        if self.below is not None and key >= self.below:
+            return
+        if self.limit is None:
+            self._heap.append((key, item))
+        elif len(self._heap) < self.limit:
+            heapq.heappush(self._heap, (key, item))
+        elif self.limit > 0 and key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (key, item))
+
+    def sorted_items(self) -> List[TItem]:
+        """Returns the items with the largest keys first."""
+        return [item for _, item in self.sorted_entries()]
+
+    def sorted_entries(self) -> List[Tuple[Any, TItem]]:
+        """Returns the (key, item) pairs with the largest keys first."""
+        return sorted(self._heap, reverse=True)
+
+    def iter_sorted_entries(self, first_chunk: int = 16) \
+            -> Iterator[Tuple[Any, TItem]]:
+        """Yields the (key, item) pairs with the largest keys first.
+
+        The entries are not sorted at once. Each next chunk of them is
+        selected by a partial heap sort, and the chunks grow twice. So the
+        first items are ready in linear time, and the total time is
+        O(n log n) only if all the items are consumed."""
+        entries = self._heap
+        chunk = first_chunk
+        while entries:
+            top = heapq.nlargest(chunk, entries)
+            yield from top
+            if len(top) < chunk:
+                return
+            lowest = top[-1][0]
+            entries = [entry for entry in entries if entry[0] < lowest]
+            chunk *= 2
+
+
+def _drop_hopeless(candidates: Dict[int, TItem],
+                   score: Callable[[TItem], float],
+                   remaining: float,
+                   limit: Optional[int],
+                   min_score: Optional[float]) -> None:
+    """Removes the candidates that cannot get into the top of `limit`, or
+    reach the `min_score`, even if the rest of the query adds `remaining`
+    to their scores. The scores only grow, so the lowest score in the top
+    of the candidates is a lower bound of the final one."""
+    lowest = min_score
+    if limit is not None and 0 < limit < len(candidates):
+        lowest_in_top = heapq.nlargest(
+            limit, map(score, candidates.values()))[-1]
+        if lowest is None or lowest_in_top > lowest:
+            lowest = lowest_in_top
+    if lowest is None:
+        return
+    threshold = lowest - remaining - _ROUNDING
+    hopeless = [ordinal for ordinal, candidate in candidates.items()
+                if score(candidate) < threshold]
+    for ordinal in hopeless:
+        del candidates[ordinal]
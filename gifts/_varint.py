@@ -0,0 +1,44 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from typing import Iterable, List, Union
+
+
+def _encode_deltas(values: Iterable[int], previous: int = 0) -> bytearray:
+    """Encodes the ascending non-negative ints as the differences between
+    the neighbours, each as a varint: 7 bits per byte, with the high bit set
+    in all the bytes but the last. The small differences take a byte.
+    The first value is encoded as the difference from `previous`."""
+    result = bytearray()
+    for value in values:
+        delta = value - previous
+        assert delta >= 0
+        previous = value
+        while delta >= 0x80:
+            result.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        result.append(delta)
+    return result
+
+
+def _decode_deltas(data: Union[bytes, bytearray], start: int = 0,
+                   end: int = -1, previous: int = 0) -> List[int]:
+    """Decodes the values encoded by `_encode_deltas` from `data[start:end]`.
+    """
+    if end < 0:
+        end = len(data)
+    result: List[int] = []
+    value = previous
+    delta = 0
+    shift = 0
+    for i in range(start, end):
+        byte = data[i]
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            value += delta
+            result.append(value)
+            delta = 0
+            shift = 0
+    return result
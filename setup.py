@@ -23,6 +23,7 @@ setup(
 
     python_requires='>=3.7',  # 3.7 needed for dataclasses
     install_requires=[],
+    extras_require={'numpy': ['numpy']},
     packages=['gifts'],
 
     description="",
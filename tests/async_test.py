@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from gifts import AsyncFts, SmoothFts, SimpleFts, SearchStopped
+from gifts._stop import _stoppable, _check_stopped
+
+
+class _SlowFts:
+    """Searches until stopped, checking for the stop like the real
+    databases do between the words of the query."""
+
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.active = 0
+        self.max_active = 0
+        self.overlapped_write = False
+
+    def search(self, query, **_):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            for _ in range(500):
+                _check_stopped()
+                time.sleep(0.01)
+            return ['never']
+        except SearchStopped:
+            self.stopped.set()
+            raise
+        finally:
+            self.active -= 1
+
+    def add(self, words, doc_id=None):
+        if self.active:
+            self.overlapped_write = True
+        return doc_id
+
+
+class AsyncFtsTest(unittest.TestCase):
+    def test_same_results(self):
+        async def run(fts):
+            async with AsyncFts(fts) as async_fts:
+                await async_fts.add(['a', 'b'], doc_id='1')
+                await async_fts.add_many([('2', ['b', 'c']), ('3', ['c'])])
+                await async_fts.remove('3')
+                return await asyncio.gather(
+                    async_fts.search(['b']),
+                    async_fts.search_scored(['b', 'c'], limit=1),
+                    async_fts.search_many([['a'], ['c']]))
+
+        for fts_type in [SmoothFts, SimpleFts]:
+            sync_fts = fts_type()
+            sync_fts.add(['a', 'b'], doc_id='1')
+            sync_fts.add_many([('2', ['b', 'c'])])
+            self.assertEqual(
+                asyncio.run(run(fts_type())),
+                [sync_fts.search(['b']),
+                 sync_fts.search_scored(['b', 'c'], limit=1),
+                 sync_fts.search_many([['a'], ['c']])])
+
+    def test_timeout_stops_search(self):
+        slow = _SlowFts()
+
+        async def run():
+            async with AsyncFts(slow) as async_fts:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await async_fts.search(['a'], timeout=0.05)
+
+        started = time.monotonic()
+        asyncio.run(run())
+        self.assertTrue(slow.stopped.is_set())
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_cancel_stops_search(self):
+        slow = _SlowFts()
+
+        async def run():
+            async with AsyncFts(slow) as async_fts:
+                task = asyncio.ensure_future(async_fts.search(['a']))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(run())
+        self.assertTrue(slow.stopped.is_set())
+
+    def test_writes_are_exclusive(self):
+        slow = _SlowFts()
+
+        async def run():
+            async with AsyncFts(slow, max_concurrency=4,
+                                timeout=0.1) as async_fts:
+                searches = [asyncio.ensure_future(async_fts.search(['a']))
+                            for _ in range(3)]
+                await asyncio.sleep(0.03)
+                await async_fts.add(['a'], doc_id='1')
+                for search in searches:
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await search
+
+        asyncio.run(run())
+        self.assertEqual(slow.max_active, 3)
+        self.assertFalse(slow.overlapped_write)
+
+    def test_stoppable_search(self):
+        fts = SmoothFts()
+        fts.add(['a', 'b'])
+        stop = threading.Event()
+        with _stoppable(stop):
+            self.assertEqual(len(fts.search(['a'])), 1)
+            stop.set()
+            with self.assertRaises(SearchStopped):
+                fts.search(['a'])
+        self.assertEqual(len(fts.search(['a'])), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import random
+import unittest
+
+from gifts import SmoothFts, SimpleFts, ShardedFts, Range
+from gifts._bitmap import _Bitmap, _union
+
+
+class BitmapTest(unittest.TestCase):
+    def test_set_operations(self):
+        rnd = random.Random(1)
+        for _ in range(40):
+            # the sparse, the dense and the mixed chunks
+            universe = rnd.choice([100, 70000, 200000])
+            sets = [set(rnd.sample(range(universe),
+                                   min(universe, rnd.choice(
+                                       [0, 5, 3000, 5000, 60000]))))
+                    for _ in range(3)]
+            shuffled = [list(values) for values in sets]
+            for values in shuffled:
+                rnd.shuffle(values)
+            bitmaps = [_Bitmap(values) for values in shuffled]
+            for values, bitmap in zip(sets, bitmaps):
+                self.assertEqual(list(bitmap), sorted(values))
+                self.assertEqual(len(bitmap), len(values))
+                for ordinal in rnd.sample(range(universe), 20):
+                    self.assertEqual(ordinal in bitmap, ordinal in values)
+            self.assertEqual(list(bitmaps[0] & bitmaps[1]),
+                             sorted(sets[0] & sets[1]))
+            self.assertEqual(list(bitmaps[0] | bitmaps[1]),
+                             sorted(sets[0] | sets[1]))
+            union = _union(bitmaps)
+            self.assertEqual(list(union), sorted(set.union(*sets)))
+            self.assertEqual(len(union), len(set.union(*sets)))
+
+    def test_compact(self):
+        bitmap = _Bitmap(range(0, 100000, 3))
+        self.assertLess(bitmap.nbytes, 100000 // 3 * 2)
+        new_ordinals = [-1 if i % 2 else i // 2 for i in range(100000)]
+        self.assertEqual(list(bitmap.compacted(new_ordinals)),
+                         [i // 2 for i in range(0, 100000, 6)])
+
+
+def _random_docs(seed: int, count: int):
+    rnd = random.Random(seed)
+    docs = []
+    for i in range(count):
+        attributes = {'tenant': rnd.choice(['a', 'b', 'c']),
+                      'day': rnd.randint(1, 30)}
+        if rnd.random() < 0.5:
+            attributes['tags'] = set(rnd.sample(['x', 'y', 'z'],
+                                                rnd.randint(1, 2)))
+        docs.append((f"doc{i}",
+                     [rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                     attributes))
+    return docs
+
+
+def _matches(attributes, where) -> bool:
+    for name, condition in where.items():
+        value = attributes.get(name)
+        values = value if isinstance(value, set) else {value}
+        if isinstance(condition, Range):
+            if not any(v is not None and v in condition for v in values):
+                return False
+        elif isinstance(condition, (list, set)):
+            if not values & set(condition):
+                return False
+        elif condition not in values:
+            return False
+    return True
+
+
+_WHERES = [{'tenant': 'a'}, {'tenant': ['a', 'c']}, {'day': Range(5, 12)},
+           {'day': Range(low=25)}, {'tenant': 'b', 'day': Range(high=10)},
+           {'tags': 'x'}, {'tags': {'y', 'z'}, 'tenant': 'c'},
+           {'tenant': 'unknown'}, {'unknown': 1}]
+
+
+class AttributesTest(unittest.TestCase):
+    def _check(self, fts, docs, seed: int):
+        doc_to_attributes = dict((doc_id, attributes)
+                                 for doc_id, _, attributes in docs)
+        rnd = random.Random(seed)
+        for _ in range(15):
+            query = [rnd.randint(1, 42) for _ in range(rnd.randint(1, 4))]
+            full = fts.search_scored(query)
+            for where in _WHERES:
+                expected = [match for match in full
+                            if _matches(doc_to_attributes[match.doc_id],
+                                        where)]
+                self.assertEqual(fts.search_scored(query, where=where),
+                                 expected)
+                self.assertEqual(fts.search(query, limit=3, where=where),
+                                 [match.doc_id for match in expected[:3]])
+                self.assertEqual(
+                    fts.search_many([query], limit=3, where=where),
+                    [[match.doc_id for match in expected[:3]]])
+                required = query[:1]
+                self.assertEqual(
+                    fts.search(query, where=where, required=required),
+                    [match.doc_id for match in expected
+                     if match.doc_id in set(fts.search(required))])
+
+    def test_search(self):
+        for fts_type, options in [(SmoothFts, dict(use_numpy=False)),
+                                  (SmoothFts, {}),
+                                  (SimpleFts, {}),
+                                  (SimpleFts, dict(cache_size=100))]:
+            docs = _random_docs(1, 400)
+            fts = fts_type(**options)
+            fts.add_many(docs[:200])
+            for doc_id, words, attributes in docs[200:]:
+                fts.add(words, doc_id=doc_id, attributes=attributes)
+            self._check(fts, docs, seed=2)
+            # the removed and the updated documents
+            for doc_id, words, attributes in docs[::5]:
+                fts.remove(doc_id)
+            for i in range(1, 400, 5):
+                doc_id, words, _ = docs[i]
+                docs[i] = (doc_id, words, {'tenant': 'c', 'day': 1})
+                fts.update(doc_id, words, attributes=docs[i][2])
+            docs = [doc for i, doc in enumerate(docs) if i % 5]
+            self._check(fts, docs, seed=3)
+            fts.compact()
+            self._check(fts, docs, seed=4)
+
+    def test_page_and_iter(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            docs = _random_docs(5, 100)
+            fts = fts_type()
+            fts.add_many(docs)
+            where = {'tenant': 'a'}
+            expected = fts.search_scored([1, 2, 3], where=where)
+            self.assertEqual(list(fts.search_iter([1, 2, 3], where=where)),
+                             expected)
+            page = fts.search_page([1, 2, 3], page_size=2, where=where)
+            self.assertEqual(page.matches, expected[:2])
+
+    def test_sharded(self):
+        docs = _random_docs(6, 200)
+        single = SmoothFts()
+        single.add_many(docs)
+        with ShardedFts(SmoothFts, shards=2) as sharded:
+            sharded.add_many(docs[1:])
+            sharded.add(docs[0][1], doc_id=docs[0][0],
+                        attributes=docs[0][2])
+            for where in _WHERES:
+                self.assertEqual(sharded.search([1, 2, 3], where=where),
+                                 single.search([1, 2, 3], where=where))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import bench
+
+
+class BenchTest(unittest.TestCase):
+    def test_corpus_is_reproducible(self):
+        config = bench.Config(docs=50, vocabulary=100, doc_length=10)
+        self.assertEqual(bench.corpus(config), bench.corpus(config))
+        self.assertNotEqual(bench.corpus(config),
+                            bench.corpus(config._replace(seed=1)))
+        self.assertEqual(len(bench.queries(config)), config.queries)
+
+    def test_measure(self):
+        config = bench.Config(docs=100, vocabulary=200, doc_length=10,
+                              queries=20, limits=(5,))
+        result = bench.measure('frozen-simple', config)
+        self.assertEqual(result['docs'], 100)
+        self.assertGreater(result['build_seconds'], 0)
+        [search] = result['searches']
+        self.assertEqual(search['limit'], 5)
+        self.assertLessEqual(search['p50_ms'], search['p99_ms'])
+
+    def test_memory_of_shards(self):
+        config = bench.Config(docs=100, vocabulary=200, doc_length=10,
+                              queries=5, limits=(5,))
+        result = bench.measure('sharded-smooth', config)
+        if bench.resource is not None:
+            # the index is in the processes of the shards
+            self.assertGreater(result['peak_memory_mb'], 0)
+
+    def test_engines_built_by_add(self):
+        docs = bench.corpus(bench.Config(docs=50, vocabulary=100,
+                                         doc_length=10))
+        for engine in ['smooth', 'simple']:
+            by_add = bench.ENGINES[engine + '-add'](docs)
+            by_add_many = bench.ENGINES[engine](docs)
+            self.assertEqual(by_add.search([1, 2, 3]),
+                             by_add_many.search([1, 2, 3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
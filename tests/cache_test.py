@@ -0,0 +1,145 @@
+import random
+import unittest
+
+from gifts import SmoothFts, SimpleFts, CacheStats
+from gifts._cache import _ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_lru(self):
+        cache = _ResultCache(2, None)
+        cache.put('a', 1, [(1, 1)])
+        cache.put('b', 1, [(2, 2)])
+        self.assertEqual(cache.get('a', 1), [(1, 1)])
+        cache.put('c', 1, [(3, 3)])  # evicts 'b'
+        self.assertIsNone(cache.get('b', 1))
+        self.assertEqual(cache.get('a', 1), [(1, 1)])
+        self.assertEqual(cache.get('c', 1), [(3, 3)])
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.misses, stats.entries),
+                         (3, 1, 2))
+
+    def test_stale(self):
+        cache = _ResultCache(2, None)
+        cache.put('a', 1, [])
+        self.assertIsNone(cache.get('a', 2))
+        self.assertEqual(cache.get('a', 1), [])
+
+    def test_bytes(self):
+        cache = _ResultCache(100, 1000)
+        result = [(i, i) for i in range(5)]
+        for key in range(10):
+            cache.put(key, 1, result)
+        self.assertLessEqual(cache.stats.bytes, 1000)
+        self.assertLess(cache.stats.entries, 10)
+        self.assertEqual(cache.get(9, 1), result)
+        # not cached at all, since larger than the whole cache
+        cache.put('big', 1, [(i, i) for i in range(1000)])
+        self.assertIsNone(cache.get('big', 1))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            _ResultCache(0, None)
+        with self.assertRaises(ValueError):
+            _ResultCache(1, 0)
+
+
+class _Wrapper:
+    class TestFtsCache(unittest.TestCase):
+        def createFts(self, **options):
+            raise NotImplementedError
+
+        def test_disabled(self):
+            self.assertIsNone(self.createFts().cache_stats)
+
+        def test_same_results(self):
+            rnd = random.Random(7)
+            cached = self.createFts(cache_size=20)
+            uncached = self.createFts()
+            queries = [[rnd.randint(1, 45) for _ in range(rnd.randint(1, 4))]
+                       for _ in range(15)]
+            ids = []
+            for step in range(400):
+                if ids and rnd.random() < 0.3:
+                    doc_id = ids.pop(rnd.randrange(len(ids)))
+                    for fts in (cached, uncached):
+                        fts.remove(doc_id)
+                else:
+                    words = [rnd.randint(1, 40)
+                             for _ in range(rnd.randint(1, 8))]
+                    ids.append(f"doc{step}")
+                    for fts in (cached, uncached):
+                        fts.add(words, doc_id=f"doc{step}")
+                if step % 20 == 0:
+                    for query in queries:
+                        for fts_query in (query, list(reversed(query))):
+                            self.assertEqual(
+                                cached.search_scored(fts_query, limit=5),
+                                uncached.search_scored(fts_query, limit=5))
+                            self.assertEqual(cached.search(fts_query),
+                                             uncached.search(fts_query))
+                    self.assertEqual(cached.search_many(queries),
+                                     uncached.search_many(queries))
+            self.assertGreater(cached.cache_stats.hits, 0)
+            self.assertLessEqual(cached.cache_stats.entries, 20)
+
+        def test_invalidation(self):
+            fts = self.createFts(cache_size=10)
+            fts.add(['a', 'b'], doc_id='1')
+            fts.add(['b', 'c'], doc_id='2')
+            fts.add(['d'], doc_id='3')
+            self.assertEqual(fts.search(['a']), ['1'])
+            self.assertEqual(fts.search(['a']), ['1'])
+            self.assertEqual(fts.cache_stats,
+                             CacheStats(hits=1, misses=1, entries=1,
+                                        bytes=fts.cache_stats.bytes))
+
+            fts.add(['a'], doc_id='4')
+            self.assertEqual(set(fts.search(['a'])), {'1', '4'})
+            self.assertEqual(fts.cache_stats.misses, 2)
+
+            fts.remove('1')
+            self.assertEqual(fts.search(['a']), ['4'])
+            self.assertEqual(fts.cache_stats.misses, 3)
+
+            fts.compact()
+            self.assertEqual(fts.search_scored(['a'])[0].doc_id, '4')
+
+
+class TestSmooth(_Wrapper.TestFtsCache):
+    def createFts(self, **options):
+        return SmoothFts(**options)
+
+    def test_unrelated_changes(self):
+        # the IDF is not refreshed after each change, so the documents
+        # without the query words do not change the results
+        fts = SmoothFts(cache_size=10, idf_refresh_ratio=1.0)
+        for i in range(10):
+            fts.add(['a', str(i)], doc_id=str(i))
+        fts.search(['a', '1'])
+        fts.add(['x', 'y'], doc_id='x')
+        fts.search(['a', '1'])
+        self.assertEqual(fts.cache_stats.hits, 1)
+        fts.refresh()
+        fts.search(['a', '1'])
+        self.assertEqual(fts.cache_stats.hits, 1)
+
+
+class TestSimple(_Wrapper.TestFtsCache):
+    def createFts(self, **options):
+        return SimpleFts(**options)
+
+    def test_unrelated_changes(self):
+        fts = SimpleFts(cache_size=10)
+        for i in range(10):
+            fts.add(['a', str(i)], doc_id=str(i))
+        fts.search(['a', '1'])
+        fts.add(['x', 'y'], doc_id='x')
+        fts.search(['a', '1'])
+        self.assertEqual(fts.cache_stats.hits, 1)
+        fts.search(['a', '1'], prioritize_number_of_words_matched=True)
+        self.assertEqual(fts.cache_stats.hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
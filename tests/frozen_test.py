@@ -0,0 +1,83 @@
+import random
+import unittest
+
+from gifts import SmoothFts, SimpleFts, FrozenFts
+
+
+def _random_fts(fts, seed: int):
+    rnd = random.Random(seed)
+    for i in range(300):
+        fts.add([rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                doc_id=f"doc{i}")
+    return fts
+
+
+def _random_queries(seed: int):
+    rnd = random.Random(seed)
+    for _ in range(30):
+        # unique words, so the weights of the query are the same
+        yield rnd.sample(range(1, 45), rnd.randint(1, 5))
+
+
+class FrozenTest(unittest.TestCase):
+    def assertSameResults(self, fts):
+        frozen = fts.freeze()
+        self.assertIsInstance(frozen, FrozenFts)
+        self.assertEqual(frozen.documents_count, fts.documents_count)
+        for query in _random_queries(5):
+            full = fts.search(query)
+            self.assertEqual(frozen.search(query), full)
+            for limit in [0, 1, 3, 10, 1000]:
+                self.assertEqual(frozen.search(query, limit=limit),
+                                 full[:limit])
+
+    def test_smooth(self):
+        self.assertSameResults(_random_fts(SmoothFts(), 4))
+
+    def test_simple(self):
+        self.assertSameResults(_random_fts(SimpleFts(), 4))
+
+    def test_simple_scores_of_two_words(self):
+        # the sums of two weights do not depend on the order
+        fts = _random_fts(SimpleFts(), 8)
+        frozen = fts.freeze()
+        rnd = random.Random(9)
+        for _ in range(50):
+            # the repeated words have greater weights in the query
+            query = [rnd.randint(1, 45)] * rnd.randint(1, 3) \
+                + [rnd.randint(1, 45)] * rnd.randint(0, 3)
+            self.assertEqual(
+                frozen.ranked(query),
+                [(match.score, match.doc_id)
+                 for match in fts.search_scored(query)])
+
+    def test_postings_are_impact_ordered(self):
+        frozen = _random_fts(SmoothFts(), 6).freeze()
+        for postings in frozen._word_to_postings.values():
+            self.assertEqual(list(postings.impacts),
+                             sorted(postings.impacts, reverse=True))
+
+    def test_frozen_copy_is_independent(self):
+        fts = SmoothFts()
+        fts.add(['a', 'b'], doc_id='1')
+        frozen = fts.freeze()
+        fts.add(['a', 'c'], doc_id='2')
+        self.assertEqual(frozen.search(['a']), ['1'])
+        self.assertEqual(frozen.search(['c']), [])
+
+    def test_limit_keeps_tie_with_lowest_in_top(self):
+        # 'a' is walked first and fills the top. The document of 'b' has
+        # the same score, and only its ID gets it into the top
+        for a_id, b_id in [('1', '2'), ('2', '1')]:
+            fts = SimpleFts()
+            fts.add(['a'], doc_id=a_id)
+            fts.add(['b'], doc_id=b_id)
+            full = fts.search(['a', 'b'])
+            self.assertEqual(len(full), 2)
+            self.assertEqual(fts.freeze().search(['a', 'b'], limit=1),
+                             full[:1])
+
+    def test_empty_query(self):
+        frozen = _random_fts(SimpleFts(), 7).freeze()
+        with self.assertRaises(ValueError):
+            frozen.search([])
@@ -1,6 +1,7 @@
 # SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
 # SPDX-License-Identifier: MIT
 
+import random
 import re
 import unittest
 from typing import List
@@ -204,6 +205,272 @@ class _Wrapper:
             ids.add(fts.add(['f', 'g']))
             self.assertEqual(len(ids), 3)
 
+        def test_limit(self):
+            fts = self.createFts()
+            rnd = random.Random(1)
+            for i in range(300):
+                fts.add([rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                        doc_id=f"doc{i}")
+            for _ in range(30):
+                query = [rnd.randint(1, 45) for _ in range(rnd.randint(1, 5))]
+                full = fts.search(query)
+                for limit in [0, 1, 3, 10, 1000]:
+                    self.assertEqual(fts.search(query, limit=limit),
+                                     full[:limit])
+
+        def test_negative_limit(self):
+            fts = self.createFts()
+            fts.add(['a', 'b'])
+            with self.assertRaises(ValueError):
+                fts.search(['a'], limit=-1)
+
+        def test_remove(self):
+            fts = self.createFts()
+            fts.add(['a', 'b'], doc_id='1')
+            fts.add(['a', 'c'], doc_id='2')
+            fts.add(['c', 'd'], doc_id='3')
+            fts.remove('2')
+            self.assertEqual(fts.search(['a']), ['1'])
+            self.assertEqual(fts.search(['c']), ['3'])
+            self.assertEqual(fts.documents_count, 2)
+            with self.assertRaises(KeyError):
+                fts.remove('2')
+            # the id can be used again
+            fts.add(['e'], doc_id='2')
+            self.assertEqual(fts.search(['e', 'a']), ['2', '1'])
+
+        def test_update(self):
+            fts = self.createFts()
+            fts.add(['a', 'b'], doc_id='1')
+            fts.add(['c'], doc_id='2')
+            fts.update('1', ['c', 'd'])
+            self.assertEqual(fts.search(['a']), [])
+            self.assertEqual(sorted(fts.search(['c'])), ['1', '2'])
+            with self.assertRaises(KeyError):
+                fts.update('3', ['a'])
+
+        def test_removal_is_same_as_not_adding(self):
+            rnd = random.Random(8)
+            docs = dict((f"doc{i}", [rnd.randint(1, 30)
+                                     for _ in range(rnd.randint(1, 8))])
+                        for i in range(200))
+            fts = self.createFts()
+            for doc_id, words in docs.items():
+                fts.add(words, doc_id=doc_id)
+            for doc_id in rnd.sample(sorted(docs), 50):
+                fts.remove(doc_id)
+                del docs[doc_id]
+            for doc_id in rnd.sample(sorted(docs), 20):
+                fts.remove(doc_id)
+                docs[doc_id] = docs.pop(doc_id)[::-1] + [31]
+                fts.add(docs[doc_id], doc_id=doc_id)
+
+            expected = self.createFts()
+            for doc_id, words in docs.items():
+                expected.add(words, doc_id=doc_id)
+
+            queries = [[rnd.randint(1, 32) for _ in range(rnd.randint(1, 4))]
+                       for _ in range(30)]
+            for query in queries:
+                self.assertEqual(sorted(fts.search(query)),
+                                 sorted(expected.search(query)))
+            fts.compact()
+            self.assertEqual(fts._ids.tombstones_ratio, 0)
+            for query in queries:
+                self.assertEqual(fts.search(query), expected.search(query))
+
+        def test_automatic_compaction(self):
+            fts = self.createFts()
+            for i in range(10):
+                fts.add(['a', str(i)], doc_id=str(i))
+            for i in range(5):
+                fts.remove(str(i))
+            self.assertEqual(fts._ids.tombstones_ratio, 0.5)
+            fts.remove('5')
+            self.assertEqual(fts._ids.tombstones_ratio, 0)
+            self.assertEqual(sorted(fts.search(['a'])), ['6', '7', '8', '9'])
+            self.assertEqual(len(fts._word_to_docs['a']), 4)
+
+        def test_add_many(self):
+            rnd = random.Random(9)
+            docs = [(f"doc{i}", [rnd.randint(1, 30)
+                                 for _ in range(rnd.randint(1, 8))])
+                    for i in range(300)]
+            one_by_one = self.createFts()
+            for doc_id, words in docs:
+                one_by_one.add(words, doc_id=doc_id)
+
+            bulk = self.createFts()
+            report = bulk.add_many(((doc_id, iter(words))
+                                    for doc_id, words in docs))
+            self.assertEqual(report.documents, 300)
+            self.assertGreater(report.documents_per_second, 0)
+            self.assertEqual(bulk.documents_count, 300)
+
+            for _ in range(30):
+                query = [rnd.randint(1, 32) for _ in range(rnd.randint(1, 4))]
+                self.assertEqual(bulk.search(query), one_by_one.search(query))
+
+        def test_add_many_without_ids(self):
+            fts = self.createFts()
+            fts.add_many([(None, ['a']), (None, ['a', 'b'])])
+            self.assertEqual(len(fts.search(['a'])), 2)
+
+        def test_add_many_not_unique_id(self):
+            fts = self.createFts()
+            with self.assertRaises(ValueError):
+                fts.add_many([('1', ['a']), ('2', ['a', 'b']), ('1', ['c'])])
+            # the documents before the error are added
+            self.assertEqual(fts.search(['a']), ['1', '2'])
+            self.assertEqual(fts.search(['c']), [])
+
+        def test_search_many(self):
+            fts = self.createFts()
+            rnd = random.Random(2)
+            for i in range(300):
+                fts.add([rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                        doc_id=f"doc{i}")
+            fts.remove('doc5')
+            queries = [[rnd.randint(1, 45) for _ in range(rnd.randint(1, 5))]
+                       for _ in range(30)]
+            for limit in [None, 0, 1, 3, 1000]:
+                self.assertEqual(
+                    fts.search_many(queries, limit=limit),
+                    [fts.search(query, limit=limit) for query in queries])
+
+        def test_search_scored(self):
+            fts = self.createFts()
+            rnd = random.Random(3)
+            doc_to_words = {}
+            for i in range(300):
+                words = [rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))]
+                doc_to_words[f"doc{i}"] = set(words)
+                fts.add(words, doc_id=f"doc{i}")
+            for _ in range(30):
+                query = [rnd.randint(1, 45) for _ in range(rnd.randint(1, 5))]
+                scored = fts.search_scored(query)
+                self.assertEqual([m.doc_id for m in scored],
+                                 fts.search(query))
+                scores = [m.score for m in scored]
+                self.assertEqual(scores, sorted(scores, reverse=True))
+                for match in scored:
+                    self.assertGreater(match.score, 0)
+                    self.assertEqual(
+                        match.words_matched,
+                        len(doc_to_words[match.doc_id] & set(query)))
+
+        def test_min_score(self):
+            fts = self.createFts()
+            rnd = random.Random(4)
+            for i in range(300):
+                fts.add([rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                        doc_id=f"doc{i}")
+            for _ in range(30):
+                query = [rnd.randint(1, 45) for _ in range(rnd.randint(1, 5))]
+                scored = fts.search_scored(query)
+                if not scored:
+                    continue
+                for min_score in [0.0, scored[len(scored) // 2].score,
+                                  scored[0].score, scored[0].score * 2]:
+                    expected = [m for m in scored if m.score >= min_score]
+                    for limit in [None, 0, 1, 3, 1000]:
+                        self.assertEqual(
+                            fts.search_scored(query, limit=limit,
+                                              min_score=min_score),
+                            expected[:limit])
+                        self.assertEqual(
+                            fts.search(query, limit=limit,
+                                       min_score=min_score),
+                            [m.doc_id for m in expected[:limit]])
+
+        def _random_fts(self, seed: int):
+            fts = self.createFts()
+            rnd = random.Random(seed)
+            for i in range(300):
+                fts.add([rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                        doc_id=f"doc{i}")
+            queries = [[rnd.randint(1, 45) for _ in range(rnd.randint(1, 5))]
+                       for _ in range(30)]
+            return fts, queries
+
+        def test_search_iter(self):
+            fts, queries = self._random_fts(5)
+            for query in queries:
+                self.assertEqual(list(fts.search_iter(query)),
+                                 fts.search_scored(query))
+                self.assertEqual(list(fts.search_iter(query, min_score=0.1)),
+                                 fts.search_scored(query, min_score=0.1))
+                iterator = fts.search_iter(query)
+                self.assertEqual([next(iterator, None) for _ in range(3)],
+                                 (fts.search_scored(query, limit=3)
+                                  + [None] * 3)[:3])
+
+        def test_search_page(self):
+            fts, queries = self._random_fts(6)
+            for query in queries:
+                expected = fts.search_scored(query)
+                for page_size in [1, 3, 7, 1000]:
+                    matches = []
+                    cursor = None
+                    while True:
+                        page = fts.search_page(query, page_size, cursor)
+                        self.assertLessEqual(len(page.matches), page_size)
+                        matches.extend(page.matches)
+                        if page.next_cursor is None:
+                            break
+                        cursor = page.next_cursor
+                    self.assertEqual(matches, expected)
+
+        def test_search_page_errors(self):
+            fts, _ = self._random_fts(7)
+            with self.assertRaises(ValueError):
+                fts.search_page([1], 0)
+            with self.assertRaises(ValueError):
+                fts.search_page([1], 10, cursor='not a cursor')
+
+        def test_filters(self):
+            fts = self.createFts()
+            rnd = random.Random(8)
+            doc_words = {}
+            for i in range(300):
+                words = [rnd.randint(1, 20) for _ in range(rnd.randint(1, 8))]
+                fts.add(words, doc_id=f"doc{i}")
+                doc_words[f"doc{i}"] = set(words)
+            for i in range(0, 300, 5):
+                fts.remove(f"doc{i}")
+            for _ in range(30):
+                query = [rnd.randint(1, 22) for _ in range(rnd.randint(1, 4))]
+                required = [rnd.randint(1, 22)
+                            for _ in range(rnd.randint(0, 2))]
+                excluded = [rnd.randint(1, 22)
+                            for _ in range(rnd.randint(0, 2))]
+                for match_all in [False, True]:
+                    must_have = set(required) | (set(query) if match_all
+                                                 else set())
+                    expected = [
+                        match for match in fts.search_scored(query)
+                        if must_have <= doc_words[match.doc_id]
+                        and not set(excluded) & doc_words[match.doc_id]]
+                    options = dict(required=required, excluded=excluded,
+                                   match_all=match_all)
+                    self.assertEqual(fts.search_scored(query, **options),
+                                     expected)
+                    self.assertEqual(
+                        fts.search(query, limit=3, **options),
+                        [match.doc_id for match in expected[:3]])
+                    self.assertEqual(list(fts.search_iter(query, **options)),
+                                     expected)
+                    self.assertEqual(
+                        fts.search_many([query], **options),
+                        [[match.doc_id for match in expected]])
+
+        def test_search_many_empty_query(self):
+            fts = self.createFts()
+            fts.add(['a', 'b'])
+            with self.assertRaises(ValueError):
+                fts.search_many([['a'], []])
+            self.assertEqual(fts.search_many([]), [])
+
 
 class TestSmooth(_Wrapper.TestFtsBase):
     def createFts(self):
@@ -213,3 +480,37 @@ class TestSmooth(_Wrapper.TestFtsBase):
 class TestSimple(_Wrapper.TestFtsBase):
     def createFts(self):
         return SimpleFts()
+
+    def test_limit_prioritizing_number_of_words(self):
+        fts = SimpleFts()
+        rnd = random.Random(2)
+        for i in range(300):
+            fts.add([rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))],
+                    doc_id=f"doc{i}")
+        for _ in range(30):
+            query = [rnd.randint(1, 45) for _ in range(rnd.randint(1, 5))]
+            full = fts.search(query, prioritize_number_of_words_matched=True)
+            for limit in [1, 5, 20]:
+                self.assertEqual(
+                    fts.search(query, prioritize_number_of_words_matched=True,
+                               limit=limit),
+                    full[:limit])
+
+    def test_scores_summed_in_query_order(self):
+        fts = SimpleFts()
+        rnd = random.Random(3)
+        docs = [[rnd.randint(1, 15) for _ in range(rnd.randint(1, 10))]
+                for _ in range(100)]
+        for i, words in enumerate(docs):
+            fts.add(words, doc_id=f"doc{i}")
+        for _ in range(50):
+            query = list(dict.fromkeys(
+                rnd.randint(1, 15) for _ in range(rnd.randint(3, 5))))
+            for match in fts.search_scored(query, limit=5):
+                words = docs[int(match.doc_id[3:])]
+                expected = 0.0
+                for word in query:
+                    if word in words:
+                        expected += (words.count(word) / len(words)
+                                     / len(fts.search([word])))
+                self.assertEqual(match.score, expected)
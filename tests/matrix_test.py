@@ -0,0 +1,84 @@
+import random
+import unittest
+
+from gifts import SmoothFts
+from gifts._matrix import numpy
+from tests.frozen_test import _random_queries
+
+
+def _random_pair(seed: int, **options):
+    """Returns the same database with and without NumPy."""
+    rnd = random.Random(seed)
+    result = (SmoothFts(use_numpy=True, **options),
+              SmoothFts(use_numpy=False, **options))
+    for i in range(300):
+        words = [rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))]
+        for fts in result:
+            fts.add(words, doc_id=f"doc{i}")
+    for i in range(0, 300, 7):
+        for fts in result:
+            fts.remove(f"doc{i}")
+    return result
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class MatrixTest(unittest.TestCase):
+    def assertSameResults(self, with_numpy, without_numpy):
+        queries = list(_random_queries(5))
+        for limit in [None, 0, 1, 3, 1000]:
+            for query in queries:
+                # the second search goes through the matrix
+                for _ in range(2):
+                    self.assertEqual(
+                        with_numpy.search(query, limit=limit),
+                        without_numpy.search(query, limit=limit))
+            self.assertEqual(with_numpy.search_many(queries, limit=limit),
+                             without_numpy.search_many(queries, limit=limit))
+            for query in queries:
+                for min_score in [0.1, 0.5]:
+                    self.assertEqual(
+                        with_numpy.search_scored(query, limit=limit,
+                                                 min_score=min_score),
+                        without_numpy.search_scored(query, limit=limit,
+                                                    min_score=min_score))
+        for query in queries:
+            cursor = without_numpy.search_page(query, 2).next_cursor
+            if cursor is not None:
+                self.assertEqual(with_numpy.search_page(query, 3, cursor),
+                                 without_numpy.search_page(query, 3, cursor))
+        self.assertIsNotNone(with_numpy._matrix)
+        self.assertIsNone(without_numpy._matrix)
+
+    def test_same_results(self):
+        self.assertSameResults(*_random_pair(4))
+
+    def test_same_results_with_stale_idf(self):
+        with_numpy, without_numpy = _random_pair(5, idf_refresh_ratio=0.5)
+        self.assertSameResults(with_numpy, without_numpy)
+
+    def test_rebuilt_after_changes(self):
+        fts = SmoothFts(use_numpy=True)
+        fts.add(['a', 'b'], doc_id='1')
+        fts.add(['a', 'c'], doc_id='2')
+        fts.search(['a'])
+        self.assertIsNone(fts._matrix)
+        self.assertEqual(fts.search(['c']), ['2'])
+        self.assertIsNotNone(fts._matrix)
+
+        fts.add(['c'], doc_id='3')
+        self.assertEqual(fts.search(['c']), ['3', '2'])
+        fts.remove('2')
+        self.assertEqual(fts.search(['c']), ['3'])
+        fts.compact()
+        self.assertEqual(fts.search(['a', 'c']), ['3', '1'])
+        self.assertEqual(fts.search(['a', 'c']), ['3', '1'])
+
+    def test_negative_limit(self):
+        fts, _ = _random_pair(6)
+        fts.search_many([[1, 2], [3]])
+        with self.assertRaises(ValueError):
+            fts.search([1], limit=-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import random
+import unittest
+
+from gifts import SimpleFts
+from gifts._minhash import _MinHashIndex
+
+
+class MinHashIndexTest(unittest.TestCase):
+    def test_candidates(self):
+        index = _MinHashIndex(bands=8, rows=2)
+        index.add(0, ['a', 'b', 'c', 'd'])
+        index.add(1, ['x', 'y', 'z'])
+        index.add(2, [])
+        index.add(3, ['a', 'b', 'c', 'd'])
+        self.assertEqual(index.candidates(['d', 'c', 'b', 'a']), [0, 3])
+        self.assertEqual(index.candidates([]), [])
+        index.compact([0, -1, -1, 1])
+        self.assertEqual(index.candidates(['a', 'b', 'c', 'd']), [0, 1])
+        self.assertEqual(index.candidates(['x', 'y', 'z']), [])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            _MinHashIndex(bands=0, rows=1)
+        with self.assertRaises(ValueError):
+            _MinHashIndex(bands=1, rows=0)
+
+
+class ApproximateSearchTest(unittest.TestCase):
+    def test_similar_sets_are_found(self):
+        rnd = random.Random(1)
+        docs = [(str(i), rnd.sample(range(1000), 20)) for i in range(500)]
+        fts = SimpleFts(minhash_bands=16, minhash_rows=2)
+        fts.add_many(docs)
+        for doc_id, words in docs[:400:7]:
+            fts.remove(doc_id)
+        fts.compact()
+        for doc_id, words in docs[1:400:7]:
+            query = words[:18] + [1001, 1002]
+            exact = fts.search_scored(query)
+            approximate = fts.search_scored(query, approximate=True)
+            self.assertEqual(approximate[0].doc_id, doc_id)
+            self.assertEqual(exact[0], approximate[0])
+            self.assertLess(len(approximate), len(exact))
+            # the scores are exact, some matches are skipped
+            self.assertTrue(set(approximate) <= set(exact))
+            self.assertEqual(fts.search(query, limit=1, approximate=True),
+                             [doc_id])
+            self.assertEqual(
+                fts.search(query, approximate=True, excluded=[words[0]]),
+                [m.doc_id for m in approximate if words[0] not in
+                 dict(docs)[m.doc_id]])
+
+    def test_not_enabled(self):
+        fts = SimpleFts()
+        fts.add(['a'])
+        with self.assertRaises(ValueError):
+            fts.search(['a'], approximate=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
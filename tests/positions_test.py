@@ -0,0 +1,102 @@
+import random
+import unittest
+
+from gifts import SmoothFts, SimpleFts
+from gifts._varint import _encode_deltas, _decode_deltas
+
+
+def _has_phrase(words, phrase):
+    return any(words[i:i + len(phrase)] == phrase
+               for i in range(len(words) - len(phrase) + 1))
+
+
+def _has_near(words, query, distance):
+    needed = set(query)
+    return any(needed <= set(words[start:start + distance + 1])
+               for start in range(len(words)))
+
+
+class VarintTest(unittest.TestCase):
+    def test_round_trip(self):
+        for values in [[], [0], [0, 1, 2], [5, 200, 201, 70000, 2 ** 40]]:
+            data = _encode_deltas(values)
+            self.assertEqual(_decode_deltas(data), values)
+        self.assertEqual(len(_encode_deltas([0, 1, 127, 128])), 4)
+        data = _encode_deltas([1, 2]) + _encode_deltas([300])
+        self.assertEqual(_decode_deltas(data, 2), [300])
+        self.assertEqual(_decode_deltas(data, 0, 2), [1, 2])
+
+
+class _Wrapper:
+    class TestPositions(unittest.TestCase):
+        def createFts(self, **options):
+            raise NotImplementedError
+
+        def test_example(self):
+            fts = self.createFts(positions=True)
+            fts.add("a b c d".split(), doc_id="1")
+            fts.add("c b a d".split(), doc_id="2")
+            fts.add("a x x b".split(), doc_id="3")
+            self.assertEqual(fts.search_phrase(['a', 'b']), ['1'])
+            self.assertEqual(sorted(fts.search_phrase(['b'])),
+                             ['1', '2', '3'])
+            self.assertEqual(fts.search_phrase(['a', 'b', 'z']), [])
+            self.assertEqual(sorted(fts.search_near(['b', 'a'], 1)),
+                             ['1', '2'])
+            self.assertEqual(sorted(fts.search_near(['b', 'a'], 3)),
+                             ['1', '2', '3'])
+
+        def test_random(self):
+            fts = self.createFts(positions=True)
+            rnd = random.Random(3)
+            docs = {}
+            for i in range(300):
+                words = [rnd.randint(1, 6) for _ in range(rnd.randint(1, 10))]
+                docs[f"doc{i}"] = words
+            fts.add_many((doc_id, iter(words))
+                         for doc_id, words in list(docs.items())[:150])
+            for doc_id, words in list(docs.items())[150:]:
+                fts.add(iter(words), doc_id=doc_id)
+            for i in range(0, 300, 3):
+                fts.remove(f"doc{i}")
+                del docs[f"doc{i}"]
+            fts.compact()
+            for _ in range(50):
+                query = [rnd.randint(1, 7) for _ in range(rnd.randint(1, 3))]
+                self.assertEqual(
+                    sorted(fts.search_phrase(query)),
+                    sorted(doc_id for doc_id, words in docs.items()
+                           if _has_phrase(words, query)))
+                distance = rnd.randint(0, 4)
+                self.assertEqual(
+                    sorted(fts.search_near(query, distance)),
+                    sorted(doc_id for doc_id, words in docs.items()
+                           if _has_near(words, query, distance)))
+                # ranked as the regular search
+                found = set(fts.search_phrase(query))
+                self.assertEqual(
+                    fts.search_phrase(query, limit=3),
+                    [doc_id for doc_id in fts.search(query)
+                     if doc_id in found][:3])
+
+        def test_not_indexed(self):
+            fts = self.createFts()
+            fts.add(['a', 'b'])
+            with self.assertRaises(ValueError):
+                fts.search_phrase(['a', 'b'])
+            with self.assertRaises(ValueError):
+                fts.search_near(['a', 'b'], 2)
+
+
+class TestSmooth(_Wrapper.TestPositions):
+    def createFts(self, **options):
+        return SmoothFts(**options)
+
+
+class TestSimple(_Wrapper.TestPositions):
+    def createFts(self, **options):
+        return SimpleFts(**options)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import random
+import unittest
+from array import array
+
+from gifts import SimpleFts, SmoothFts
+from gifts._postings import _DocIds, _Postings, _gallop, _intersect, \
+    _subtract, _filtered, _CompressedOrdinals, _matching
+
+
+class PostingsTest(unittest.TestCase):
+    def test_bytes_per_posting(self):
+        postings = _Postings()
+        self.assertEqual(
+            postings.ordinals.itemsize + postings.weights.itemsize, 12)
+
+    def test_weights_are_exact(self):
+        postings = _Postings()
+        postings.append(5, 1 / 3)
+        self.assertEqual(list(postings), [(5, 1 / 3)])
+
+    def test_doc_ids(self):
+        ids = _DocIds()
+        self.assertEqual(ids.add('a'), 0)
+        self.assertEqual(ids.add('b'), 1)
+        self.assertIn('a', ids)
+        self.assertEqual(len(ids), 2)
+        with self.assertRaises(ValueError):
+            ids.add('a')
+
+    def test_postings_are_sorted_by_ordinal(self):
+        for fts in [SimpleFts(), SmoothFts()]:
+            for i in range(20):
+                fts.add(['a', str(i % 3)], doc_id=f"doc{i}")
+            for word, postings in fts._word_to_docs.items():
+                ordinals = list(getattr(postings, 'ordinals', postings))
+                self.assertEqual(ordinals, sorted(ordinals))
+
+    def test_gallop(self):
+        ordinals = array('I', [1, 3, 5, 7, 9, 11, 13])
+        for lo in range(len(ordinals) + 1):
+            for target in range(16):
+                expected = next((i for i in range(lo, len(ordinals))
+                                 if ordinals[i] >= target), len(ordinals))
+                self.assertEqual(_gallop(ordinals, target, lo), expected)
+
+    def test_set_operations(self):
+        rnd = random.Random(1)
+        for _ in range(100):
+            lists = [array('I', sorted(rnd.sample(range(100),
+                                                  rnd.randint(0, 60))))
+                     for _ in range(rnd.randint(1, 4))]
+            sets = [set(ordinals) for ordinals in lists]
+            self.assertEqual(_intersect(lists),
+                             sorted(set.intersection(*sets)))
+            self.assertEqual(_subtract(list(range(100)), lists),
+                             sorted(set(range(100)) - set.union(*sets)))
+            self.assertEqual(_filtered(any_of=lists, all_of=[],
+                                       none_of=lists[:1]),
+                             sorted(set.union(*sets) - sets[0]))
+
+    def test_compressed_ordinals(self):
+        rnd = random.Random(2)
+        for length in [0, 1, 5, 127, 128, 129, 256, 1000, 5000]:
+            ordinals = array('I', sorted(rnd.sample(range(length * 20 + 1),
+                                                    length)))
+            compressed = _CompressedOrdinals(ordinals)
+            self.assertEqual(len(compressed), length)
+            self.assertEqual(list(compressed), list(ordinals))
+            for index in rnd.sample(range(length), min(length, 50)):
+                self.assertEqual(compressed[index], ordinals[index])
+            if length:
+                self.assertEqual(compressed[-1], ordinals[-1])
+                self.assertLess(compressed.nbytes, length * 4)
+            for _ in range(10):
+                targets = sorted(rnd.sample(range(length * 20 + 1),
+                                            rnd.randint(0, length + 1)))
+                self.assertEqual(list(_matching(compressed, targets)),
+                                 list(_matching(ordinals, targets)))
+            compressed.append(length * 20 + 5)
+            self.assertEqual(list(compressed),
+                             list(ordinals) + [length * 20 + 5])
+
+    def test_compressed_search(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            rnd = random.Random(3)
+            plain = fts_type()
+            compressed = fts_type(compress_postings=True)
+            for i in range(1500):
+                words = [rnd.randint(1, 30) for _ in range(rnd.randint(1, 8))]
+                plain.add(words, doc_id=f"doc{i}")
+                compressed.add(words, doc_id=f"doc{i}")
+            for step in range(2):
+                for _ in range(20):
+                    query = [rnd.randint(1, 32)
+                             for _ in range(rnd.randint(1, 4))]
+                    required = [rnd.randint(1, 32)]
+                    for limit in [None, 5]:
+                        self.assertEqual(
+                            compressed.search(query, limit=limit),
+                            plain.search(query, limit=limit))
+                        self.assertEqual(
+                            compressed.search(query, limit=limit,
+                                              required=required),
+                            plain.search(query, limit=limit,
+                                         required=required))
+                for i in range(step, 1500, 3):
+                    plain.remove(f"doc{i}")
+                    compressed.remove(f"doc{i}")
+                plain.compact()
+                compressed.compact()
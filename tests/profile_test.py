@@ -0,0 +1,67 @@
+import unittest
+
+from gifts import SmoothFts, SimpleFts, SearchStats
+
+
+def _docs():
+    return [('1', ['a', 'b']), ('2', ['a', 'c']), ('3', ['a', 'b', 'd']),
+            ('4', ['e'])]
+
+
+class ProfileTest(unittest.TestCase):
+    def test_stats(self):
+        for use_numpy in [False, None]:
+            stats = []
+            fts = SmoothFts(use_numpy=use_numpy, on_search=stats.append)
+            fts.add_many(_docs())
+            fts.search(['a', 'b', 'x'])
+            fts.search(['a', 'b', 'x'])
+            for s in stats:
+                self.assertIsInstance(s, SearchStats)
+                self.assertEqual(s.query, ('a', 'b', 'x'))
+                self.assertFalse(s.cached)
+                self.assertEqual(s.terms, 2)
+                self.assertEqual(s.candidates, 3)
+                self.assertEqual(s.postings, 5)
+                self.assertGreaterEqual(s.total_seconds, s.score_seconds)
+            # the weights are computed once after the changes. The NumPy
+            # matrix, built for the second search, needs the fourth document
+            self.assertEqual(stats[0].weights_computed, 3)
+            self.assertEqual(stats[1].weights_computed,
+                             1 if fts._use_numpy else 0)
+
+    def test_simple(self):
+        stats = []
+        fts = SimpleFts(on_search=stats.append)
+        fts.add_many(_docs())
+        fts.search(['b', 'a'], limit=1)
+        fts.search(['a'], excluded=['b'])
+        with self.assertRaises(ValueError):
+            fts.search_phrase(['a', 'b'])  # not reported
+        # the document '2' with only 'a' cannot get into the top of one,
+        # so 'a' is looked up for the two documents with 'b'
+        self.assertEqual([(s.terms, s.postings, s.candidates, s.weights_computed)
+                          for s in stats],
+                         [(2, 4, 2, 0), (1, 1, 1, 0)])
+        self.assertEqual([s.skipped_words for s in stats], [('a',), ()])
+
+    def test_cached(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            stats = []
+            fts = fts_type(cache_size=10, on_search=stats.append)
+            fts.add_many(_docs())
+            self.assertEqual(fts.search(['a']), fts.search(['a']))
+            self.assertEqual([s.cached for s in stats], [False, True])
+            self.assertEqual(stats[1].total_seconds, 0)
+
+    def test_many(self):
+        stats = []
+        fts = SmoothFts(on_search=stats.append)
+        fts.add_many(_docs())
+        fts.search_many([['a'], ['e'], ['x']])
+        self.assertEqual([s.query for s in stats], [('a',), ('e',), ('x',)])
+        self.assertEqual([s.candidates for s in stats], [3, 1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
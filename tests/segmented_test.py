@@ -0,0 +1,125 @@
+import random
+import threading
+import unittest
+
+from gifts import SegmentedFts, SmoothFts, SimpleFts
+
+
+def _random_docs(seed: int, count: int):
+    rnd = random.Random(seed)
+    return [(f"doc{i}", [rnd.randint(1, 40) for _ in range(rnd.randint(1, 8))])
+            for i in range(count)]
+
+
+class SegmentedFtsTest(unittest.TestCase):
+    def test_flush(self):
+        fts = SegmentedFts(segment_size=100)
+        fts.add(['a', 'b'], doc_id='1')
+        self.assertEqual(fts.search(['a']), [])
+        self.assertEqual(fts.documents_count, 1)
+        snapshot = fts.snapshot()
+        fts.flush()
+        self.assertEqual(fts.search(['a']), ['1'])
+        self.assertEqual(snapshot.search(['a']), [])
+        fts.remove('1')
+        self.assertEqual(fts.search(['a']), [])
+        self.assertEqual(fts.documents_count, 0)
+        with self.assertRaises(KeyError):
+            fts.remove('1')
+
+    def test_unique_ids(self):
+        fts = SegmentedFts(segment_size=1)
+        fts.add(['a'], doc_id='1')
+        with self.assertRaises(ValueError):
+            fts.add(['b'], doc_id='1')
+        fts.update('1', ['b'])
+        fts.flush()
+        self.assertEqual(fts.search(['a']), [])
+        self.assertEqual(fts.search(['b']), ['1'])
+
+    def test_merged_is_exact(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            docs = _random_docs(1, 300)
+            segmented = SegmentedFts(fts_type, segment_size=40,
+                                     max_segments=3)
+            single = fts_type()
+            segmented.add_many(docs)
+            single.add_many(docs)
+            for doc_id, _ in docs[::4]:
+                segmented.remove(doc_id)
+                single.remove(doc_id)
+            segmented.merge()
+            self.assertEqual(segmented.snapshot().segments_count, 1)
+            rnd = random.Random(2)
+            for _ in range(20):
+                query = [rnd.randint(1, 42) for _ in range(rnd.randint(1, 4))]
+                for limit in [None, 5]:
+                    self.assertEqual(segmented.search(query, limit=limit),
+                                     single.search(query, limit=limit))
+
+    def test_identical_documents_in_different_segments(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            segmented = SegmentedFts(fts_type, segment_size=100)
+            single = fts_type()
+            # the query word 'q' is not in the first segment
+            for segment in [[('a2', ['x', 'y']), ('b', ['z'])],
+                            [('a1', ['x', 'y']), ('c', ['w', 'w', 'q'])]]:
+                for doc_id, words in segment:
+                    segmented.add(words, doc_id=doc_id)
+                    single.add(words, doc_id=doc_id)
+                segmented.flush()
+            self.assertEqual(segmented.snapshot().segments_count, 2)
+            for query in [['x', 'q'], ['q', 'x', 'x'], ['y', 'z', 'q']]:
+                # the equal scores are ordered by ID
+                self.assertEqual(segmented.search(query),
+                                 single.search(query))
+                self.assertLess(segmented.search(query).index('a2'),
+                                segmented.search(query).index('a1'))
+
+    def test_segments_are_merged(self):
+        docs = _random_docs(3, 500)
+        fts = SegmentedFts(segment_size=20, max_segments=4)
+        fts.add_many(docs)
+        for doc_id, _ in docs[::3]:
+            fts.remove(doc_id)
+        fts.flush()
+        fts._wait_for_merge()
+        self.assertLessEqual(fts.snapshot().segments_count, 4)
+        expected = set(doc_id for doc_id, words in docs[1::3] + docs[2::3]
+                       if 7 in words)
+        self.assertEqual(set(fts.search([7])), expected)
+        self.assertEqual(fts.snapshot().documents_count, len(docs) * 2 // 3)
+
+    def test_concurrent_searches(self):
+        docs = _random_docs(4, 2000)
+        fts = SegmentedFts(segment_size=50, max_segments=3)
+        errors = []
+        done = threading.Event()
+
+        def write():
+            try:
+                for i, (doc_id, words) in enumerate(docs):
+                    fts.add(words, doc_id=doc_id)
+                    if i % 7 == 0:
+                        fts.remove(doc_id)
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+            finally:
+                done.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        while not done.is_set():
+            snapshot = fts.snapshot()
+            # a snapshot does not change while the writer works
+            self.assertEqual(snapshot.search([5]), snapshot.search([5]))
+        writer.join()
+        self.assertEqual(errors, [])
+        fts.merge()
+        expected = set(doc_id for i, (doc_id, words) in enumerate(docs)
+                       if 5 in words and i % 7 != 0)
+        self.assertEqual(set(fts.search([5])), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+from gifts import SmoothFts, SimpleFts, ShardedFts
+from tests.frozen_test import _random_fts, _random_queries
+
+
+class ShardedTest(unittest.TestCase):
+    def assertSameResults(self, fts_type, **search_options):
+        single = _random_fts(fts_type(), 4)
+        with ShardedFts(fts_type, shards=3) as sharded:
+            _random_fts(sharded, 4)
+            self.assertEqual(sharded.documents_count, single.documents_count)
+            for query in _random_queries(5):
+                full = single.search(query, **search_options)
+                self.assertEqual(sharded.search(query, **search_options),
+                                 full)
+                for limit in [0, 1, 3, 1000]:
+                    self.assertEqual(
+                        sharded.search(query, limit=limit, **search_options),
+                        full[:limit])
+
+    def test_smooth(self):
+        self.assertSameResults(SmoothFts)
+
+    def test_simple(self):
+        self.assertSameResults(SimpleFts)
+
+    def test_simple_prioritizing_number_of_words(self):
+        self.assertSameResults(SimpleFts,
+                               prioritize_number_of_words_matched=True)
+
+    def test_search_many(self):
+        single = _random_fts(SmoothFts(), 6)
+        queries = list(_random_queries(7))
+        with ShardedFts(SmoothFts, shards=3) as sharded:
+            _random_fts(sharded, 6)
+            for limit in [None, 0, 3]:
+                self.assertEqual(sharded.search_many(queries, limit=limit),
+                                 single.search_many(queries, limit=limit))
+
+    def test_search_scored(self):
+        single = _random_fts(SimpleFts(), 8)
+        with ShardedFts(SimpleFts, shards=3) as sharded:
+            _random_fts(sharded, 8)
+            for query in _random_queries(9):
+                self.assertEqual(
+                    sharded.search_scored(query, limit=5, min_score=0.01),
+                    single.search_scored(query, limit=5, min_score=0.01))
+
+    def test_search_page(self):
+        single = _random_fts(SmoothFts(), 10)
+        with ShardedFts(SmoothFts, shards=3) as sharded:
+            _random_fts(sharded, 10)
+            for query in _random_queries(11):
+                first = sharded.search_page(query, 3)
+                self.assertEqual(first, single.search_page(query, 3))
+                if first.next_cursor is not None:
+                    self.assertEqual(
+                        sharded.search_page(query, 3, first.next_cursor),
+                        single.search_page(query, 3, first.next_cursor))
+
+    def test_documents_are_split(self):
+        with ShardedFts(SimpleFts, shards=4) as sharded:
+            report = sharded.add_many((str(i), ['a']) for i in range(100))
+            self.assertEqual(report.documents, 100)
+            counts = sharded._call_all('__getattribute__', 'documents_count')
+            self.assertEqual(sum(counts), 100)
+            self.assertTrue(all(count > 0 for count in counts))
+
+    def test_remove_and_update(self):
+        with ShardedFts(SmoothFts, shards=2) as sharded:
+            sharded.add(['a', 'b'], doc_id='1')
+            sharded.add(['a', 'c'], doc_id='2')
+            sharded.add(['d'], doc_id='3')
+            sharded.remove('1')
+            self.assertEqual(sharded.search(['b']), [])
+            sharded.update('2', ['b'])
+            self.assertEqual(sharded.search(['b']), ['2'])
+            self.assertEqual(sharded.documents_count, 2)
+            with self.assertRaises(KeyError):
+                sharded.remove('1')
+
+    def test_errors_of_shards(self):
+        with ShardedFts(SimpleFts, shards=2) as sharded:
+            sharded.add(['a'], doc_id='1')
+            with self.assertRaises(ValueError):
+                sharded.add(['b'], doc_id='1')
+            with self.assertRaises(ValueError):
+                sharded.search([])
+            self.assertEqual(sharded.search(['a']), ['1'])
+
+    def test_stale_stats(self):
+        with ShardedFts(SmoothFts, shards=2, stats_refresh_ratio=1.0) \
+                as sharded:
+            sharded.add_many((str(i), ['a', 'b']) for i in range(10))
+            sharded.refresh_stats()
+            sharded.add(['a', 'c'], doc_id='new')
+            # the exchange is postponed, but the new document is searchable
+            self.assertEqual(sharded._changes_since_exchange, 1)
+            self.assertEqual(sharded.search(['c']), ['new'])
+            self.assertEqual(sharded._changes_since_exchange, 1)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            ShardedFts(shards=0)
+        with self.assertRaises(ValueError):
+            ShardedFts(stats_refresh_ratio=-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import unittest
+
+from gifts import SmoothFts, SimilarPair
+
+
+def _docs_with_near_duplicates(seed: int):
+    rnd = random.Random(seed)
+    docs = []
+    for i in range(200):
+        words = [rnd.randint(1, 300) for _ in range(rnd.randint(1, 15))]
+        docs.append((f"d{i}", words))
+        if i % 3 == 0:
+            changed = list(words)
+            changed[rnd.randrange(len(changed))] = rnd.randint(1, 300)
+            docs.append((f"c{i}", changed))
+    return docs
+
+
+class SimilarTest(unittest.TestCase):
+    def test_more_like_this(self):
+        fts = SmoothFts()
+        fts.add(['a', 'b', 'c'], doc_id='1')
+        fts.add(['a', 'b', 'd'], doc_id='2')
+        fts.add(['a', 'e'], doc_id='3')
+        fts.add(['f'], doc_id='4')
+        self.assertEqual(fts.more_like_this('1'), ['2', '3'])
+        self.assertEqual(fts.more_like_this('1', limit=1), ['2'])
+        self.assertEqual(fts.more_like_this('4'), [])
+        self.assertEqual(fts.more_like_this('1'),
+                         [doc_id for doc_id in fts.search(['a', 'b', 'c'])
+                          if doc_id != '1'])
+        with self.assertRaises(KeyError):
+            fts.more_like_this('5')
+        with self.assertRaises(ValueError):
+            fts.more_like_this('1', limit=-1)
+
+    def test_pairs_are_same_as_more_like_this(self):
+        for use_numpy in [False, None]:
+            fts = SmoothFts(use_numpy=use_numpy)
+            docs = _docs_with_near_duplicates(1)
+            fts.add_many(docs)
+            fts.remove('d4')
+            for threshold in [0.2, 0.5, 0.9]:
+                expected = set()
+                for doc_id, _ in docs:
+                    if doc_id == 'd4':
+                        continue
+                    ordinal = fts._ids.id_to_ordinal[doc_id]
+                    doc = fts._docs[ordinal]
+                    for (score, other_id), other in fts._top(
+                            list(doc.unique_words), query_doc=doc,
+                            min_score=threshold).sorted_entries():
+                        if other > ordinal:
+                            expected.add(SimilarPair(doc_id, other_id, score))
+                pairs = fts.similar_pairs(threshold)
+                self.assertEqual(set(pairs), expected)
+                self.assertEqual(len(pairs), len(expected))
+                self.assertEqual(pairs, sorted(pairs, key=lambda p: p.score,
+                                               reverse=True))
+
+    def test_threshold(self):
+        fts = SmoothFts()
+        fts.add(['a'], doc_id='1')
+        fts.add(['a'], doc_id='2')
+        self.assertEqual([(p.first, p.second) for p in fts.similar_pairs(1)],
+                         [('1', '2')])
+        for threshold in [0, 1.5]:
+            with self.assertRaises(ValueError):
+                fts.similar_pairs(threshold)
+
+
+if __name__ == "__main__":
+    unittest.main()
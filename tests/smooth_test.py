@@ -1,9 +1,12 @@
 
 
 import math
+import random
 import unittest
 
 from gifts import SmoothFts
+from gifts._cosine_similarity import cosine_similarity
+from gifts._document import _Document
 
 
 class SmoothTest(unittest.TestCase):
@@ -58,3 +61,59 @@ class SmoothTest(unittest.TestCase):
                                0.5178561161676974)
 
         pass
+
+    def test_stale_idf_is_kept_until_refresh(self):
+        db = SmoothFts(idf_refresh_ratio=0.5)
+        for i in range(10):
+            db.add(['common', f'w{i}'], doc_id=f'doc{i}')
+        db.refresh()
+        version = db._idf_version
+        idf_before = db._word_to_idf('common')
+
+        # 4 documents are less than 50% of 10
+        for i in range(10, 14):
+            db.add(['common', 'new'], doc_id=f'doc{i}')
+        self.assertEqual(db._idf_version, version)
+        self.assertEqual(db._word_to_idf('common'), idf_before)
+
+        db.add(['common', 'new'], doc_id='doc14')
+        db.add(['common', 'new'], doc_id='doc15')
+        self.assertGreater(db._idf_version, version)
+
+    def test_refresh_gives_exact_results(self):
+        exact = SmoothFts()
+        lazy = SmoothFts(idf_refresh_ratio=10)
+        docs = [['a', 'b'], ['a', 'c', 'c'], ['b', 'd'], ['a', 'e'], ['e']]
+        for i, doc in enumerate(docs):
+            exact.add(doc, doc_id=str(i))
+            lazy.add(doc, doc_id=str(i))
+            lazy.search(['a'])  # caching the weights
+        lazy.refresh()
+        for query in [['a'], ['b', 'e'], ['c', 'd', 'a']]:
+            self.assertEqual(lazy.search(query), exact.search(query))
+
+    def test_negative_refresh_ratio(self):
+        with self.assertRaises(ValueError):
+            SmoothFts(idf_refresh_ratio=-1)
+
+    def test_ranking_matches_cosine_similarity(self):
+        db = SmoothFts()
+        rnd = random.Random(3)
+        for i in range(200):
+            db.add([rnd.randint(1, 30) for _ in range(rnd.randint(1, 10))],
+                   doc_id=f"doc{i}")
+
+        def cosine(query, doc_id):
+            query_doc = _Document(None, query)
+            doc = db._docs[db._ids.id_to_ordinal[doc_id]]
+            words = list(set(query) | set(doc.unique_words))
+            return cosine_similarity(
+                [query_doc.weight(w, db._word_to_idf, -1) for w in words],
+                [doc.weight(w, db._word_to_idf, db._idf_version)
+                 for w in words])
+
+        for _ in range(20):
+            query = [rnd.randint(1, 35) for _ in range(rnd.randint(1, 6))]
+            scores = [cosine(query, doc_id) for doc_id in db.search(query)]
+            for a, b in zip(scores, scores[1:]):
+                self.assertGreaterEqual(a + 1e-9, b)
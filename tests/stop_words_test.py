@@ -0,0 +1,92 @@
+import random
+import unittest
+
+from gifts import SmoothFts, SimpleFts
+
+
+def _docs():
+    return [('1', ['the', 'cat']), ('2', ['the', 'dog']),
+            ('3', ['the', 'dog', 'bird']), ('4', ['the', 'fish'])]
+
+
+class StopWordsTest(unittest.TestCase):
+    def test_ratio(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            for ratio in [0, -0.5, 1.5]:
+                with self.assertRaises(ValueError):
+                    fts_type(stop_words_ratio=ratio)
+            self.assertEqual(fts_type().stop_words, set())
+
+    def test_ignored(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            stats = []
+            fts = fts_type(stop_words_ratio=0.5, on_search=stats.append)
+            fts.add_many(_docs())
+            # 'dog' is in a half of the documents, not more
+            self.assertEqual(fts.stop_words, {'the'})
+            self.assertEqual(fts.search(['the', 'cat']), ['1'])
+            self.assertEqual(fts.search(['the', 'cat', 'unknown']), ['1'])
+            self.assertEqual(set(fts.search(['the', 'dog'])), {'2', '3'})
+            self.assertEqual(fts.search(['the', 'cat'], required=['the']),
+                             ['1'])
+            # nothing else to search for
+            self.assertEqual(set(fts.search(['the'])), {'1', '2', '3', '4'})
+            self.assertEqual(len(fts.search(['the', 'unknown'])), 4)
+            self.assertEqual([s.stop_words for s in stats],
+                             [('the',), ('the',), ('the',), ('the',), (),
+                              ()])
+
+    def test_scores(self):
+        fts = SimpleFts(stop_words_ratio=0.5)
+        fts.add_many(_docs())
+        self.assertEqual(fts.search_scored(['the', 'cat']),
+                         fts.search_scored(['cat']))
+
+    def test_changes(self):
+        for fts_type in [SmoothFts, SimpleFts]:
+            fts = fts_type(stop_words_ratio=0.5, cache_size=10)
+            fts.add_many(_docs())
+            self.assertEqual(fts.search(['the', 'cat']), ['1'])
+            for i in range(4):
+                fts.add(['other'], doc_id=f"other{i}")
+            self.assertEqual(fts.stop_words, set())
+            self.assertEqual(len(fts.search(['the', 'cat'])), 4)
+            for i in range(4):
+                fts.remove(f"other{i}")
+            self.assertEqual(fts.search(['the', 'cat']), ['1'])
+
+
+class SkippedWordsTest(unittest.TestCase):
+    def test_same_results(self):
+        rnd = random.Random(5)
+
+        def word():
+            # a few words are very common
+            return int(rnd.paretovariate(0.8)) % 100
+
+        # the NumPy matrix would score all the documents
+        for fts_type, options in [(SmoothFts, dict(use_numpy=False)),
+                                  (SimpleFts, {})]:
+            stats = []
+            fts = fts_type(on_search=stats.append, **options)
+            for i in range(500):
+                fts.add([word() for _ in range(rnd.randint(1, 12))],
+                        doc_id=f"doc{i}")
+            for i in range(0, 500, 7):
+                fts.remove(f"doc{i}")
+            for _ in range(50):
+                query = [word() for _ in range(rnd.randint(1, 5))]
+                full = fts.search_scored(query)
+                for limit in [1, 5]:
+                    for min_score in [None, 0.05]:
+                        self.assertEqual(
+                            fts.search_scored(query, limit=limit,
+                                              min_score=min_score),
+                            [match for match in full
+                             if min_score is None
+                             or match.score >= min_score][:limit])
+            self.assertTrue(any(s.skipped_words for s in stats))
+
+
+if __name__ == "__main__":
+    unittest.main()
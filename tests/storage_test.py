@@ -0,0 +1,108 @@
+import multiprocessing
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from gifts import SmoothFts, SimpleFts, FrozenFts
+from tests.frozen_test import _random_fts, _random_queries
+
+
+def _search_in_file(path: str):
+    return FrozenFts.load(path).search([1, 2, 3], limit=5)
+
+
+class StorageTest(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = TemporaryDirectory()
+        self.path = Path(self._temp_dir.name) / 'db.gifts'
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def assertSameResults(self, fts, mmap: bool):
+        fts.save(self.path)
+        loaded = FrozenFts.load(self.path, mmap=mmap)
+        self.assertEqual(loaded.documents_count, fts.documents_count)
+        self.assertEqual(loaded.words_count, fts.freeze().words_count)
+        for query in _random_queries(5):
+            full = fts.search(query)
+            self.assertEqual(loaded.search(query), full)
+            for limit in [0, 1, 3, 1000]:
+                self.assertEqual(loaded.search(query, limit=limit),
+                                 full[:limit])
+
+    def test_smooth(self):
+        self.assertSameResults(_random_fts(SmoothFts(), 4), mmap=True)
+
+    def test_simple(self):
+        self.assertSameResults(_random_fts(SimpleFts(), 4), mmap=True)
+
+    def test_without_mmap(self):
+        self.assertSameResults(_random_fts(SmoothFts(), 8), mmap=False)
+
+    def test_string_words_and_unicode_ids(self):
+        fts = SmoothFts()
+        fts.add(['кот', 'пёс'], doc_id='документ')
+        fts.add(['cat', 'dog'], doc_id='doc')
+        fts.save(self.path)
+        loaded = FrozenFts.load(self.path)
+        self.assertEqual(loaded.search(['пёс']), ['документ'])
+        self.assertEqual(loaded.search(['dog', 'fish']), ['doc'])
+        self.assertEqual(loaded.search(['fish']), [])
+
+    def test_tuple_and_number_words(self):
+        fts = SimpleFts()
+        word = 'wo' + 'rd'
+        fts.add([(word, word), 1, 2.5, ('a', 3), None, b'raw'], doc_id='1')
+        fts.add([-300, 10 ** 30], doc_id='2')
+        fts.save(self.path)
+        loaded = FrozenFts.load(self.path)
+        # an equal tuple of other string objects, pickled differently
+        self.assertEqual(loaded.search([('wo' + 'rd', 'word')]), ['1'])
+        for query in [[1], [1.0], [True], [2.5], [('a', 3.0)], [None],
+                      [b'raw']]:
+            self.assertEqual(loaded.search(query), fts.search(query))
+            self.assertEqual(loaded.search(query), ['1'])
+        self.assertEqual(loaded.search([-300.0]), ['2'])
+        self.assertEqual(loaded.search([10 ** 30]), ['2'])
+        self.assertEqual(
+            loaded.search([2, ('a',), 'a', frozenset([1])]), [])
+        self.assertEqual(set(loaded._word_to_postings),
+                         set(fts.freeze()._word_to_postings))
+
+    def test_unsupported_words(self):
+        fts = SimpleFts()
+        fts.add([frozenset([1])], doc_id='1')
+        with self.assertRaises(TypeError):
+            fts.save(self.path)
+        self.assertFalse(self.path.exists())
+
+    def test_empty(self):
+        SimpleFts().save(self.path)
+        loaded = FrozenFts.load(self.path)
+        self.assertEqual(loaded.documents_count, 0)
+        self.assertEqual(loaded.search(['a']), [])
+
+    def test_resave(self):
+        fts = _random_fts(SmoothFts(), 9)
+        fts.save(self.path)
+        other_path = self.path.with_name('other.gifts')
+        FrozenFts.load(self.path).save(other_path)
+        self.assertEqual(self.path.read_bytes(), other_path.read_bytes())
+
+    def test_not_a_database(self):
+        self.path.write_bytes(b'something else' * 10)
+        with self.assertRaises(ValueError):
+            FrozenFts.load(self.path)
+
+    def test_shared_by_processes(self):
+        fts = _random_fts(SimpleFts(), 10)
+        fts.save(self.path)
+        expected = fts.search([1, 2, 3], limit=5)
+        with multiprocessing.Pool(2) as pool:
+            results = pool.map(_search_in_file, [str(self.path)] * 2)
+        self.assertEqual(results, [expected, expected])
+
+
+if __name__ == "__main__":
+    unittest.main()